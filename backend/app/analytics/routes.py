@@ -2,13 +2,13 @@
 Analytics routes for message statistics and insights.
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, cast
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, desc, cast
 from sqlalchemy.types import Date
 from uuid import UUID
 from datetime import datetime, date, timedelta
 from typing import List
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.models import Workspace, MessageLog
 from app.db.schemas import AnalyticsSummaryResponse, MessagesPerDayResponse, DailyMessageCount
 from app.dependencies.workspace import verify_workspace_ownership
@@ -20,7 +20,7 @@ router = APIRouter(prefix="/analytics", tags=["analytics"])
 async def get_analytics_summary(
     workspace_id: UUID,
     workspace: Workspace = Depends(verify_workspace_ownership),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get analytics summary for a workspace.
@@ -40,38 +40,38 @@ async def get_analytics_summary(
         AnalyticsSummaryResponse with statistics
     """
     # Total messages count
-    total_messages = db.query(func.count(MessageLog.id)).filter(
+    total_messages = await db.scalar(select(func.count(MessageLog.id)).where(
         MessageLog.workspace_id == workspace_id
-    ).scalar() or 0
+    )) or 0
     
     # Messages today count
     today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    messages_today = db.query(func.count(MessageLog.id)).filter(
+    messages_today = await db.scalar(select(func.count(MessageLog.id)).where(
         MessageLog.workspace_id == workspace_id,
         MessageLog.created_at >= today_start
-    ).scalar() or 0
+    )) or 0
     
     # Context success rate
-    total_with_context = db.query(func.count(MessageLog.id)).filter(
+    total_with_context = await db.scalar(select(func.count(MessageLog.id)).where(
         MessageLog.workspace_id == workspace_id,
         MessageLog.is_context_used == True
-    ).scalar() or 0
+    )) or 0
     
     context_success_rate = 0.0
     if total_messages > 0:
         context_success_rate = round((total_with_context / total_messages) * 100, 2)
     
     # Top 10 questions (most frequent)
-    top_questions_query = db.query(
+    top_questions_query = (await db.execute(select(
         MessageLog.question,
         func.count(MessageLog.id).label('count')
-    ).filter(
+    ).where(
         MessageLog.workspace_id == workspace_id
     ).group_by(
         MessageLog.question
     ).order_by(
         desc('count')
-    ).limit(10).all()
+    ).limit(10))).all()
     
     top_questions = [q[0] for q in top_questions_query]
     
@@ -88,7 +88,7 @@ async def get_messages_per_day(
     workspace_id: UUID,
     days: int = 30,  # Default to last 30 days
     workspace: Workspace = Depends(verify_workspace_ownership),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get message counts per day for a workspace (for chart visualization).
@@ -113,10 +113,10 @@ async def get_messages_per_day(
     start_date = end_date - timedelta(days=days - 1)
     
     # Query message counts grouped by date
-    daily_counts = db.query(
+    daily_counts = (await db.execute(select(
         cast(MessageLog.created_at, Date).label('date'),
         func.count(MessageLog.id).label('count')
-    ).filter(
+    ).where(
         MessageLog.workspace_id == workspace_id,
         cast(MessageLog.created_at, Date) >= start_date,
         cast(MessageLog.created_at, Date) <= end_date
@@ -124,7 +124,7 @@ async def get_messages_per_day(
         cast(MessageLog.created_at, Date)
     ).order_by(
         cast(MessageLog.created_at, Date)
-    ).all()
+    ))).all()
     
     # Create a dictionary for easy lookup
     counts_dict = {str(row.date): row.count for row in daily_counts}
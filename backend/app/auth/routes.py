@@ -2,8 +2,10 @@
 Authentication routes for user registration and login.
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_async_db
 from app.db.models import User, Workspace
 from app.db.schemas import UserCreate, UserResponse, Token, LoginRequest
 from app.core.security import hash_password, verify_password
@@ -13,7 +15,7 @@ router = APIRouter(prefix="/auth", tags=["authentication"])
 
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
+async def signup(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Register a new user and automatically create a workspace.
     
@@ -28,21 +30,21 @@ async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
         HTTPException: If email already exists
     """
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = await db.scalar(select(User).where(User.email == user_data.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Create new user
-    hashed_password = hash_password(user_data.password)
+    # Create new user (bcrypt is slow; keep it off the event loop)
+    hashed_password = await run_in_threadpool(hash_password, user_data.password)
     new_user = User(
         email=user_data.email,
         password_hash=hashed_password
     )
     db.add(new_user)
-    db.flush()  # Flush to get user ID
+    await db.flush()  # Flush to get user ID
     
     # Automatically create workspace for the user
     workspace_name = f"{user_data.email.split('@')[0]}'s workspace"
@@ -52,14 +54,14 @@ async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     db.add(new_workspace)
     
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     return new_user
 
 
 @router.post("/login", response_model=Token)
-async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login(login_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Authenticate user and return JWT tokens.
     
@@ -74,9 +76,9 @@ async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
         HTTPException: If credentials are invalid
     """
     # Find user by email
-    user = db.query(User).filter(User.email == login_data.email).first()
+    user = await db.scalar(select(User).where(User.email == login_data.email))
     
-    if not user or not verify_password(login_data.password, user.password_hash):
+    if not user or not await run_in_threadpool(verify_password, login_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
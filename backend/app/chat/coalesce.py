@@ -0,0 +1,141 @@
+"""
+Single-flight coalescing of identical in-flight chat queries.
+Concurrent callers with the same key share one computation (or one event
+stream) instead of each running the full embed, retrieve, complete chain.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class _Flight:
+    """One shared computation and the callers waiting on it."""
+    
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        # Streams only: events so far, for replay to late joiners
+        self.events: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+    
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    """
+    Shares in-flight work between concurrent calls with the same key.
+    
+    The first caller starts the work; callers arriving before it finishes
+    join it. A caller that gives up (timeout, disconnect) only stops
+    waiting; the work is cancelled once no caller is left. Keys are
+    forgotten as soon as the work finishes, so nothing is cached here.
+    """
+    
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.started = 0
+        self.joined = 0
+    
+    def _join(self, key: Hashable, start: Callable[[_Flight], Awaitable[Any]]) -> _Flight:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.task = asyncio.ensure_future(start(flight))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self._flights[key] = flight
+            self.started += 1
+        else:
+            self.joined += 1
+        flight.waiters += 1
+        return flight
+    
+    def _leave(self, key: Hashable, flight: _Flight) -> None:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            self._forget(key, flight)
+            flight.task.cancel()
+    
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+    
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await `compute()`, or the identical call already in flight.
+        
+        Args:
+            key: Identity of the call
+            compute: Starts the work (only called for the first caller)
+        
+        Returns:
+            The shared result (callers must not mutate it)
+        """
+        flight = self._join(key, lambda _: compute())
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            self._leave(key, flight)
+    
+    async def stream(self, key: Hashable, produce: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Iterate `produce()`, or the identical stream already in flight.
+        
+        Callers joining late first receive the events already produced.
+        
+        Args:
+            key: Identity of the call
+            produce: Creates the event stream (only called for the first caller)
+        
+        Yields:
+            The shared events (callers must not mutate them)
+        """
+        flight = self._join(key, lambda flight: self._pump(flight, produce()))
+        try:
+            position = 0
+            while True:
+                if position < len(flight.events):
+                    yield flight.events[position]
+                    position += 1
+                elif flight.finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.changed.wait()
+        finally:
+            self._leave(key, flight)
+    
+    async def _pump(self, flight: _Flight, events: AsyncIterator[Any]) -> None:
+        try:
+            async for event in events:
+                flight.events.append(event)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            await events.aclose()
+            flight.finished = True
+            flight.notify()
+    
+    def stats(self) -> Dict[str, int]:
+        """Started and joined call counters."""
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "joined": self.joined,
+        }
+
+
+# Query coalescer (initialized lazily)
+_query_coalescer: Optional[SingleFlight] = None
+
+
+def get_query_coalescer() -> SingleFlight:
+    """Get or initialize the coalescer shared by chat queries."""
+    global _query_coalescer
+    if _query_coalescer is None:
+        _query_coalescer = SingleFlight()
+    return _query_coalescer
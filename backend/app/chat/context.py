@@ -0,0 +1,129 @@
+"""
+Context packing for RAG prompts.
+Drops weak matches, merges chunks that are adjacent in their document
+(removing the text they share) and fills a token budget best-first.
+"""
+from typing import Any, Dict, List, Tuple
+from app.rag.tokenizer import estimate_tokens
+
+
+# Shortest shared text treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+
+# Longest overlap searched for (chunking overlap is 100 chars or 32 tokens)
+MAX_OVERLAP_CHARS = 400
+
+
+def merge_overlapping_text(first: str, second: str) -> str:
+    """
+    Join two consecutive chunks, keeping their shared text once.
+    
+    Consecutive chunks repeat the end of the first at the start of the
+    second (the chunking overlap); the longest such suffix/prefix of at
+    least MIN_OVERLAP_CHARS is removed from the second chunk.
+    
+    Args:
+        first: Earlier chunk
+        second: Following chunk
+        
+    Returns:
+        Merged text
+    """
+    longest = min(len(first), len(second), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first} {second}"
+
+
+def _metadata(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    return chunk.get('metadata', {}) or {}
+
+
+def pack_context(
+    chunks: List[Dict[str, Any]],
+    token_budget: int,
+    min_relative_score: float = 0.0
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Build a prompt context from retrieved chunks within a token budget.
+    
+    1. Matches whose "vector_score" (cosine similarity) is below
+       `min_relative_score` times the best one are dropped (the best match
+       is always kept). Fused and BM25 scores are rank-based, not
+       comparable as fractions, so matches without a vector_score (lexical
+       hits) are never dropped.
+    2. Chunks are taken best-first while their estimated tokens fit the
+       budget; a chunk that does not fit is skipped for smaller ones.
+    3. Selected chunks with consecutive indices in the same document are
+       merged into one passage with the overlap removed, so the packed
+       context is never larger than the estimate. Vector and lexical hits
+       both take chunk_index from the chunk store, so indices agree after
+       a re-index moves chunks.
+    4. Passages are ordered by their best chunk's score.
+    
+    Args:
+        chunks: Retrieved chunks with metadata, "score" and optionally
+            "vector_score", best first
+        token_budget: Estimated tokens available for chunk text
+        min_relative_score: Relative score cutoff (0 keeps every match)
+        
+    Returns:
+        Tuple of (context string, chunks used in it, best first)
+    """
+    if not chunks:
+        return "No relevant documents found.", []
+    
+    ranked = sorted(chunks, key=lambda chunk: chunk.get('score', 0.0), reverse=True)
+    best_vector_score = max((chunk['vector_score'] for chunk in ranked if 'vector_score' in chunk), default=0.0)
+    if min_relative_score > 0 and best_vector_score > 0:
+        cutoff = best_vector_score * min_relative_score
+        ranked = [ranked[0]] + [chunk for chunk in ranked[1:] if chunk.get('vector_score', cutoff) >= cutoff]
+    
+    selected = []
+    used_tokens = 0
+    for chunk in ranked:
+        tokens = estimate_tokens(_metadata(chunk).get('text', ''))
+        if selected and used_tokens + tokens > token_budget:
+            continue
+        selected.append(chunk)
+        used_tokens += tokens
+    
+    # Group runs of consecutive chunk indices per document
+    by_position = sorted(
+        selected,
+        key=lambda chunk: (str(_metadata(chunk).get('document_id', '')), _metadata(chunk).get('chunk_index', 0))
+    )
+    passages: List[Dict[str, Any]] = []
+    for chunk in by_position:
+        metadata = _metadata(chunk)
+        document_id = str(metadata.get('document_id', 'Unknown'))
+        chunk_index = metadata.get('chunk_index', 0)
+        previous = passages[-1] if passages else None
+        if previous and previous["document_id"] == document_id and previous["last"] + 1 == chunk_index:
+            previous["text"] = merge_overlapping_text(previous["text"], metadata.get('text', ''))
+            previous["last"] = chunk_index
+            previous["score"] = max(previous["score"], chunk.get('score', 0.0))
+        else:
+            passages.append({
+                "document_id": document_id,
+                "first": chunk_index,
+                "last": chunk_index,
+                "text": metadata.get('text', ''),
+                "score": chunk.get('score', 0.0)
+            })
+    
+    passages.sort(key=lambda passage: passage["score"], reverse=True)
+    context_parts = []
+    for passage in passages:
+        if passage["first"] == passage["last"]:
+            label = f"Chunk {passage['first']}"
+        else:
+            label = f"Chunks {passage['first']}-{passage['last']}"
+        context_parts.append(f"[Document {passage['document_id'][:8]}... - {label}]\n{passage['text']}")
+    
+    print(
+        f"[RAG-QUERY] Packed {len(selected)}/{len(chunks)} chunks into {len(passages)} passages "
+        f"(~{used_tokens} tokens before overlap removal)"
+    )
+    return "\n\n".join(context_parts), selected
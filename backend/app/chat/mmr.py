@@ -0,0 +1,116 @@
+"""
+Maximal-marginal-relevance selection of retrieved chunks.
+Re-ranks over-fetched candidates so the chunks sent to the LLM cover
+different content instead of repeating near-duplicates.
+"""
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+import numpy as np
+from app.rag.storage import fetch_vectors
+
+
+def maximal_marginal_relevance(
+    vectors: np.ndarray,
+    relevance: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7,
+    duplicate_threshold: float = 1.0
+) -> List[int]:
+    """
+    Greedy MMR selection.
+    
+    Each step picks the candidate maximizing
+    lambda_mult * relevance - (1 - lambda_mult) * max similarity to the
+    candidates already picked. Candidates at least `duplicate_threshold`
+    similar to a picked one are never picked.
+    
+    Args:
+        vectors: (n, d) candidate vectors, L2-normalized (zero rows are
+            treated as unlike every other candidate)
+        relevance: (n,) relevance scores in [0, 1]
+        k: Number of candidates to pick
+        lambda_mult: Relevance / diversity trade-off (1 = relevance only)
+        duplicate_threshold: Cosine similarity treated as a duplicate
+        
+    Returns:
+        Indices of the picked candidates, in pick order
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    similarity = vectors @ vectors.T
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    picked: List[int] = []
+    
+    for _ in range(min(k, n)):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        if not np.isfinite(scores[best]):
+            break
+        picked.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[:, best])
+        available &= max_similarity < duplicate_threshold
+    
+    return picked
+
+
+def select_diverse_chunks(
+    workspace_id: UUID,
+    chunks: List[Dict[str, Any]],
+    top_k: int,
+    lambda_mult: float,
+    duplicate_threshold: float,
+    index=None
+) -> List[Dict[str, Any]]:
+    """
+    Pick top_k of the retrieved candidates by maximal marginal relevance.
+    
+    Relevance is each candidate's retrieval score divided by the best one,
+    so vector, BM25 and fused scores are handled alike. Candidates that did
+    not come with their vector (lexical hits) are fetched from the index in
+    one request.
+    
+    Args:
+        workspace_id: UUID of the workspace
+        chunks: Candidates, best first ({"id", "score", "metadata"[, "values"]})
+        top_k: Number of chunks to keep
+        lambda_mult: Relevance / diversity trade-off (1 = relevance only)
+        duplicate_threshold: Cosine similarity treated as a duplicate
+        index: Vector index (default: get_vector_index())
+        
+    Returns:
+        Picked chunks in pick order, without "values"
+    """
+    if len(chunks) <= 1:
+        return [{key: value for key, value in chunk.items() if key != "values"} for chunk in chunks]
+    
+    missing = [chunk["id"] for chunk in chunks if not chunk.get("values")]
+    fetched = {}
+    if missing:
+        try:
+            fetched = fetch_vectors(workspace_id, missing, index)
+        except Exception as e:
+            # Candidates without a vector only compete on relevance
+            print(f"[RAG-QUERY] MMR could not fetch {len(missing)} vectors: {str(e)}")
+    
+    rows: List[Optional[List[float]]] = [chunk.get("values") or fetched.get(chunk["id"]) for chunk in chunks]
+    dimensions = max((len(row) for row in rows if row), default=0)
+    vectors = np.zeros((len(chunks), dimensions), dtype=np.float32)
+    for i, row in enumerate(rows):
+        if row and len(row) == dimensions:
+            vectors[i] = row
+    vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    
+    scores = np.array([chunk.get("score", 0.0) for chunk in chunks], dtype=np.float32)
+    best = float(scores.max())
+    relevance = scores / best if best > 0 else np.ones(len(chunks), dtype=np.float32)
+    
+    picked = maximal_marginal_relevance(vectors, relevance, top_k, lambda_mult, duplicate_threshold)
+    print(
+        f"[RAG-QUERY] MMR kept {len(picked)} of {len(chunks)} candidates "
+        f"(picked ranks {[i + 1 for i in picked]})"
+    )
+    return [{key: value for key, value in chunks[i].items() if key != "values"} for i in picked]
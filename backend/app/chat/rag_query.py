@@ -1,11 +1,17 @@
 """
 RAG query utilities for retrieving relevant context from Pinecone.
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from uuid import UUID
 import asyncio
-from app.rag.embed import get_embedding, get_openai_client
-from app.rag.storage import query_similar_chunks, get_pinecone_index
+from app.rag.embed import get_embedding_async, get_async_openai_client
+from app.core.config import settings
+from app.rag.storage import query_similar_chunks, get_vector_index
+from app.rag.lexical import get_lexical_index, is_keyword_query, reciprocal_rank_fusion
+from app.rag.answer_cache import get_answer_cache, normalize_question
+from app.chat.context import pack_context
+from app.chat.mmr import select_diverse_chunks
+from app.chat.coalesce import get_query_coalescer
 
 
 SYSTEM_PROMPT_TEMPLATE = """You are an AI assistant for this organization.
@@ -21,19 +27,32 @@ Instructions:
 Context from documents:
 {context}"""
 
+# Reply used when no chunks were retrieved for a question
+NO_CONTEXT_REPLY = "I don't have any relevant information in the documents to answer this question. Please make sure documents are uploaded and processed in this workspace."
+
 
 async def retrieve_relevant_chunks(
     workspace_id: UUID,
     query: str,
-    top_k: int = 5
+    top_k: int = 5,
+    query_embedding: Optional[List[float]] = None
 ) -> List[Dict[str, Any]]:
     """
     Retrieve relevant document chunks for a query using RAG.
     
+    With HYBRID_SEARCH_ENABLED, vector hits are fused with BM25 hits from
+    the lexical index (reciprocal-rank fusion), and obvious keyword lookups
+    are answered from the lexical index alone without an embedding call.
+    
+    With MMR_ENABLED, MMR_FETCH_FACTOR times top_k candidates are fetched
+    with their vectors and top_k of them picked by maximal marginal
+    relevance, so near-duplicate chunks do not crowd out other content.
+    
     Args:
         workspace_id: UUID of the workspace (Pinecone namespace)
         query: User query text
         top_k: Number of top chunks to retrieve
+        query_embedding: Embedding of the query, if already computed
         
     Returns:
         List of relevant chunks with metadata and scores
@@ -42,28 +61,62 @@ async def retrieve_relevant_chunks(
         print(f"[RAG-QUERY] Workspace ID: {workspace_id}")
         print(f"[RAG-QUERY] Query: '{query[:100]}...'")
         
-        # Generate query embedding (run in thread pool to avoid blocking)
-        loop = asyncio.get_event_loop()
-        query_embedding = await loop.run_in_executor(
-            None, 
-            get_embedding, 
-            query, 
-            "text-embedding-3-small"
-        )
+        loop = asyncio.get_running_loop()
+        index = get_vector_index()
+        lexical = get_lexical_index() if settings.HYBRID_SEARCH_ENABLED else None
+        fetch_k = top_k * max(1, settings.MMR_FETCH_FACTOR) if settings.MMR_ENABLED else top_k
+        candidates = max(fetch_k, settings.HYBRID_CANDIDATES) if lexical is not None else fetch_k
+        
+        def diversify(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            if not settings.MMR_ENABLED:
+                return chunks[:top_k]
+            return select_diverse_chunks(
+                workspace_id,
+                chunks[:fetch_k],
+                top_k,
+                lambda_mult=settings.MMR_LAMBDA,
+                duplicate_threshold=settings.MMR_DUPLICATE_THRESHOLD,
+                index=index
+            )
+        
+        if lexical is not None and settings.LEXICAL_FAST_PATH and is_keyword_query(query):
+            chunks = await loop.run_in_executor(None, lexical.search, workspace_id, query, fetch_k)
+            if chunks:
+                print(f"[RAG-QUERY] Keyword lookup answered by lexical index ({len(chunks)} chunks)")
+                return await loop.run_in_executor(None, diversify, chunks)
+        
+        # Start the BM25 search while the query is embedded
+        lexical_future = None
+        if lexical is not None:
+            lexical_future = loop.run_in_executor(None, lexical.search, workspace_id, query, candidates)
+        
+        # Generate query embedding (native async client, no thread hand-off)
+        if query_embedding is None:
+            query_embedding = await get_embedding_async(query, "text-embedding-3-small")
         print(f"[RAG-QUERY] Generated embedding, length: {len(query_embedding)}")
         
-        # Query Pinecone (run in thread pool)
-        index = get_pinecone_index()
-        print(f"[RAG-QUERY] Querying Pinecone namespace: '{str(workspace_id)}'")
+        # Query the vector index (run in thread pool)
+        print(f"[RAG-QUERY] Querying vector namespace: '{str(workspace_id)}'")
         
         chunks = await loop.run_in_executor(
             None,
             query_similar_chunks,
             workspace_id,
             query_embedding,
-            top_k,
-            index
+            candidates,
+            index,
+            settings.MMR_ENABLED
         )
+        # Keep the cosine similarity apart from "score", which fusion replaces
+        for chunk in chunks:
+            chunk["vector_score"] = chunk.get("score", 0.0)
+        
+        if lexical_future is not None:
+            lexical_chunks = await lexical_future
+            print(f"[RAG-QUERY] Fusing {len(chunks)} vector and {len(lexical_chunks)} lexical hits")
+            chunks = reciprocal_rank_fusion([chunks, lexical_chunks], settings.HYBRID_RRF_K)
+        
+        chunks = await loop.run_in_executor(None, diversify, chunks)
         
         print(f"[RAG-QUERY] Retrieved {len(chunks)} chunks")
         for i, chunk in enumerate(chunks):
@@ -101,6 +154,30 @@ def build_context_from_chunks(chunks: List[Dict[str, Any]]) -> str:
     return "\n\n".join(context_parts)
 
 
+def build_prompt_context(chunks: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Build the prompt context for retrieved chunks.
+    
+    With CONTEXT_PACKING_ENABLED, weak matches are dropped, adjacent chunks
+    merged without their overlap and the result fitted to
+    CONTEXT_TOKEN_BUDGET (see app.chat.context.pack_context); otherwise
+    every chunk is included verbatim.
+    
+    Args:
+        chunks: Retrieved chunks with metadata and scores
+        
+    Returns:
+        Tuple of (context string, chunks used in the context)
+    """
+    if not settings.CONTEXT_PACKING_ENABLED:
+        return build_context_from_chunks(chunks), chunks
+    return pack_context(
+        chunks,
+        token_budget=settings.CONTEXT_TOKEN_BUDGET,
+        min_relative_score=settings.CONTEXT_MIN_RELATIVE_SCORE
+    )
+
+
 async def generate_chat_completion(
     user_message: str,
     context: str,
@@ -118,24 +195,20 @@ async def generate_chat_completion(
         AI-generated response
     """
     try:
-        client = get_openai_client()
+        client = get_async_openai_client()
         
         # Build system prompt with context
         system_prompt = SYSTEM_PROMPT_TEMPLATE.format(context=context)
         
-        # Create chat completion (run in thread pool to avoid blocking)
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
+        # Create chat completion on the shared async connection pool
+        response = await client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message}
+            ],
+            temperature=0.7,
+            max_tokens=1000
         )
         
         return response.choices[0].message.content
@@ -143,6 +216,136 @@ async def generate_chat_completion(
         raise Exception(f"Failed to generate chat completion: {str(e)}")
 
 
+async def stream_chat_completion(
+    user_message: str,
+    context: str,
+    model: str = "gpt-4o-mini"
+) -> AsyncIterator[str]:
+    """
+    Stream a chat completion using OpenAI with RAG context.
+    
+    Same prompt and parameters as generate_chat_completion, but yields the
+    reply as text deltas while the model generates it. The upstream
+    response is closed if the consumer stops early (client disconnect).
+    
+    Args:
+        user_message: User's query message
+        context: Retrieved context from documents
+        model: OpenAI model to use (default: gpt-4o-mini)
+        
+    Yields:
+        Text deltas of the AI-generated response
+    """
+    try:
+        client = get_async_openai_client()
+        
+        system_prompt = SYSTEM_PROMPT_TEMPLATE.format(context=context)
+        
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message}
+            ],
+            temperature=0.7,
+            max_tokens=1000,
+            stream=True
+        )
+    except Exception as e:
+        raise Exception(f"Failed to generate chat completion: {str(e)}")
+    
+    try:
+        async for event in stream:
+            if not event.choices:
+                continue
+            delta = event.choices[0].delta.content
+            if delta:
+                yield delta
+    except Exception as e:
+        raise Exception(f"Failed to generate chat completion: {str(e)}")
+    finally:
+        await stream.close()
+
+
+def format_source_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Format retrieved chunks as source previews for a response.
+    
+    Args:
+        chunks: Retrieved chunks with metadata and scores
+        
+    Returns:
+        List of source chunk dicts (document_id, chunk_index, text preview, score)
+    """
+    source_chunks = []
+    for chunk in chunks:
+        source_chunks.append({
+            "document_id": chunk.get('metadata', {}).get('document_id'),
+            "chunk_index": chunk.get('metadata', {}).get('chunk_index'),
+            "text": chunk.get('metadata', {}).get('text', '')[:200] + '...',  # Preview
+            "score": chunk.get('score', 0.0)
+        })
+    return source_chunks
+
+
+async def lookup_cached_answer(
+    workspace_id: UUID,
+    user_message: str
+) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    Look up an answer in the answer cache.
+    
+    Tries the normalized question first, then (except for keyword lookups
+    such as identifiers, where similar embeddings do not mean the same
+    question) the most similar cached question. The question embedding is
+    computed at most once and handed back for retrieval on a miss.
+    
+    Args:
+        workspace_id: UUID of the workspace
+        user_message: User's query message
+        
+    Returns:
+        (cached result or None, lookup state for store_cached_answer, or
+        None when the cache is disabled)
+    """
+    cache = get_answer_cache()
+    if cache is None:
+        return None, None
+    
+    lookup = {
+        "normalized": normalize_question(user_message),
+        "generation": cache.generation(workspace_id),
+        "embedding": None
+    }
+    cached = cache.get_exact(workspace_id, lookup["normalized"])
+    if cached is not None:
+        print(f"[RAG-QUERY] Answer cache hit (exact)")
+        return cached, lookup
+    
+    if not is_keyword_query(user_message):
+        lookup["embedding"] = await get_embedding_async(user_message, "text-embedding-3-small")
+        similar = cache.get_similar(workspace_id, lookup["embedding"])
+        if similar is not None:
+            cached, similarity = similar
+            print(f"[RAG-QUERY] Answer cache hit (similarity {similarity:.3f})")
+            return cached, lookup
+    else:
+        cache.record_miss()
+    return None, lookup
+
+
+def store_cached_answer(workspace_id: UUID, lookup: Optional[Dict[str, Any]], result: Dict[str, Any]) -> None:
+    """Store a freshly computed answer under a lookup from lookup_cached_answer."""
+    cache = get_answer_cache()
+    if cache is None or lookup is None:
+        return
+    cache.put(workspace_id, lookup["normalized"], lookup["embedding"], result, lookup["generation"])
+
+
+def _coalescing_key(workspace_id: UUID, user_message: str, top_k: int, model: str, kind: str) -> Tuple[str, ...]:
+    return (kind, str(workspace_id), normalize_question(user_message), str(top_k), model)
+
+
 async def query_rag(
     workspace_id: UUID,
     user_message: str,
@@ -152,6 +355,12 @@ async def query_rag(
     """
     Complete RAG query pipeline: retrieve chunks and generate response.
     
+    Repeated and near-duplicate questions are answered from the answer
+    cache (see lookup_cached_answer) without retrieval or generation.
+    Identical questions (same workspace and normalized message) asked while
+    one is still being answered wait for that answer instead of running
+    the pipeline again.
+    
     Args:
         workspace_id: UUID of the workspace
         user_message: User's query message
@@ -161,28 +370,175 @@ async def query_rag(
     Returns:
         Dictionary with reply and source_chunks
     """
+    if not settings.QUERY_COALESCING_ENABLED:
+        return await _answer_query(workspace_id, user_message, top_k, model)
+    
+    result = await get_query_coalescer().run(
+        _coalescing_key(workspace_id, user_message, top_k, model, "query"),
+        lambda: _answer_query(workspace_id, user_message, top_k, model)
+    )
+    # Callers may modify their copy
+    return dict(result)
+
+
+async def _answer_query(
+    workspace_id: UUID,
+    user_message: str,
+    top_k: int,
+    model: str
+) -> Dict[str, Any]:
+    """
+    Answer a question: answer cache, then retrieval and generation.
+    
+    Args:
+        workspace_id: UUID of the workspace
+        user_message: User's query message
+        top_k: Number of chunks to retrieve
+        model: OpenAI model to use
+        
+    Returns:
+        Dictionary with reply and source_chunks
+    """
+    # Step 0: Answer repeated questions from the cache
+    cached, lookup = await lookup_cached_answer(workspace_id, user_message)
+    if cached is not None:
+        return cached
+    
     # Step 1: Retrieve relevant chunks
-    chunks = await retrieve_relevant_chunks(workspace_id, user_message, top_k)
+    chunks = await retrieve_relevant_chunks(
+        workspace_id,
+        user_message,
+        top_k,
+        query_embedding=lookup["embedding"] if lookup else None
+    )
     
-    # Step 2: Build context
-    context = build_context_from_chunks(chunks)
+    # Step 2: Build context (only chunks that made it in are cited)
+    context, chunks = build_prompt_context(chunks)
     
     # Step 3: Generate response
     reply = await generate_chat_completion(user_message, context, model)
     
     # Step 4: Format source chunks for response
-    source_chunks = []
-    for chunk in chunks:
-        source_chunks.append({
-            "document_id": chunk.get('metadata', {}).get('document_id'),
-            "chunk_index": chunk.get('metadata', {}).get('chunk_index'),
-            "text": chunk.get('metadata', {}).get('text', '')[:200] + '...',  # Preview
-            "score": chunk.get('score', 0.0)
-        })
+    source_chunks = format_source_chunks(chunks)
     
-    return {
+    result = {
         "reply": reply,
         "source_chunks": source_chunks,
         "chunks_count": len(chunks)
     }
+    store_cached_answer(workspace_id, lookup, result)
+    return result
+
+
+async def query_rag_stream(
+    workspace_id: UUID,
+    user_message: str,
+    top_k: int = 5,
+    model: str = "gpt-4o-mini"
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming RAG query pipeline.
+    
+    Events are those of _stream_answer. Identical questions (same workspace
+    and normalized message) asked while one is still streaming share its
+    stream; callers that join late first receive the events sent so far.
+    
+    Args:
+        workspace_id: UUID of the workspace
+        user_message: User's query message
+        top_k: Number of chunks to retrieve
+        model: OpenAI model to use
+        
+    Yields:
+        Event dicts with "event" and "data"
+    """
+    if not settings.QUERY_COALESCING_ENABLED:
+        events = _stream_answer(workspace_id, user_message, top_k, model)
+    else:
+        events = get_query_coalescer().stream(
+            _coalescing_key(workspace_id, user_message, top_k, model, "stream"),
+            lambda: _stream_answer(workspace_id, user_message, top_k, model)
+        )
+    try:
+        async for event in events:
+            yield event
+    finally:
+        await events.aclose()
+
+
+async def _stream_answer(
+    workspace_id: UUID,
+    user_message: str,
+    top_k: int,
+    model: str
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Answer a question as a stream of events.
+    
+    Yields events in order:
+    - {"event": "sources", "data": {"source_chunks", "chunks_count"}} once
+      retrieval finishes, before any generation
+    - {"event": "token", "data": {"delta"}} for each text delta
+    - {"event": "done", "data": {"reply", "chunks_count"}} with the full reply
+    
+    When nothing is retrieved, NO_CONTEXT_REPLY is sent as the only token
+    and the model is not called. Answers found in the answer cache are
+    sent as a single token.
+    
+    Args:
+        workspace_id: UUID of the workspace
+        user_message: User's query message
+        top_k: Number of chunks to retrieve
+        model: OpenAI model to use
+        
+    Yields:
+        Event dicts with "event" and "data"
+    """
+    # Step 0: Answer repeated questions from the cache
+    cached, lookup = await lookup_cached_answer(workspace_id, user_message)
+    if cached is not None:
+        yield {
+            "event": "sources",
+            "data": {"source_chunks": cached["source_chunks"], "chunks_count": cached["chunks_count"]}
+        }
+        yield {"event": "token", "data": {"delta": cached["reply"]}}
+        yield {"event": "done", "data": {"reply": cached["reply"], "chunks_count": cached["chunks_count"]}}
+        return
+    
+    # Step 1: Retrieve relevant chunks
+    chunks = await retrieve_relevant_chunks(
+        workspace_id,
+        user_message,
+        top_k,
+        query_embedding=lookup["embedding"] if lookup else None
+    )
+    context, chunks = build_prompt_context(chunks)
+    source_chunks = format_source_chunks(chunks)
+    yield {
+        "event": "sources",
+        "data": {"source_chunks": source_chunks, "chunks_count": len(chunks)}
+    }
+    
+    # Step 2: Stream the response
+    if not chunks:
+        reply = NO_CONTEXT_REPLY
+        yield {"event": "token", "data": {"delta": reply}}
+    else:
+        parts = []
+        deltas = stream_chat_completion(user_message, context, model)
+        try:
+            async for delta in deltas:
+                parts.append(delta)
+                yield {"event": "token", "data": {"delta": delta}}
+        finally:
+            # Close the upstream response even if the consumer stops early
+            await deltas.aclose()
+        reply = "".join(parts)
+    
+    store_cached_answer(
+        workspace_id,
+        lookup,
+        {"reply": reply, "source_chunks": source_chunks, "chunks_count": len(chunks)}
+    )
+    yield {"event": "done", "data": {"reply": reply, "chunks_count": len(chunks)}}
 
@@ -2,49 +2,39 @@
 Chat completion routes for RAG-powered chatbot.
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
-from typing import Optional
-from app.db.database import get_db
+from typing import Any, AsyncIterator, Dict, Optional
+from app.db.database import get_async_db, AsyncSessionLocal
 from app.db.models import User, Workspace, MessageLog
 from app.db.schemas import ChatQueryRequest, ChatQueryResponse
 from app.dependencies.auth import get_optional_user
-from app.chat.rag_query import query_rag
+from app.dependencies.cache import load_workspace
+from app.chat.rag_query import query_rag, query_rag_stream, NO_CONTEXT_REPLY
 import asyncio
+import json
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+# Seconds to wait for the full reply (or, when streaming, for the next event)
+QUERY_TIMEOUT = 30.0
 
-@router.post("/query", response_model=ChatQueryResponse, status_code=status.HTTP_200_OK)
-async def chat_query(
+
+async def get_chat_workspace(
     request: ChatQueryRequest,
-    http_request: Request,
-    current_user: Optional[User] = Depends(get_optional_user),
-    db: Session = Depends(get_db)
-):
+    current_user: Optional[User],
+    db: AsyncSession
+) -> Workspace:
     """
-    Query the RAG-powered chatbot with a message.
-    
-    This endpoint supports both authenticated and public (widget) access:
-    - If JWT token provided: Validates workspace ownership
-    - If no token (public/widget): Validates workspace exists (for widget usage)
-    
-    Args:
-        request: Chat query request with workspace_id and message
-        authorization: Optional JWT token in Authorization header
-        current_user: Current authenticated user (optional, from dependency)
-        db: Database session
-        
-    Returns:
-        ChatQueryResponse with AI reply and source chunks
+    Validate a chat query and return its workspace.
         
     Raises:
-        HTTPException: If validation fails or query error occurs
+        HTTPException: If the workspace is missing, not owned by an
+            authenticated caller, or the message is empty
     """
     # Verify workspace exists
-    workspace = db.query(Workspace).filter(
-        Workspace.id == request.workspace_id
-    ).first()
+    workspace = await load_workspace(db, request.workspace_id)
     
     if not workspace:
         raise HTTPException(
@@ -67,6 +57,59 @@ async def chat_query(
             detail="Message cannot be empty"
         )
     
+    return workspace
+
+
+async def log_message(db: AsyncSession, workspace_id: UUID, question: str, answer: str, is_context_used: bool) -> None:
+    """Write a MessageLog entry for analytics (failures are only logged)."""
+    try:
+        message_log = MessageLog(
+            workspace_id=workspace_id,
+            question=question,
+            answer=answer,
+            is_context_used=is_context_used
+        )
+        db.add(message_log)
+        await db.commit()
+    except Exception as log_error:
+        # Don't fail the request if logging fails, just log the error
+        print(f"Failed to log message: {str(log_error)}")
+        await db.rollback()
+
+
+def format_sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/query", response_model=ChatQueryResponse, status_code=status.HTTP_200_OK)
+async def chat_query(
+    request: ChatQueryRequest,
+    http_request: Request,
+    current_user: Optional[User] = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Query the RAG-powered chatbot with a message.
+    
+    This endpoint supports both authenticated and public (widget) access:
+    - If JWT token provided: Validates workspace ownership
+    - If no token (public/widget): Validates workspace exists (for widget usage)
+    
+    Args:
+        request: Chat query request with workspace_id and message
+        authorization: Optional JWT token in Authorization header
+        current_user: Current authenticated user (optional, from dependency)
+        db: Database session
+        
+    Returns:
+        ChatQueryResponse with AI reply and source chunks
+        
+    Raises:
+        HTTPException: If validation fails or query error occurs
+    """
+    await get_chat_workspace(request, current_user, db)
+    
     try:
         # Execute RAG query with timeout
         try:
@@ -77,7 +120,7 @@ async def chat_query(
                     top_k=5,
                     model="gpt-4o-mini"
                 ),
-                timeout=30.0  # 30 second timeout
+                timeout=QUERY_TIMEOUT
             )
         except asyncio.TimeoutError:
             raise HTTPException(
@@ -87,26 +130,14 @@ async def chat_query(
         
         # Handle no context case
         if result["chunks_count"] == 0:
-            result["reply"] = "I don't have any relevant information in the documents to answer this question. Please make sure documents are uploaded and processed in this workspace."
+            result["reply"] = NO_CONTEXT_REPLY
             result["source_chunks"] = []
         
         # Determine if context was used
         is_context_used = result["chunks_count"] > 0
         
         # Log the message for analytics
-        try:
-            message_log = MessageLog(
-                workspace_id=request.workspace_id,
-                question=request.message.strip(),
-                answer=result["reply"],
-                is_context_used=is_context_used
-            )
-            db.add(message_log)
-            db.commit()
-        except Exception as log_error:
-            # Don't fail the request if logging fails, just log the error
-            print(f"Failed to log message: {str(log_error)}")
-            db.rollback()
+        await log_message(db, request.workspace_id, request.message.strip(), result["reply"], is_context_used)
         
         return ChatQueryResponse(**result)
         
@@ -117,3 +148,72 @@ async def chat_query(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to process chat query: {str(e)}"
         )
+
+
+@router.post("/query/stream", status_code=status.HTTP_200_OK)
+async def chat_query_stream(
+    request: ChatQueryRequest,
+    http_request: Request,
+    current_user: Optional[User] = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Query the RAG-powered chatbot and stream the reply as Server-Sent Events.
+    
+    Same access rules as POST /chat/query. Events, in order:
+    - `sources`: {"source_chunks", "chunks_count"} as soon as retrieval is done
+    - `token`: {"delta"} for each piece of the reply as the model generates it
+    - `done`: {"reply", "chunks_count"} with the full reply
+    - `error`: {"detail"} instead of the remaining events if the query fails
+    
+    The MessageLog entry is written once the reply is complete; streams that
+    fail or are abandoned by the client are not logged.
+    
+    Args:
+        request: Chat query request with workspace_id and message
+        current_user: Current authenticated user (optional, from dependency)
+        db: Database session
+        
+    Returns:
+        text/event-stream response
+        
+    Raises:
+        HTTPException: If validation fails (before the stream starts)
+    """
+    await get_chat_workspace(request, current_user, db)
+    workspace_id = request.workspace_id
+    message = request.message.strip()
+    
+    async def event_stream() -> AsyncIterator[str]:
+        events = query_rag_stream(
+            workspace_id=workspace_id,
+            user_message=message,
+            top_k=5,
+            model="gpt-4o-mini"
+        )
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.__anext__(), timeout=QUERY_TIMEOUT)
+                except StopAsyncIteration:
+                    return
+                
+                if event["event"] == "done":
+                    # The request's session is closed once streaming starts
+                    async with AsyncSessionLocal() as log_db:
+                        data = event["data"]
+                        await log_message(log_db, workspace_id, message, data["reply"], data["chunks_count"] > 0)
+                
+                yield format_sse_event(event["event"], event["data"])
+        except asyncio.TimeoutError:
+            yield format_sse_event("error", {"detail": "Query timeout - please try again with a shorter message"})
+        except Exception as e:
+            yield format_sse_event("error", {"detail": f"Failed to process chat query: {str(e)}"})
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
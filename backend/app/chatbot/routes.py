@@ -2,12 +2,13 @@
 Chatbot settings routes for widget customization.
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.models import Workspace
 from app.db.schemas import ChatbotSettingsUpdate, ChatbotSettingsResponse
 from app.dependencies.workspace import verify_workspace_ownership
+from app.dependencies.cache import invalidate_workspace
 
 router = APIRouter(prefix="/chatbot", tags=["chatbot"])
 
@@ -16,7 +17,7 @@ router = APIRouter(prefix="/chatbot", tags=["chatbot"])
 async def get_chatbot_settings(
     workspace_id: UUID,
     workspace: Workspace = Depends(verify_workspace_ownership),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get chatbot customization settings for a workspace.
@@ -45,7 +46,7 @@ async def update_chatbot_settings(
     workspace_id: UUID,
     settings: ChatbotSettingsUpdate,
     workspace: Workspace = Depends(verify_workspace_ownership),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update chatbot customization settings for a workspace.
@@ -61,6 +62,9 @@ async def update_chatbot_settings(
     Returns:
         ChatbotSettingsResponse with updated settings
     """
+    # The verified workspace may be a shared cached copy; update this session's row
+    workspace = await db.get(Workspace, workspace.id)
+    
     # Update only provided fields
     update_data = settings.model_dump(exclude_unset=True)
     
@@ -76,8 +80,9 @@ async def update_chatbot_settings(
     if "welcome_message" in update_data and update_data["welcome_message"] is not None:
         workspace.welcome_message = update_data["welcome_message"]
     
-    db.commit()
-    db.refresh(workspace)
+    await db.commit()
+    await db.refresh(workspace)
+    invalidate_workspace(workspace.id)
     
     # Return updated settings with defaults for None values
     return ChatbotSettingsResponse(
@@ -18,6 +18,11 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     
+    # Auth lookup cache (users and workspaces checked by dependencies)
+    AUTH_CACHE_ENABLED: bool = True
+    AUTH_CACHE_TTL_SECONDS: float = 60.0  # Bounds staleness across worker processes
+    AUTH_CACHE_MAX_ENTRIES: int = 10000  # Per cache
+    
     # Application
     ENVIRONMENT: str = "development"
     DEBUG: bool = True
@@ -25,9 +30,103 @@ class Settings(BaseSettings):
     # Pinecone
     PINECONE_API_KEY: str = ""
     PINECONE_INDEX_NAME: str = "rag-chatbots"
+    PINECONE_UPSERT_MAX_BYTES: int = 1_500_000  # Estimated payload per upsert request (API limit: 2 MB)
+    PINECONE_UPSERT_MAX_VECTORS: int = 200  # Vectors per upsert request (API limit: 1000)
+    PINECONE_UPSERT_PARALLELISM: int = 4  # Upsert requests in flight at once
+    PINECONE_UPSERT_RETRIES: int = 3  # Retries per failed upsert batch
+    
+    # Vector store
+    VECTOR_STORE: str = "pinecone"  # "pinecone", or self-hosted "local" (exact) / "hnsw" (approximate)
+    VECTOR_STORE_DIR: str = "storage/vectors"
+    VECTOR_STORE_FORMAT: str = "float32"  # "float32", "float16" or "int8" (per-vector scale); new namespaces only
+    VECTOR_STORE_DIMENSIONS: int = 0  # Keep only the first N dimensions (Matryoshka); 0 = all
+    VECTOR_STORE_RESCORE: bool = False  # Keep full float32 vectors on disk and re-rank candidates with them
+    VECTOR_STORE_RESCORE_FACTOR: int = 4  # Candidates per result taken from the compact search
+    HNSW_M: int = 16  # Graph degree (layer 0 uses 2*M); defaults for new namespaces
+    HNSW_EF_CONSTRUCTION: int = 100
+    HNSW_EF_SEARCH: int = 64  # Higher = better recall, slower queries
+    
+    # Chunk text store
+    CHUNK_STORE_DIR: str = "storage/chunks"
+    CHUNK_TEXT_IN_METADATA: bool = True  # Also keep text in vector metadata; only disable on a persistent disk
+    
+    # Answer cache
+    ANSWER_CACHE_ENABLED: bool = True  # Reuse answers to repeated questions per workspace
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95  # Cosine similarity for a near-duplicate question
+    ANSWER_CACHE_MAX_ENTRIES: int = 500  # Answers kept per workspace (least recently used evicted)
+    ANSWER_CACHE_TTL_SECONDS: int = 86400  # 0 = keep until invalidated
+    
+    # In-flight query coalescing (identical concurrent questions share one answer)
+    QUERY_COALESCING_ENABLED: bool = True
+    
+    # Orphan vector reconciler
+    ORPHAN_RECONCILE_INTERVAL_SECONDS: int = 0  # Background purge of unowned vectors; 0 = disabled
+    ORPHAN_RECONCILE_DRY_RUN: bool = True  # Only report what would be removed
+    ORPHAN_RECONCILE_DELETE_WORKSPACES: bool = False  # Also delete namespaces of workspaces unknown to this database
+    
+    # Lexical / hybrid retrieval
+    LEXICAL_INDEX_ENABLED: bool = True  # BM25 index over the chunk store
+    HYBRID_SEARCH_ENABLED: bool = True  # Fuse BM25 and vector hits at query time
+    HYBRID_CANDIDATES: int = 20  # Hits taken from each retriever before fusion
+    HYBRID_RRF_K: int = 60  # Reciprocal-rank fusion damping constant
+    LEXICAL_FAST_PATH: bool = True  # Answer keyword lookups without an embedding call
+    LEXICAL_FAST_PATH_MAX_TERMS: int = 4
+    
+    # MMR diversification of retrieved chunks
+    MMR_ENABLED: bool = True  # Pick top_k of over-fetched candidates by maximal marginal relevance
+    MMR_FETCH_FACTOR: int = 4  # Candidates fetched per chunk kept
+    MMR_LAMBDA: float = 0.7  # Relevance / diversity trade-off (1 = relevance only)
+    MMR_DUPLICATE_THRESHOLD: float = 0.95  # Cosine similarity at which a candidate is a duplicate
+    
+    # Context packing
+    CONTEXT_PACKING_ENABLED: bool = True  # Merge adjacent chunks and fill a token budget
+    CONTEXT_TOKEN_BUDGET: int = 1500  # Estimated prompt tokens for retrieved context
+    CONTEXT_MIN_RELATIVE_SCORE: float = 0.5  # Drop matches whose cosine similarity is below this fraction of the best
     
     # OpenAI
     OPENAI_API_KEY: str = ""
+    OPENAI_MAX_CONNECTIONS: int = 200  # Shared async connection pool (query path)
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 50
+    OPENAI_TIMEOUT: float = 30.0
+    
+    # Embeddings
+    EMBEDDING_PROVIDER: str = "openai"  # "openai", "hashing" (offline) or "onnx" (offline)
+    EMBEDDING_DIMENSIONS: int = 1024  # Must match the Pinecone index
+    EMBED_ONNX_MODEL_PATH: str = ""  # Local model.onnx for the "onnx" provider
+    EMBED_ONNX_TOKENIZER_PATH: str = ""  # Local tokenizer.json for the "onnx" provider
+    EMBED_ONNX_MAX_LENGTH: int = 512
+    EMBED_ONNX_BATCH_SIZE: int = 32
+    EMBED_BATCH_MAX_ITEMS: int = 256  # Inputs per embeddings request (API max: 2048)
+    EMBED_BATCH_MAX_TOKENS: int = 100000  # Estimated tokens per embeddings request
+    EMBED_PARALLELISM: int = 4  # Embeddings requests in flight at once
+    
+    # Query embedding micro-batching
+    EMBED_QUERY_BATCHING_ENABLED: bool = True
+    EMBED_QUERY_BATCH_WINDOW_MS: float = 5.0  # How long the first query waits for others
+    EMBED_QUERY_BATCH_MAX_ITEMS: int = 64  # Send early once this many queries wait
+    
+    # Embedding cache
+    EMBED_CACHE_ENABLED: bool = True
+    EMBED_CACHE_PATH: str = "storage/embedding_cache.sqlite3"
+    EMBED_CACHE_MEMORY_ITEMS: int = 10000  # In-process LRU entries
+    EMBED_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # On-disk vector bytes before eviction
+    
+    # PDF extraction
+    PDF_PARALLEL_EXTRACTION: bool = False  # Split pages across a process pool
+    PDF_EXTRACT_WORKERS: int = 0  # 0 = use os.cpu_count()
+    PDF_PARALLEL_MIN_PAGES: int = 32  # Smaller PDFs are read sequentially
+    TEXT_CACHE_ENABLED: bool = True  # Reuse cleaned text when a PDF is re-processed
+    TEXT_CACHE_DIR: str = "storage/text_cache"
+    
+    # Chunking
+    CHUNKING_MODE: str = "chars"  # "chars" or "tokens"
+    CHUNK_MAX_TOKENS: int = 256  # Token budget per chunk in "tokens" mode
+    CHUNK_OVERLAP_TOKENS: int = 32
+    TOKENIZER_FILE: str = ""  # Local cl100k_base.tiktoken file
+    
+    # Ingestion pipeline
+    INGEST_BATCH_SIZE: int = 64  # Chunks per embedding/upsert batch
+    INGEST_QUEUE_SIZE: int = 4  # Batches buffered between pipeline stages
     
     class Config:
         env_file = ".env"
@@ -1,8 +1,13 @@
 """
 Database connection and session management.
 Supports both local PostgreSQL and Supabase.
+
+Route handlers use the async engine (psycopg async driver) so database
+I/O does not block the event loop; the synchronous engine remains for
+migrations and work that runs in worker threads.
 """
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -21,13 +26,48 @@ engine = create_engine(
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def get_async_database_url(url: str) -> str:
+    """
+    Point a PostgreSQL URL at the psycopg (v3) driver, which SQLAlchemy
+    runs in async mode under create_async_engine.
+    
+    Args:
+        url: Database URL (postgresql://, postgres:// or with a driver)
+        
+    Returns:
+        postgresql+psycopg:// URL for the same database
+    """
+    scheme, separator, rest = url.partition("://")
+    if separator and scheme.split("+")[0] in ("postgresql", "postgres"):
+        return f"postgresql+psycopg://{rest}"
+    return url
+
+
+# Create async database engine (same pool settings as the sync engine)
+async_engine = create_async_engine(
+    get_async_database_url(settings.DATABASE_URL),
+    pool_pre_ping=True,
+    pool_size=5,
+    max_overflow=10,
+    pool_recycle=3600,
+    echo=settings.DEBUG,
+    # No server-side prepared statements: they break behind PgBouncer in
+    # transaction mode (the Supabase pooler)
+    connect_args={"prepare_threshold": None}
+)
+
+# Create async session factory (objects stay usable after commit, since
+# expired attributes cannot be lazily reloaded in async code)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Base class for models
 Base = declarative_base()
 
 
 def get_db():
     """
-    Dependency function to get database session.
+    Dependency function to get a synchronous database session.
     Yields a database session and ensures it's closed after use.
     
     Yields:
@@ -39,3 +79,14 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    """
+    Dependency function to get an async database session.
+    Yields a database session and ensures it's closed after use.
+    
+    Yields:
+        AsyncSession
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
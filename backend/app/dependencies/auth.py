@@ -3,10 +3,11 @@ Authentication dependencies for protected routes.
 """
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_async_db
 from app.db.models import User
 from app.auth.jwt_handler import verify_token
+from app.dependencies.cache import load_user
 
 # HTTP Bearer token scheme
 security = HTTPBearer()
@@ -14,10 +15,11 @@ security = HTTPBearer()
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """
     Dependency to get the current authenticated user from JWT token.
+    The user is read from the lookup cache when possible (read-only then).
     
     Args:
         credentials: HTTP Bearer token credentials
@@ -39,7 +41,7 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+    user = await load_user(db, token_data.user_id)
     
     if user is None:
         raise HTTPException(
@@ -53,7 +55,7 @@ async def get_current_user(
 
 async def get_optional_user(
     http_request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User | None:
     """
     Dependency to optionally get the current authenticated user from JWT token.
@@ -83,7 +85,7 @@ async def get_optional_user(
         if token_data is None:
             return None
         
-        user = db.query(User).filter(User.id == token_data.user_id).first()
+        user = await load_user(db, token_data.user_id)
         return user
     except Exception:
         return None
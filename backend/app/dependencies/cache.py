@@ -0,0 +1,205 @@
+"""
+Lookup cache for authorization dependencies.
+Keeps recently loaded users and workspaces in process for a short TTL, so
+the auth and workspace checks on hot paths (chat) skip the database.
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.models import User, Workspace
+
+
+class LookupCache:
+    """
+    TTL cache of ORM objects keyed by primary key.
+    
+    Cached objects are detached from their session and shared between
+    requests, so they are read-only: code that modifies a row must load it
+    again in its own session and invalidate the key afterwards. Entries of
+    another worker process are only refreshed by the TTL.
+    
+    Every invalidation bumps a generation; objects loaded before it are
+    not stored, so a lookup racing with an update cannot cache the old row.
+    """
+    
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # key -> (expires at, object)
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    def get(self, key: UUID) -> Optional[Any]:
+        """Cached object, or None if missing or expired."""
+        key = str(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def generation(self) -> int:
+        """Current generation (read before loading an object to cache)."""
+        with self._lock:
+            return self._generation
+    
+    def put(self, key: UUID, value: Any, generation: int) -> bool:
+        """
+        Cache an object for ttl_seconds.
+        
+        Args:
+            key: Primary key
+            value: Detached object
+            generation: Generation read before the object was loaded
+        
+        Returns:
+            False if something was invalidated since (nothing stored)
+        """
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._entries[str(key)] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(str(key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+    
+    def invalidate(self, key: UUID) -> bool:
+        """
+        Drop a cached object.
+        
+        Returns:
+            True if it was cached
+        """
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            return self._entries.pop(str(key), None) is not None
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and cache size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+            }
+
+
+# Lookup caches (initialized lazily)
+_user_cache: Optional[LookupCache] = None
+_workspace_cache: Optional[LookupCache] = None
+
+
+def get_user_cache() -> Optional[LookupCache]:
+    """
+    Get or initialize the user cache.
+    
+    Returns:
+        LookupCache, or None if AUTH_CACHE_ENABLED is off
+    """
+    global _user_cache
+    if not settings.AUTH_CACHE_ENABLED:
+        return None
+    if _user_cache is None:
+        _user_cache = LookupCache("users", settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
+    return _user_cache
+
+
+def get_workspace_cache() -> Optional[LookupCache]:
+    """
+    Get or initialize the workspace cache.
+    
+    Returns:
+        LookupCache, or None if AUTH_CACHE_ENABLED is off
+    """
+    global _workspace_cache
+    if not settings.AUTH_CACHE_ENABLED:
+        return None
+    if _workspace_cache is None:
+        _workspace_cache = LookupCache("workspaces", settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
+    return _workspace_cache
+
+
+async def _load(db: AsyncSession, cache: Optional[LookupCache], model, key: UUID) -> Optional[Any]:
+    generation = 0
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        generation = cache.generation()
+    
+    found = await db.scalar(select(model).where(model.id == key))
+    if found is not None and cache is not None:
+        # Detach, so a rollback or commit in this session never expires the shared copy
+        db.expunge(found)
+        cache.put(key, found, generation)
+    return found
+
+
+async def load_user(db: AsyncSession, user_id: UUID) -> Optional[User]:
+    """
+    Look up a user by id, from the cache when possible.
+    
+    Args:
+        db: Database session (used on a cache miss)
+        user_id: UUID of the user
+        
+    Returns:
+        User (read-only when cached), or None if it does not exist
+    """
+    return await _load(db, get_user_cache(), User, user_id)
+
+
+async def load_workspace(db: AsyncSession, workspace_id: UUID) -> Optional[Workspace]:
+    """
+    Look up a workspace by id, from the cache when possible.
+    
+    Args:
+        db: Database session (used on a cache miss)
+        workspace_id: UUID of the workspace
+        
+    Returns:
+        Workspace (read-only when cached), or None if it does not exist
+    """
+    return await _load(db, get_workspace_cache(), Workspace, workspace_id)
+
+
+def invalidate_user(user_id: UUID) -> None:
+    """Drop a user's cached row after it changed or was deleted."""
+    cache = get_user_cache()
+    if cache is not None:
+        cache.invalidate(user_id)
+
+
+def invalidate_workspace(workspace_id: UUID) -> None:
+    """Drop a workspace's cached row after it changed or was deleted."""
+    cache = get_workspace_cache()
+    if cache is not None:
+        cache.invalidate(workspace_id)
+
+
+def get_lookup_cache_stats() -> Dict[str, Optional[Dict[str, Any]]]:
+    """Counters of the user and workspace caches (None before first use)."""
+    return {
+        "users": _user_cache.stats() if _user_cache is not None else None,
+        "workspaces": _workspace_cache.stats() if _workspace_cache is not None else None,
+    }
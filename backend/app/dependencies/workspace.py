@@ -2,20 +2,23 @@
 Workspace ownership validation dependencies.
 """
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.models import User, Workspace
 from app.dependencies.auth import get_current_user
+from app.dependencies.cache import load_workspace
 
 
 async def verify_workspace_ownership(
     workspace_id: UUID,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Workspace:
     """
     Verify that the current user owns the specified workspace.
+    The workspace is read from the lookup cache when possible, in which
+    case it is read-only (see app.dependencies.cache).
     
     Args:
         workspace_id: UUID of the workspace to verify
@@ -28,12 +31,9 @@ async def verify_workspace_ownership(
     Raises:
         HTTPException: If workspace not found or user doesn't own it
     """
-    workspace = db.query(Workspace).filter(
-        Workspace.id == workspace_id,
-        Workspace.user_id == current_user.id
-    ).first()
+    workspace = await load_workspace(db, workspace_id)
     
-    if not workspace:
+    if not workspace or workspace.user_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Workspace not found or you don't have access to it"
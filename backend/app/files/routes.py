@@ -2,16 +2,17 @@
 File upload routes for document management.
 """
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Form, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from uuid import UUID
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.models import User, Document
 from app.db.schemas import DocumentResponse, FileUploadResponse
 from app.dependencies.auth import get_current_user
 from app.dependencies.workspace import verify_workspace_ownership
-from app.files.service import save_file_to_storage, create_document_record
-from app.rag.pipeline import process_document
+from app.files.service import save_file_to_storage, create_document_record, replace_document_file
+from app.rag.pipeline import process_document_in_background
 
 router = APIRouter(prefix="/files", tags=["files"])
 
@@ -23,7 +24,7 @@ async def upload_files(
     auto_process: bool = Form(False, description="Automatically process file after upload"),
     background_tasks: BackgroundTasks = BackgroundTasks(),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload one or more PDF files to a workspace.
@@ -77,7 +78,7 @@ async def upload_files(
         
         # Optionally trigger processing
         if auto_process:
-            background_tasks.add_task(process_document, document.id, db)
+            background_tasks.add_task(process_document_in_background, document.id)
         
         return FileUploadResponse(
             message="File uploaded successfully" + (" (processing started)" if auto_process else ""),
@@ -93,12 +94,74 @@ async def upload_files(
         )
 
 
+@router.put("/{document_id}", response_model=FileUploadResponse)
+async def upload_new_version(
+    document_id: UUID,
+    file: UploadFile = File(..., description="New version of the PDF file"),
+    auto_process: bool = Form(True, description="Re-index the document after upload"),
+    background_tasks: BackgroundTasks = BackgroundTasks(),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Upload a new version of an existing document.
+    
+    This endpoint:
+    - Requires JWT authentication
+    - Verifies document ownership through workspace
+    - Replaces the stored file, keeping the document id
+    - Optionally re-indexes the document; only chunks whose text changed
+      are embedded, and chunks missing from the new version are removed
+      
+    Args:
+        document_id: UUID of the document to update
+        file: New version of the PDF file
+        auto_process: Re-index the document after upload
+        current_user: Current authenticated user (from dependency)
+        db: Database session
+        
+    Returns:
+        FileUploadResponse with document information
+        
+    Raises:
+        HTTPException: If document not found, access denied or upload fails
+    """
+    document = await db.scalar(select(Document).where(Document.id == document_id))
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    # Verify workspace ownership
+    await verify_workspace_ownership(document.workspace_id, current_user, db)
+    
+    try:
+        document = await replace_document_file(document, file, db)
+        
+        if auto_process:
+            background_tasks.add_task(process_document_in_background, document.id)
+        
+        return FileUploadResponse(
+            message="New version uploaded successfully" + (" (re-indexing started)" if auto_process else ""),
+            document=DocumentResponse.model_validate(document)
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to upload new version: {str(e)}"
+        )
+
+
 @router.patch("/{document_id}/process", status_code=status.HTTP_202_ACCEPTED)
 async def process_document_endpoint(
     document_id: UUID,
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Trigger processing pipeline for a document.
@@ -122,7 +185,7 @@ async def process_document_endpoint(
         HTTPException: If document not found or access denied
     """
     # Get document
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.scalar(select(Document).where(Document.id == document_id))
     if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -134,7 +197,7 @@ async def process_document_endpoint(
     await verify_workspace_ownership(document.workspace_id, current_user, db)
     
     # Start background processing
-    background_tasks.add_task(process_document, document_id, db)
+    background_tasks.add_task(process_document_in_background, document_id)
     
     return {
         "message": "Processing started",
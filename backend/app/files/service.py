@@ -6,8 +6,9 @@ import uuid
 from pathlib import Path
 from typing import Tuple
 from fastapi import UploadFile, HTTPException, status
-from sqlalchemy.orm import Session
-from app.db.models import Document, Workspace
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import Document, DocumentStatus, Workspace
 from app.files.utils import (
     sanitize_filename,
     get_storage_path,
@@ -19,7 +20,7 @@ from app.files.utils import (
 async def save_file_to_storage(
     file: UploadFile,
     workspace_id: uuid.UUID,
-    db: Session
+    db: AsyncSession
 ) -> Tuple[str, int]:
     """
     Save uploaded file to local storage.
@@ -79,7 +80,7 @@ async def create_document_record(
     file_url: str,
     content_type: str,
     size_in_bytes: int,
-    db: Session
+    db: AsyncSession
 ) -> Document:
     """
     Create a document record in the database.
@@ -99,7 +100,7 @@ async def create_document_record(
         HTTPException: If workspace not found
     """
     # Verify workspace exists
-    workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
+    workspace = await db.scalar(select(Workspace).where(Workspace.id == workspace_id))
     if not workspace:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -116,8 +117,47 @@ async def create_document_record(
     )
     
     db.add(document)
-    db.commit()
-    db.refresh(document)
+    await db.commit()
+    await db.refresh(document)
     
     return document
 
+
+
+async def replace_document_file(
+    document: Document,
+    file: UploadFile,
+    db: AsyncSession
+) -> Document:
+    """
+    Store a new version of a document's file under the same document id.
+    
+    The document keeps its id (and so its indexed chunks, which the next
+    processing run diffs against); the previous file is removed from disk.
+    
+    Args:
+        document: Document to update
+        file: UploadFile with the new version
+        db: Database session
+        
+    Returns:
+        Updated Document object
+    """
+    file_url, file_size = await save_file_to_storage(file, document.workspace_id, db)
+    previous_file = document.file_url
+    
+    document.filename = file.filename
+    document.file_url = file_url
+    document.content_type = file.content_type or "application/pdf"
+    document.size_in_bytes = file_size
+    document.status = DocumentStatus.UPLOADED
+    await db.commit()
+    await db.refresh(document)
+    
+    try:
+        if previous_file and previous_file != file_url and os.path.exists(previous_file):
+            os.remove(previous_file)
+    except OSError as e:
+        print(f"Warning: Failed to remove previous file {previous_file}: {str(e)}")
+    
+    return document
@@ -12,6 +12,12 @@ from app.files.routes import router as files_router
 from app.chat.routes import router as chat_router
 from app.chatbot.routes import router as chatbot_router
 from app.analytics.routes import router as analytics_router
+from app.rag.embed import close_async_openai_client, get_query_embedding_stats
+from app.rag.answer_cache import get_answer_cache
+from app.chat.coalesce import get_query_coalescer
+from app.dependencies.cache import get_lookup_cache_stats
+from app.rag.storage import save_vector_index
+from app.rag.reconcile import start_orphan_reconciler, stop_orphan_reconciler
 
 # Create FastAPI application
 app = FastAPI(
@@ -51,6 +57,20 @@ app.include_router(analytics_router)
 app.mount("/widget", StaticFiles(directory="app/widget"), name="widget")
 
 
+@app.on_event("startup")
+async def startup():
+    """Start background maintenance tasks."""
+    start_orphan_reconciler()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Close pooled outbound connections and persist local index state."""
+    await stop_orphan_reconciler()
+    await close_async_openai_client()
+    save_vector_index()
+
+
 @app.get("/")
 async def root():
     """
@@ -77,3 +97,20 @@ async def health_check():
     """
     return {"status": "healthy"}
 
+
+@app.get("/health/metrics")
+async def metrics():
+    """
+    Query path metrics for tuning.
+    
+    Returns:
+        Query embedding batching, answer cache, query coalescing and
+        auth lookup cache statistics
+    """
+    answer_cache = get_answer_cache()
+    return {
+        "query_embedding_batching": get_query_embedding_stats(),
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "query_coalescing": get_query_coalescer().stats(),
+        "auth_lookup_cache": get_lookup_cache_stats()
+    }
@@ -0,0 +1,246 @@
+"""
+Semantic answer cache.
+Keeps recent RAG answers per workspace, found by exact match on the
+normalized question or by embedding similarity to an earlier question, and
+drops a workspace's answers whenever its indexed documents change.
+"""
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+import numpy as np
+from app.core.config import settings
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION_RE = re.compile(r"[\s?!.,;:]+$")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question for exact matching.
+    
+    Lowercases, collapses whitespace and drops trailing punctuation, so
+    "What is the refund policy?" and "what is the  refund policy" match.
+    
+    Args:
+        question: User question
+        
+    Returns:
+        Normalized question text
+    """
+    question = _WHITESPACE_RE.sub(" ", question.strip().lower())
+    return _TRAILING_PUNCTUATION_RE.sub("", question)
+
+
+class WorkspaceAnswers:
+    """Cached answers of one workspace, with a matrix of question embeddings."""
+    
+    def __init__(self):
+        # normalized question -> {"result", "embedding", "created"}
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.keys: List[str] = []
+        self.matrix: Optional[np.ndarray] = None
+        self.dirty = False
+    
+    def rebuild(self) -> None:
+        """Restack the embedding matrix after entries changed."""
+        self.keys = [key for key, entry in self.entries.items() if entry["embedding"] is not None]
+        self.matrix = (
+            np.stack([self.entries[key]["embedding"] for key in self.keys])
+            if self.keys else None
+        )
+        self.dirty = False
+
+
+class AnswerCache:
+    """
+    In-process answer cache scoped per workspace.
+    
+    Lookups try the normalized question text first, then the most similar
+    cached question embedding (cosine similarity at or above `threshold`).
+    Each workspace holds at most `max_entries` answers (least recently used
+    are evicted) for at most `ttl_seconds`.
+    
+    invalidate() drops a workspace's answers and bumps its generation;
+    answers computed against an older generation are not stored, so a
+    query racing with an ingestion cannot re-insert a stale answer.
+    """
+    
+    def __init__(self, max_entries: int, ttl_seconds: float, threshold: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._workspaces: Dict[str, WorkspaceAnswers] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    def generation(self, workspace_id: UUID) -> int:
+        """Current generation of a workspace's answers."""
+        with self._lock:
+            return self._generations.get(str(workspace_id), 0)
+    
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return self.ttl_seconds > 0 and time.time() - entry["created"] > self.ttl_seconds
+    
+    def get_exact(self, workspace_id: UUID, normalized: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up an answer by normalized question text.
+        
+        Returns:
+            Copy of the cached result, or None
+        """
+        with self._lock:
+            answers = self._workspaces.get(str(workspace_id))
+            entry = answers.entries.get(normalized) if answers else None
+            if entry is None or self._expired(entry):
+                return None
+            answers.entries.move_to_end(normalized)
+            self.exact_hits += 1
+            return dict(entry["result"])
+    
+    def get_similar(self, workspace_id: UUID, embedding: List[float]) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Look up the answer to the most similar cached question.
+        
+        Args:
+            workspace_id: UUID of the workspace
+            embedding: Question embedding
+        
+        Returns:
+            (copy of the cached result, similarity), or None below the threshold
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        with self._lock:
+            answers = self._workspaces.get(str(workspace_id))
+            if answers is None:
+                self.misses += 1
+                return None
+            if answers.dirty:
+                answers.rebuild()
+            if answers.matrix is None or answers.matrix.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            similarities = answers.matrix @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            entry = answers.entries[answers.keys[best]]
+            if similarity < self.threshold or self._expired(entry):
+                self.misses += 1
+                return None
+            answers.entries.move_to_end(answers.keys[best])
+            self.semantic_hits += 1
+            return dict(entry["result"]), similarity
+    
+    def record_miss(self) -> None:
+        """Count a lookup that was not tried against embeddings."""
+        with self._lock:
+            self.misses += 1
+    
+    def put(
+        self,
+        workspace_id: UUID,
+        normalized: str,
+        embedding: Optional[List[float]],
+        result: Dict[str, Any],
+        generation: int
+    ) -> bool:
+        """
+        Store an answer.
+        
+        Args:
+            workspace_id: UUID of the workspace
+            normalized: Normalized question text
+            embedding: Question embedding (None: exact matches only)
+            result: query_rag result
+            generation: Workspace generation the answer was computed against
+        
+        Returns:
+            False if the workspace was invalidated since (nothing stored)
+        """
+        key = str(workspace_id)
+        if embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            embedding = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                return False
+            answers = self._workspaces.setdefault(key, WorkspaceAnswers())
+            answers.entries[normalized] = {
+                "result": dict(result),
+                "embedding": embedding,
+                "created": time.time()
+            }
+            answers.entries.move_to_end(normalized)
+            while len(answers.entries) > self.max_entries:
+                answers.entries.popitem(last=False)
+            answers.dirty = True
+        return True
+    
+    def invalidate(self, workspace_id: UUID) -> int:
+        """
+        Drop every cached answer of a workspace.
+        
+        Returns:
+            Number of answers dropped
+        """
+        key = str(workspace_id)
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            answers = self._workspaces.pop(key, None)
+            self.invalidations += 1
+        return len(answers.entries) if answers else 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and cache size."""
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "entries": sum(len(answers.entries) for answers in self._workspaces.values()),
+            }
+
+
+# Answer cache (initialized lazily)
+_answer_cache: Optional[AnswerCache] = None
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """
+    Get or initialize the answer cache.
+    
+    Returns:
+        AnswerCache, or None if ANSWER_CACHE_ENABLED is off
+    """
+    global _answer_cache
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    if _answer_cache is None:
+        _answer_cache = AnswerCache(
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD
+        )
+        print(f"[ANSWER-CACHE] Enabled (similarity threshold {settings.ANSWER_CACHE_SIMILARITY_THRESHOLD})")
+    return _answer_cache
+
+
+def invalidate_answers(workspace_id: UUID) -> None:
+    """Drop a workspace's cached answers after its documents changed."""
+    cache = get_answer_cache()
+    if cache is not None:
+        dropped = cache.invalidate(workspace_id)
+        if dropped:
+            print(f"[ANSWER-CACHE] Invalidated {dropped} answers for workspace {workspace_id}")
@@ -0,0 +1,323 @@
+"""
+Chunk text store.
+One SQLite file per workspace maps each vector id to its text, read in bulk
+for the top-k, and records a content hash per chunk for incremental
+re-indexing. Vector metadata only needs to carry the text as well when the
+store's directory is not durable (see CHUNK_TEXT_IN_METADATA).
+"""
+import os
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import UUID
+from app.core.config import settings
+
+
+SCHEMA = """
+PRAGMA journal_mode=WAL;
+CREATE TABLE IF NOT EXISTS chunks (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    document_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_document ON chunks (document_id);
+"""
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def make_chunk_id(document_id: UUID, text: str, occurrences: Dict[str, int]) -> str:
+    """
+    Build the content-addressed vector id of a chunk.
+    
+    Ids are "{document_id}_{first 16 hex of the content hash}", so a chunk
+    keeps its id when edits elsewhere shift its position. Repeats of the
+    same text within a document get a "-{n}" suffix.
+    
+    Args:
+        document_id: UUID of the document
+        text: Chunk text
+        occurrences: Per-document counter of hashes seen so far (updated)
+        
+    Returns:
+        Vector id
+    """
+    digest = content_hash(text)[:16]
+    seen = occurrences.get(digest, 0)
+    occurrences[digest] = seen + 1
+    return f"{document_id}_{digest}" if seen == 0 else f"{document_id}_{digest}-{seen}"
+
+
+class ChunkStore:
+    """
+    Per-workspace store of chunk text keyed by vector id.
+    
+    Other indexes over chunk text (the lexical index) attach to the same
+    database with add_schema_hook, so they are updated by the same writes.
+    Each workspace database has its own lock, taken by connection(), so
+    reads and writes of different workspaces never wait on each other.
+    """
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        # Guards the registries below, never held during database I/O
+        self._lock = threading.Lock()
+        self._workspace_locks: Dict[str, threading.Lock] = {}
+        self._connections: Dict[str, sqlite3.Connection] = {}
+        self._schema_hooks: List[Callable[[sqlite3.Connection], None]] = []
+    
+    def _workspace_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._workspace_locks.setdefault(key, threading.Lock())
+    
+    def add_schema_hook(self, hook: Callable[[sqlite3.Connection], None]) -> None:
+        """Run `hook` on every workspace database, open now or later."""
+        with self._lock:
+            self._schema_hooks.append(hook)
+            open_keys = list(self._connections)
+        for key in open_keys:
+            with self._workspace_lock(key):
+                db = self._connections.get(key)
+                if db is not None:
+                    hook(db)
+    
+    def _connect(self, key: str, create: bool) -> Optional[sqlite3.Connection]:
+        """Open a workspace's database (caller must hold its workspace lock)."""
+        db = self._connections.get(key)
+        if db is None:
+            path = os.path.join(self.directory, f"{key}.sqlite3")
+            if not create and not os.path.exists(path):
+                return None
+            os.makedirs(self.directory, exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.executescript(SCHEMA)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(chunks)")}
+            if "content_hash" not in columns:
+                db.execute("ALTER TABLE chunks ADD COLUMN content_hash TEXT")
+                db.commit()
+            # Hooks added after this point run on the connection themselves
+            with self._lock:
+                hooks = list(self._schema_hooks)
+                self._connections[key] = db
+            for hook in hooks:
+                hook(db)
+        return db
+    
+    @contextmanager
+    def connection(self, workspace_id: UUID, create: bool = True) -> Iterator[Optional[sqlite3.Connection]]:
+        """
+        Use a workspace's database, holding its lock for the block.
+        
+        Args:
+            workspace_id: UUID of the workspace
+            create: Create the database if it does not exist yet
+        
+        Yields:
+            Connection, or None if it does not exist and create is False
+        """
+        key = str(workspace_id)
+        with self._workspace_lock(key):
+            yield self._connect(key, create)
+    
+    def put_chunks(
+        self,
+        workspace_id: UUID,
+        document_id: UUID,
+        chunks: List[str],
+        chunk_ids: List[str],
+        chunk_indexes: List[int]
+    ) -> None:
+        """
+        Store (or replace) a document's chunk texts.
+        
+        Args:
+            workspace_id: UUID of the workspace
+            document_id: UUID of the document
+            chunks: Chunk texts
+            chunk_ids: Vector id of each chunk
+            chunk_indexes: Document-wide position of each chunk
+        """
+        rows = [
+            (chunk_id, str(document_id), chunk_index, chunk, content_hash(chunk))
+            for chunk_id, chunk_index, chunk in zip(chunk_ids, chunk_indexes, chunks)
+        ]
+        with self.connection(workspace_id) as db:
+            db.executemany(
+                "INSERT INTO chunks (id, document_id, chunk_index, text, content_hash) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET "
+                "document_id = excluded.document_id, chunk_index = excluded.chunk_index, "
+                "text = excluded.text, content_hash = excluded.content_hash",
+                rows
+            )
+            db.commit()
+    
+    def get_document_chunks(self, workspace_id: UUID, document_id: UUID) -> Dict[str, Tuple[int, Optional[str]]]:
+        """
+        List the stored chunks of a document.
+        
+        Args:
+            workspace_id: UUID of the workspace
+            document_id: UUID of the document
+        
+        Returns:
+            Mapping of vector id to (chunk_index, content_hash)
+        """
+        with self.connection(workspace_id, create=False) as db:
+            if db is None:
+                return {}
+            rows = db.execute(
+                "SELECT id, chunk_index, content_hash FROM chunks WHERE document_id = ?",
+                (str(document_id),)
+            ).fetchall()
+        return {chunk_id: (chunk_index, digest) for chunk_id, chunk_index, digest in rows}
+    
+    def set_chunk_indexes(self, workspace_id: UUID, positions: List[Tuple[str, int]]) -> None:
+        """
+        Move unchanged chunks to new positions.
+        
+        Args:
+            workspace_id: UUID of the workspace
+            positions: (vector id, new chunk_index) pairs
+        """
+        if not positions:
+            return
+        with self.connection(workspace_id) as db:
+            db.executemany(
+                "UPDATE chunks SET chunk_index = ? WHERE id = ?",
+                [(chunk_index, chunk_id) for chunk_id, chunk_index in positions]
+            )
+            db.commit()
+    
+    def get_chunks(self, workspace_id: UUID, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Bulk-read chunks by vector id.
+        
+        Args:
+            workspace_id: UUID of the workspace
+            ids: Vector ids
+        
+        Returns:
+            Mapping of found ids to metadata dicts (workspace_id, document_id,
+            chunk_index, text)
+        """
+        ids = list(ids)
+        found: Dict[str, Dict[str, Any]] = {}
+        with self.connection(workspace_id, create=False) as db:
+            if db is None:
+                return found
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = db.execute(
+                    f"SELECT id, document_id, chunk_index, text FROM chunks WHERE id IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for vector_id, document_id, chunk_index, text in rows:
+                    found[vector_id] = {
+                        "workspace_id": str(workspace_id),
+                        "document_id": document_id,
+                        "chunk_index": chunk_index,
+                        "text": text
+                    }
+        return found
+    
+    def delete_chunks(self, workspace_id: UUID, ids: Iterable[str]) -> int:
+        """
+        Remove chunks by vector id.
+        
+        Returns:
+            Number of chunks removed
+        """
+        ids = list(ids)
+        removed = 0
+        with self.connection(workspace_id, create=False) as db:
+            if db is None:
+                return 0
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                removed += db.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", batch).rowcount
+            db.commit()
+        return removed
+    
+    def list_ids(self, workspace_id: UUID) -> Dict[str, str]:
+        """
+        List every chunk of a workspace.
+        
+        Returns:
+            Mapping of vector id to document id
+        """
+        with self.connection(workspace_id, create=False) as db:
+            if db is None:
+                return {}
+            return dict(db.execute("SELECT id, document_id FROM chunks"))
+    
+    def list_workspaces(self) -> List[str]:
+        """Ids of the workspaces that have a database."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name[:-len(".sqlite3")]
+            for name in os.listdir(self.directory)
+            if name.endswith(".sqlite3")
+        )
+    
+    def delete_workspace(self, workspace_id: UUID) -> bool:
+        """
+        Remove a workspace's database.
+        
+        Returns:
+            True if it existed
+        """
+        key = str(workspace_id)
+        path = os.path.join(self.directory, f"{key}.sqlite3")
+        with self._workspace_lock(key):
+            with self._lock:
+                db = self._connections.pop(key, None)
+            if db is not None:
+                db.close()
+            existed = os.path.exists(path)
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        return existed
+    
+    def delete_document(self, workspace_id: UUID, document_id: UUID) -> int:
+        """
+        Remove all chunks of a document.
+        
+        Returns:
+            Number of chunks removed
+        """
+        with self.connection(workspace_id, create=False) as db:
+            if db is None:
+                return 0
+            cursor = db.execute("DELETE FROM chunks WHERE document_id = ?", (str(document_id),))
+            db.commit()
+            return cursor.rowcount
+
+
+# Chunk store (initialized lazily)
+_chunk_store: Optional[ChunkStore] = None
+
+
+def get_chunk_store() -> ChunkStore:
+    """
+    Get or initialize the chunk store.
+    
+    Returns:
+        ChunkStore rooted at CHUNK_STORE_DIR
+    """
+    global _chunk_store
+    if _chunk_store is None:
+        _chunk_store = ChunkStore(settings.CHUNK_STORE_DIR)
+        print(f"[CHUNK-STORE] Initialized at {settings.CHUNK_STORE_DIR}")
+    return _chunk_store
@@ -1,13 +1,22 @@
 """
-OpenAI embeddings generation utilities.
+Embeddings generation utilities.
+Dispatches to the provider selected by EMBEDDING_PROVIDER (OpenAI by default).
 """
-from typing import List
-from openai import OpenAI
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import httpx
+from openai import AsyncOpenAI, OpenAI
 from app.core.config import settings
+from app.rag.embed_batcher import EmbeddingBatcher
+from app.rag.embed_cache import embedding_cache_key, get_embedding_cache
+from app.rag.providers import EmbeddingProvider, HashingEmbeddingProvider, OnnxEmbeddingProvider
+from app.rag.tokenizer import estimate_tokens
 
 
-# OpenAI client (initialized lazily)
+# OpenAI clients (initialized lazily)
 _client = None
+_async_client: Optional[AsyncOpenAI] = None
 
 
 def get_openai_client():
@@ -20,14 +29,214 @@ def get_openai_client():
     return _client
 
 
-def get_embedding(text: str, model: str = "text-embedding-3-small", dimensions: int = 1024) -> List[float]:
+def get_async_openai_client() -> AsyncOpenAI:
     """
-    Generate embedding for a single text using OpenAI.
+    Get or initialize the async OpenAI client for the query path.
+    
+    All requests share one keep-alive connection pool sized by
+    OPENAI_MAX_CONNECTIONS, so concurrency is not tied to a thread pool.
+    """
+    global _async_client
+    if _async_client is None:
+        if not settings.OPENAI_API_KEY:
+            raise Exception("OPENAI_API_KEY not configured in environment variables")
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(settings.OPENAI_TIMEOUT)
+        )
+        _async_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=http_client)
+        print(f"[EMBED] Async OpenAI client initialized (max {settings.OPENAI_MAX_CONNECTIONS} connections)")
+    return _async_client
+
+
+async def close_async_openai_client() -> None:
+    """Close the async OpenAI client and its connection pool."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+def split_embedding_batches(
+    texts: List[str],
+    max_items: int,
+    max_tokens: int
+) -> List[Tuple[int, int]]:
+    """
+    Split texts into consecutive batches bounded by item count and estimated tokens.
+    
+    A single text larger than max_tokens still gets a batch of its own.
+    
+    Args:
+        texts: Texts to batch
+        max_items: Maximum number of texts per batch
+        max_tokens: Maximum estimated tokens per batch
+        
+    Returns:
+        List of (start, end) index ranges, end exclusive, in input order
+    """
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if i > start and (i - start >= max_items or batch_tokens + tokens > max_tokens):
+            batches.append((start, i))
+            start = i
+            batch_tokens = 0
+        batch_tokens += tokens
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def _create_embeddings(texts: List[str], model: str, dimensions: int) -> List[List[float]]:
+    """Send one embeddings request and return vectors in input order."""
+    client = get_openai_client()
+    response = client.embeddings.create(
+        model=model,
+        input=texts,
+        dimensions=dimensions
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def _embed_texts(
+    texts: List[str],
+    model: str,
+    dimensions: int,
+    parallelism: Optional[int]
+) -> List[List[float]]:
+    """Embed texts via the API in concurrent, size-bounded requests."""
+    batches = split_embedding_batches(
+        texts,
+        max_items=settings.EMBED_BATCH_MAX_ITEMS,
+        max_tokens=settings.EMBED_BATCH_MAX_TOKENS
+    )
+    if len(batches) == 1:
+        return _create_embeddings(texts, model, dimensions)
+    
+    parallelism = max(1, min(parallelism or settings.EMBED_PARALLELISM, len(batches)))
+    print(f"[EMBED] Embedding {len(texts)} texts in {len(batches)} requests ({parallelism} concurrent)")
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        results = pool.map(
+            lambda batch: _create_embeddings(texts[batch[0]:batch[1]], model, dimensions),
+            batches
+        )
+        return [embedding for result in results for embedding in result]
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings API, with size-bounded concurrent batch requests."""
+    
+    name = "openai"
+    
+    def embed(
+        self,
+        texts: List[str],
+        model: str,
+        dimensions: int,
+        parallelism: Optional[int] = None
+    ) -> List[List[float]]:
+        return _embed_texts(texts, model, dimensions, parallelism)
+    
+    async def embed_async(self, texts: List[str], model: str, dimensions: int) -> List[List[float]]:
+        client = get_async_openai_client()
+        response = await client.embeddings.create(
+            model=model,
+            input=texts,
+            dimensions=dimensions
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+# Embedding provider (initialized lazily)
+_provider: Optional[EmbeddingProvider] = None
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """
+    Get or initialize the embedding provider selected by EMBEDDING_PROVIDER.
+    
+    Returns:
+        EmbeddingProvider ("openai", "hashing" or "onnx")
+        
+    Raises:
+        Exception: If the provider name is unknown
+    """
+    global _provider
+    if _provider is None:
+        name = settings.EMBEDDING_PROVIDER
+        if name == "openai":
+            _provider = OpenAIEmbeddingProvider()
+        elif name == "hashing":
+            _provider = HashingEmbeddingProvider()
+        elif name == "onnx":
+            _provider = OnnxEmbeddingProvider(
+                model_path=settings.EMBED_ONNX_MODEL_PATH,
+                tokenizer_path=settings.EMBED_ONNX_TOKENIZER_PATH,
+                max_length=settings.EMBED_ONNX_MAX_LENGTH,
+                batch_size=settings.EMBED_ONNX_BATCH_SIZE
+            )
+        else:
+            raise Exception(f"Unknown EMBEDDING_PROVIDER: {name}")
+        print(f"[EMBED] Using embedding provider: {name}")
+    return _provider
+
+
+# Query embedding batcher (initialized lazily, per event loop)
+_query_batcher: Optional[EmbeddingBatcher] = None
+
+
+def get_query_embedding_batcher() -> Optional[EmbeddingBatcher]:
+    """
+    Get or initialize the batcher for query embeddings on the running loop.
+    
+    Returns:
+        EmbeddingBatcher, or None if EMBED_QUERY_BATCHING_ENABLED is off
+    """
+    global _query_batcher
+    if not settings.EMBED_QUERY_BATCHING_ENABLED:
+        return None
+    if _query_batcher is None or _query_batcher.loop is not asyncio.get_running_loop():
+        provider = get_embedding_provider()
+        _query_batcher = EmbeddingBatcher(
+            provider.embed_async,
+            window_seconds=settings.EMBED_QUERY_BATCH_WINDOW_MS / 1000,
+            max_items=settings.EMBED_QUERY_BATCH_MAX_ITEMS
+        )
+        print(
+            f"[EMBED] Query embedding batching enabled "
+            f"({settings.EMBED_QUERY_BATCH_WINDOW_MS} ms window, up to {settings.EMBED_QUERY_BATCH_MAX_ITEMS} per request)"
+        )
+    return _query_batcher
+
+
+def get_query_embedding_stats() -> Optional[Dict[str, float]]:
+    """Batching metrics of the query embedding batcher (None before first use)."""
+    return _query_batcher.stats() if _query_batcher is not None else None
+
+
+def _cache_key(provider: EmbeddingProvider, text: str, model: str, dimensions: int) -> bytes:
+    """Cache key scoped to the provider, so backends never share vectors."""
+    return embedding_cache_key(text, f"{provider.name}/{model}", dimensions)
+
+
+def get_embedding(
+    text: str,
+    model: str = "text-embedding-3-small",
+    dimensions: Optional[int] = None
+) -> List[float]:
+    """
+    Generate embedding for a single text with the configured provider.
     
     Args:
         text: Text to embed
         model: OpenAI embedding model name (default: text-embedding-3-small)
-        dimensions: Output dimensions (default: 1024 for Pinecone compatibility)
+        dimensions: Output dimensions (default: settings.EMBEDDING_DIMENSIONS)
         
     Returns:
         List of embedding vector values
@@ -36,25 +245,94 @@ def get_embedding(text: str, model: str = "text-embedding-3-small", dimensions:
         Exception: If embedding generation fails
     """
     try:
-        client = get_openai_client()
-        response = client.embeddings.create(
-            model=model,
-            input=text,
-            dimensions=dimensions
-        )
-        return response.data[0].embedding
+        dimensions = dimensions or settings.EMBEDDING_DIMENSIONS
+        provider = get_embedding_provider()
+        cache = get_embedding_cache()
+        key = _cache_key(provider, text, model, dimensions)
+        if cache is not None:
+            cached = cache.get_many([key]).get(key)
+            if cached is not None:
+                return cached
+        
+        embedding = provider.embed([text], model, dimensions)[0]
+        
+        if cache is not None:
+            cache.put_many([(key, embedding)])
+        return embedding
+    except Exception as e:
+        raise Exception(f"Failed to generate embedding: {str(e)}")
+
+
+async def get_embedding_async(
+    text: str,
+    model: str = "text-embedding-3-small",
+    dimensions: Optional[int] = None
+) -> List[float]:
+    """
+    Generate embedding for a single text without blocking the event loop.
+    
+    The OpenAI provider uses the shared async client; local providers run
+    inline or in the thread pool. Cache misses go through the query
+    embedding batcher, so concurrent calls share one provider request.
+    
+    Args:
+        text: Text to embed
+        model: OpenAI embedding model name (default: text-embedding-3-small)
+        dimensions: Output dimensions (default: settings.EMBEDDING_DIMENSIONS)
+        
+    Returns:
+        List of embedding vector values
+        
+    Raises:
+        Exception: If embedding generation fails
+    """
+    try:
+        dimensions = dimensions or settings.EMBEDDING_DIMENSIONS
+        provider = get_embedding_provider()
+        cache = get_embedding_cache()
+        key = _cache_key(provider, text, model, dimensions)
+        loop = asyncio.get_running_loop()
+        if cache is not None:
+            # Only the memory tier is read on the event loop; SQLite I/O
+            # (and its lock, shared with ingestion) goes to the thread pool
+            cached = cache.get_memory(key)
+            if cached is None:
+                cached = (await loop.run_in_executor(None, cache.get_many, [key])).get(key)
+            if cached is not None:
+                return cached
+        
+        batcher = get_query_embedding_batcher()
+        if batcher is not None:
+            embedding = await batcher.embed(text, model, dimensions)
+        else:
+            embedding = (await provider.embed_async([text], model, dimensions))[0]
+        
+        if cache is not None:
+            await loop.run_in_executor(None, cache.put_many, [(key, embedding)])
+        return embedding
     except Exception as e:
         raise Exception(f"Failed to generate embedding: {str(e)}")
 
 
-def get_embeddings_batch(texts: List[str], model: str = "text-embedding-3-small", dimensions: int = 1024) -> List[List[float]]:
+def get_embeddings_batch(
+    texts: List[str],
+    model: str = "text-embedding-3-small",
+    dimensions: Optional[int] = None,
+    parallelism: Optional[int] = None
+) -> List[List[float]]:
     """
     Generate embeddings for multiple texts in a batch.
     
+    Texts found in the embedding cache are not sent to the provider. For
+    OpenAI, the remaining distinct texts are split into requests bounded by
+    EMBED_BATCH_MAX_ITEMS and EMBED_BATCH_MAX_TOKENS, which are sent
+    concurrently and reassembled in input order.
+    
     Args:
         texts: List of texts to embed
         model: OpenAI embedding model name (default: text-embedding-3-small)
-        dimensions: Output dimensions (default: 1024 for Pinecone compatibility)
+        dimensions: Output dimensions (default: settings.EMBEDDING_DIMENSIONS)
+        parallelism: Requests in flight at once (default: settings.EMBED_PARALLELISM)
         
     Returns:
         List of embedding vectors
@@ -66,15 +344,30 @@ def get_embeddings_batch(texts: List[str], model: str = "text-embedding-3-small"
         return []
     
     try:
-        client = get_openai_client()
-        response = client.embeddings.create(
-            model=model,
-            input=texts,
-            dimensions=dimensions
-        )
+        dimensions = dimensions or settings.EMBEDDING_DIMENSIONS
+        provider = get_embedding_provider()
+        cache = get_embedding_cache()
+        if cache is None:
+            return provider.embed(texts, model, dimensions, parallelism)
+        
+        keys = [_cache_key(provider, text, model, dimensions) for text in texts]
+        found = cache.get_many(keys)
+        
+        # Only distinct cache misses go to the provider
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        
+        if missing:
+            missing_keys = list(missing)
+            embeddings = provider.embed([missing[key] for key in missing_keys], model, dimensions, parallelism)
+            cache.put_many(zip(missing_keys, embeddings))
+            found.update(zip(missing_keys, embeddings))
+        
+        print(f"[EMBED] {len(texts) - len(missing)}/{len(texts)} embeddings served from cache")
         # Return embeddings in the same order as input texts
-        embeddings = [item.embedding for item in response.data]
-        return embeddings
+        return [found[key] for key in keys]
     except Exception as e:
         raise Exception(f"Failed to generate embeddings batch: {str(e)}")
 
@@ -87,7 +380,6 @@ def get_embedding_dimension(model: str = "text-embedding-3-small") -> int:
         model: OpenAI embedding model name
         
     Returns:
-        Embedding dimension (1024 for our Pinecone index)
+        Embedding dimension (settings.EMBEDDING_DIMENSIONS, 1024 for our Pinecone index)
     """
-    # Using 1024 dimensions for Pinecone index compatibility
-    return 1024
+    return settings.EMBEDDING_DIMENSIONS
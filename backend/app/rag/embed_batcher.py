@@ -0,0 +1,161 @@
+"""
+Micro-batching of concurrent query embeddings.
+Collects single-text embedding calls made at about the same time, sends
+them as one batched provider request and hands each caller its vector.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+
+EmbedBatch = Callable[[List[str], str, int], Awaitable[List[List[float]]]]
+
+# Recent batches and calls kept for percentile metrics
+METRICS_WINDOW = 1000
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent embed() calls into batched requests.
+    
+    The first call opens a window of `window_seconds`; every call arriving
+    before it closes joins the same request, which is sent early once
+    `max_items` calls are waiting. Identical texts in a batch are embedded
+    once. A failed or cancelled request fails every call in its batch.
+    
+    A batcher belongs to the event loop it was created on.
+    """
+    
+    def __init__(self, embed_batch: EmbedBatch, window_seconds: float, max_items: int):
+        self.embed_batch = embed_batch
+        self.window_seconds = window_seconds
+        self.max_items = max(1, max_items)
+        self.loop = asyncio.get_running_loop()
+        # (text, model, dimensions, future, enqueued at)
+        self._pending: List[Tuple[str, str, int, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.batches = 0
+        self.texts_sent = 0
+        self.failed_batches = 0
+        self.full_flushes = 0
+        self._batch_sizes: Deque[int] = deque(maxlen=METRICS_WINDOW)
+        self._request_ms: Deque[float] = deque(maxlen=METRICS_WINDOW)
+        self._wait_ms: Deque[float] = deque(maxlen=METRICS_WINDOW)
+    
+    async def embed(self, text: str, model: str, dimensions: int) -> List[float]:
+        """
+        Embed one text as part of the next batch.
+        
+        Args:
+            text: Text to embed
+            model: Embedding model name
+            dimensions: Output dimensions
+        
+        Returns:
+            Embedding vector
+        """
+        future = self.loop.create_future()
+        self._pending.append((text, model, dimensions, future, time.perf_counter()))
+        if len(self._pending) >= self.max_items:
+            with self._lock:
+                self.full_flushes += 1
+            self._flush()
+        elif self._timer is None:
+            self._timer = self.loop.call_later(self.window_seconds, self._flush)
+        return await future
+    
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        
+        groups: Dict[Tuple[str, int], List[Tuple[str, asyncio.Future, float]]] = {}
+        for text, model, dimensions, future, enqueued in pending:
+            if not future.done():
+                groups.setdefault((model, dimensions), []).append((text, future, enqueued))
+        for (model, dimensions), entries in groups.items():
+            task = self.loop.create_task(self._send(entries, model, dimensions))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _send(self, entries: List[Tuple[str, asyncio.Future, float]], model: str, dimensions: int) -> None:
+        texts = list(dict.fromkeys(text for text, _, _ in entries))
+        started = time.perf_counter()
+        try:
+            embeddings = await self.embed_batch(texts, model, dimensions)
+            if len(embeddings) != len(texts):
+                raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+            finished = time.perf_counter()
+            by_text = dict(zip(texts, embeddings))
+            for text, future, _ in entries:
+                if not future.done():
+                    future.set_result(by_text[text])
+        except Exception as e:
+            with self._lock:
+                self.failed_batches += 1
+            for _, future, _ in entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            # A cancelled request must not leave its callers waiting forever
+            stranded = [future for _, future, _ in entries if not future.done()]
+            if stranded:
+                with self._lock:
+                    self.failed_batches += 1
+                for future in stranded:
+                    future.set_exception(RuntimeError("Embedding request was cancelled"))
+        
+        with self._lock:
+            self.calls += len(entries)
+            self.batches += 1
+            self.texts_sent += len(texts)
+            self._batch_sizes.append(len(entries))
+            self._request_ms.append((finished - started) * 1000)
+            self._wait_ms.extend((finished - enqueued) * 1000 for _, _, enqueued in entries)
+        if len(entries) > 1:
+            print(
+                f"[EMBED] Batched {len(entries)} query embeddings into one request "
+                f"({len(texts)} distinct, {(finished - started) * 1000:.1f} ms)"
+            )
+    
+    def stats(self) -> Dict[str, float]:
+        """
+        Batching counters and recent latency percentiles.
+        
+        "wait" is the time a caller waited for its vector (window plus
+        request); "request" is the provider call alone.
+        """
+        with self._lock:
+            batch_sizes = list(self._batch_sizes)
+            request_ms = list(self._request_ms)
+            wait_ms = list(self._wait_ms)
+            return {
+                "window_ms": self.window_seconds * 1000,
+                "max_items": self.max_items,
+                "calls": self.calls,
+                "batches": self.batches,
+                "texts_sent": self.texts_sent,
+                "failed_batches": self.failed_batches,
+                "full_flushes": self.full_flushes,
+                "avg_batch_size": sum(batch_sizes) / len(batch_sizes) if batch_sizes else 0.0,
+                "max_batch_size": max(batch_sizes, default=0),
+                "request_ms_p50": _percentile(request_ms, 0.5),
+                "request_ms_p95": _percentile(request_ms, 0.95),
+                "wait_ms_p50": _percentile(wait_ms, 0.5),
+                "wait_ms_p95": _percentile(wait_ms, 0.95),
+            }
@@ -0,0 +1,215 @@
+"""
+Content-addressed embedding cache.
+Keeps an in-process LRU tier in front of an on-disk SQLite tier, keyed by
+(model, dimensions, SHA-256 of text), so identical text is only embedded once.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.core.config import settings
+
+
+def embedding_cache_key(text: str, model: str, dimensions: int) -> bytes:
+    """
+    Build the cache key for a text embedding.
+    
+    Args:
+        text: Embedded text
+        model: Embedding model name
+        dimensions: Output dimensions
+        
+    Returns:
+        32-byte SHA-256 digest
+    """
+    digest = hashlib.sha256(f"{model}\x00{dimensions}\x00".encode("utf-8"))
+    digest.update(text.encode("utf-8", errors="surrogatepass"))
+    return digest.digest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache with size-based eviction.
+    
+    The memory tier is an LRU bounded by entry count. The disk tier is a
+    SQLite table of float32 vectors bounded by total vector bytes; when it
+    grows past the limit, least recently used rows are deleted until it is
+    back under 90% of the limit.
+    """
+    
+    def __init__(self, path: str, memory_items: int, max_bytes: int):
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[bytes, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._db.commit()
+        self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+    
+    def _remember(self, key: bytes, vector: List[float]) -> None:
+        """Insert into the memory tier, evicting the least recently used entry."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+    
+    def get_memory(self, key: bytes) -> Optional[List[float]]:
+        """
+        Look up a key in the memory tier only (never touches SQLite).
+        
+        Args:
+            key: Cache key
+        
+        Returns:
+            Vector, or None if it is not in memory (it may still be on disk)
+        """
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return vector
+    
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, List[float]]:
+        """
+        Look up several keys at once.
+        
+        Args:
+            keys: Cache keys
+        
+        Returns:
+            Mapping of found keys to vectors (misses are absent)
+        """
+        found: Dict[bytes, List[float]] = {}
+        with self._lock:
+            disk_keys = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+                else:
+                    disk_keys.append(key)
+            
+            if disk_keys:
+                # Stay well under SQLite's bound-parameter limit
+                for i in range(0, len(disk_keys), 500):
+                    batch = disk_keys[i:i + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = array("f", blob).tolist()
+                        found[key] = vector
+                        self._remember(key, vector)
+                    if rows:
+                        now = time.time()
+                        self._db.executemany(
+                            "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                            [(now, key) for key, _ in rows]
+                        )
+                self._db.commit()
+                disk_found = sum(1 for key in disk_keys if key in found)
+                self.disk_hits += disk_found
+                self.misses += len(disk_keys) - disk_found
+        return found
+    
+    def put_many(self, items: Iterable[Tuple[bytes, List[float]]]) -> None:
+        """
+        Store several vectors at once.
+        
+        Args:
+            items: (key, vector) pairs
+        """
+        with self._lock:
+            now = time.time()
+            for key, vector in items:
+                self._remember(key, vector)
+                blob = array("f", vector).tobytes()
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, blob, len(blob), now)
+                )
+                if cursor.rowcount:
+                    self._disk_bytes += len(blob)
+            self._db.commit()
+            if self._disk_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+    
+    def _evict(self, target_bytes: int) -> None:
+        """Delete least recently used disk rows until under target_bytes."""
+        while self._disk_bytes > target_bytes:
+            rows = self._db.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_used LIMIT 500"
+            ).fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                break
+            evicted = []
+            for key, size in rows:
+                if self._disk_bytes <= target_bytes:
+                    break
+                evicted.append((key,))
+                self._disk_bytes -= size
+            self._db.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+            self.evictions += len(evicted)
+        self._db.commit()
+        print(f"[EMBED-CACHE] Evicted down to {self._disk_bytes} bytes ({self.evictions} evictions total)")
+    
+    def stats(self) -> Dict[str, int]:
+        """Get hit/miss counters and tier sizes."""
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_items": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+# Embedding cache (initialized lazily)
+_embedding_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Get or initialize the embedding cache.
+    
+    Returns:
+        EmbeddingCache, or None if EMBED_CACHE_ENABLED is off
+    """
+    global _embedding_cache
+    if not settings.EMBED_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(
+            path=settings.EMBED_CACHE_PATH,
+            memory_items=settings.EMBED_CACHE_MEMORY_ITEMS,
+            max_bytes=settings.EMBED_CACHE_MAX_BYTES
+        )
+        print(f"[EMBED-CACHE] Initialized at {settings.EMBED_CACHE_PATH}")
+    return _embedding_cache
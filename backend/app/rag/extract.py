@@ -1,18 +1,156 @@
 """
 PDF text extraction and text cleaning utilities.
 """
+import os
 import re
-from typing import List
+import multiprocessing
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
 import pypdf
+from app.core.config import settings
+from app.rag.text_cache import file_sha256, iter_cached_text, TextCacheWriter
+from app.rag.tokenizer import get_tokenizer
 
 
-def extract_text_from_pdf(file_path: str) -> str:
+# Process pool for parallel page extraction (initialized lazily)
+_extract_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_extract_workers() -> int:
+    """Get the number of worker processes used for parallel extraction."""
+    return settings.PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+
+
+def get_extract_pool() -> ProcessPoolExecutor:
+    """Get or initialize the process pool used for parallel page extraction."""
+    global _extract_pool
+    if _extract_pool is None:
+        # Use "spawn" so workers never inherit locks held by server threads
+        _extract_pool = ProcessPoolExecutor(
+            max_workers=get_extract_workers(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        print(f"[EXTRACT] Process pool initialized with {get_extract_workers()} workers")
+    return _extract_pool
+
+
+def split_page_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    """
+    Split page indices into contiguous, near-equal ranges.
+    
+    Args:
+        page_count: Total number of pages
+        parts: Number of ranges to produce (capped at page_count)
+        
+    Returns:
+        List of (start, end) tuples, end exclusive, in page order
+    """
+    parts = max(1, min(parts, page_count))
+    base, extra = divmod(page_count, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        end = start + base + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """
+    Extract text from pages [start, end) of a PDF.
+    
+    Runs inside a worker process, so it opens its own reader.
+    
+    Args:
+        file_path: Path to the PDF file
+        start: First page index (inclusive)
+        end: Last page index (exclusive)
+        
+    Returns:
+        List of page texts in page order (empty string for pages without text)
+    """
+    texts = []
+    with open(file_path, 'rb') as file:
+        pdf_reader = pypdf.PdfReader(file)
+        for i in range(start, end):
+            texts.append(pdf_reader.pages[i].extract_text() or "")
+    return texts
+
+
+def _iter_pages_parallel(file_path: str, page_count: int) -> Iterator[str]:
+    """
+    Yield page texts extracted across the process pool, in page order.
+    
+    Only a bounded window of page ranges is in flight at once, so memory
+    does not grow with the page count.
+    """
+    workers = get_extract_workers()
+    # Several ranges per worker so one slow range does not stall the others
+    ranges = split_page_ranges(page_count, workers * 4)
+    print(f"[EXTRACT] Parallel extraction: {len(ranges)} page ranges across {workers} workers")
+    
+    pool = get_extract_pool()
+    range_iter = iter(ranges)
+    pending = deque()
+    for start, end in islice(range_iter, workers * 2):
+        pending.append((start, end, pool.submit(extract_page_range, file_path, start, end)))
+    
+    while pending:
+        start, end, future = pending.popleft()
+        page_texts = future.result()
+        next_range = next(range_iter, None)
+        if next_range is not None:
+            pending.append((*next_range, pool.submit(extract_page_range, file_path, *next_range)))
+        print(f"[EXTRACT] Pages {start+1}-{end}/{page_count} done")
+        yield from page_texts
+
+
+def iter_pdf_pages(file_path: str, parallel: bool = False) -> Iterator[str]:
+    """
+    Lazily yield the raw text of each PDF page, in page order.
+    
+    Args:
+        file_path: Path to the PDF file
+        parallel: Split page ranges across a process pool (default: False).
+            PDFs with fewer than PDF_PARALLEL_MIN_PAGES pages are always
+            read sequentially.
+        
+    Yields:
+        Page text (empty string for pages without text)
+    """
+    print(f"[EXTRACT] Opening PDF: {file_path}")
+    with open(file_path, 'rb') as file:
+        pdf_reader = pypdf.PdfReader(file)
+        page_count = len(pdf_reader.pages)
+        print(f"[EXTRACT] PDF has {page_count} pages")
+        
+        use_pool = (
+            parallel
+            and page_count >= settings.PDF_PARALLEL_MIN_PAGES
+            and get_extract_workers() > 1
+        )
+        
+        if use_pool:
+            yield from _iter_pages_parallel(file_path, page_count)
+        else:
+            for i, page in enumerate(pdf_reader.pages):
+                print(f"[EXTRACT] Reading page {i+1}/{page_count}...")
+                yield page.extract_text() or ""
+
+
+def extract_text_from_pdf(file_path: str, parallel: bool = False) -> str:
     """
     Extract text from a PDF file.
     
     Args:
         file_path: Path to the PDF file
+        parallel: Split page ranges across a process pool (default: False)
         
     Returns:
         Extracted text as a string
@@ -21,20 +159,7 @@ def extract_text_from_pdf(file_path: str) -> str:
         Exception: If PDF reading fails
     """
     try:
-        print(f"[EXTRACT] Opening PDF: {file_path}")
-        text_content = []
-        with open(file_path, 'rb') as file:
-            pdf_reader = pypdf.PdfReader(file)
-            page_count = len(pdf_reader.pages)
-            print(f"[EXTRACT] PDF has {page_count} pages")
-            
-            for i, page in enumerate(pdf_reader.pages):
-                print(f"[EXTRACT] Reading page {i+1}/{page_count}...")
-                text = page.extract_text()
-                if text:
-                    text_content.append(text)
-                    print(f"[EXTRACT] Page {i+1}: extracted {len(text)} characters")
-        
+        text_content = [text for text in iter_pdf_pages(file_path, parallel=parallel) if text]
         full_text = "\n".join(text_content)
         print(f"[EXTRACT] Total extracted: {len(full_text)} characters")
         return full_text
@@ -71,83 +196,381 @@ def clean_text(text: str) -> str:
     return '\n'.join(lines)
 
 
-def chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> List[str]:
+def iter_clean_pages(file_path: str, parallel: bool = False) -> Iterator[str]:
     """
-    Split text into chunks while preserving sentence boundaries where possible.
+    Lazily yield cleaned page text, reusing the text cache when possible.
+    
+    If a sidecar for the file's SHA-256 exists, its text is streamed back
+    and the PDF is not parsed at all. Otherwise pages are extracted and
+    cleaned, and the sidecar is written as they go.
     
     Args:
-        text: Text to chunk
-        chunk_size: Target chunk size in characters (default: 800)
-        overlap: Overlap between chunks in characters (default: 100)
+        file_path: Path to the PDF file
+        parallel: Extract pages in parallel across a process pool
         
-    Returns:
-        List of text chunks
+    Yields:
+        Cleaned text blocks in document order (may be empty)
     """
-    print(f"[CHUNK] Starting chunking: {len(text)} chars, chunk_size={chunk_size}, overlap={overlap}")
+    if not settings.TEXT_CACHE_ENABLED:
+        for page in iter_pdf_pages(file_path, parallel=parallel):
+            yield clean_text(page)
+        return
     
-    if len(text) <= chunk_size:
-        print(f"[CHUNK] Text is small, returning as single chunk")
-        return [text]
+    sha256 = file_sha256(file_path)
+    cached = iter_cached_text(sha256)
+    if cached is not None:
+        print(f"[EXTRACT] Text cache hit for {file_path} ({sha256[:12]})")
+        yield from cached
+        return
     
-    chunks = []
-    start = 0
-    text_length = len(text)
-    max_iterations = 10000  # Safety limit
-    iteration = 0
+    print(f"[EXTRACT] Text cache miss for {file_path} ({sha256[:12]})")
+    with TextCacheWriter(sha256) as writer:
+        for page in iter_pdf_pages(file_path, parallel=parallel):
+            cleaned = clean_text(page)
+            if cleaned:
+                writer.write(cleaned)
+            yield cleaned
+
+
+# Sentence endings tried as split points, in order of preference
+SENTENCE_ENDINGS = ['. ', '.\n', '! ', '!\n', '? ', '?\n']
+
+
+class _BoundaryIndex:
+    """
+    Offsets of every sentence ending in a text, computed once.
+    
+    Chunk windows only move forward, so each lookup resumes its binary
+    search from the previous cursor and chunking stays linear overall.
+    """
+    
+    def __init__(self, text: str):
+        self.text = text
+        self.sentence_offsets = [
+            array('q', (m.start() for m in re.finditer(re.escape(ending), text)))
+            for ending in SENTENCE_ENDINGS
+        ]
+        self._sentence_cursors = [0] * len(SENTENCE_ENDINGS)
+    
+    @staticmethod
+    def _last_before(offsets: array, limit: int, cursor: int) -> Tuple[int, int]:
+        """Return (largest offset < limit or -1, new cursor)."""
+        cursor = bisect_left(offsets, limit, cursor)
+        return (offsets[cursor - 1] if cursor else -1), cursor
     
-    while start < text_length and iteration < max_iterations:
-        iteration += 1
+    def last_sentence_end(self, start: int, end: int) -> int:
+        """
+        Position just after a sentence ending lying fully inside (start, end).
         
-        # Calculate end position
-        end = min(start + chunk_size, text_length)
+        Endings are tried in SENTENCE_ENDINGS order and the last occurrence
+        of the first matching ending wins. `end` must not decrease between
+        calls.
         
-        if end >= text_length:
-            # Last chunk
-            chunk = text[start:].strip()
-            if chunk:
-                chunks.append(chunk)
-            print(f"[CHUNK] Chunk {len(chunks)}: last chunk, {len(chunk)} chars")
-            break
+        Returns:
+            Split position, or -1 if the window has no sentence ending
+        """
+        for i, ending in enumerate(SENTENCE_ENDINGS):
+            pos, self._sentence_cursors[i] = self._last_before(
+                self.sentence_offsets[i], end - len(ending) + 1, self._sentence_cursors[i]
+            )
+            if pos > start:
+                return pos + len(ending)
+        return -1
+    
+    def next_split(self, start: int, chunk_size: int, overlap: int) -> Tuple[int, int]:
+        """
+        Find where the chunk starting at `start` ends and where the next one begins.
         
-        # Try to find sentence boundary near the end
-        sentence_endings = ['. ', '.\n', '! ', '!\n', '? ', '?\n']
+        Must be called with increasing `start` values, and only while more
+        than chunk_size characters remain after `start`.
         
-        best_split = end
-        for ending in sentence_endings:
-            pos = text.rfind(ending, start, end)
-            if pos != -1 and pos > start:
-                best_split = pos + len(ending)
-                break
+        Returns:
+            Tuple of (split position, next start position)
+        """
+        end = start + chunk_size
+        
+        # Try to find sentence boundary near the end
+        best_split = self.last_sentence_end(start, end)
+        if best_split == -1:
+            best_split = end
         
         # If no sentence boundary found, try to break at word boundary
         if best_split == end:
-            space_pos = text.rfind(' ', start + int(chunk_size * 0.5), end)
-            newline_pos = text.rfind('\n', start + int(chunk_size * 0.5), end)
+            # Bounded to the last half of the window, so this stays linear
+            space_pos = self.text.rfind(' ', start + int(chunk_size * 0.5), end)
+            newline_pos = self.text.rfind('\n', start + int(chunk_size * 0.5), end)
             
             if space_pos > start:
                 best_split = space_pos + 1
             elif newline_pos > start:
                 best_split = newline_pos + 1
         
-        # Extract chunk
-        chunk = text[start:best_split].strip()
-        if chunk:
-            chunks.append(chunk)
-        
         # Calculate next start position - ensure we always advance
         next_start = best_split - overlap
         if next_start <= start:
             next_start = start + max(1, chunk_size // 2)  # Force advance
+        
+        return best_split, next_start
+
+
+def iter_chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> Iterator[str]:
+    """
+    Lazily split text into chunks while preserving sentence boundaries where possible.
+    
+    Boundary offsets are precomputed in one pass, so there is no iteration
+    limit and the tail of very large texts is never dropped.
+    
+    Args:
+        text: Text to chunk
+        chunk_size: Target chunk size in characters (default: 800)
+        overlap: Overlap between chunks in characters (default: 100)
+        
+    Yields:
+        Text chunks
+    """
+    if len(text) <= chunk_size:
+        yield text
+        return
+    
+    boundaries = _BoundaryIndex(text)
+    start = 0
+    while start + chunk_size < len(text):
+        best_split, next_start = boundaries.next_split(start, chunk_size, overlap)
+        chunk = text[start:best_split].strip()
+        if chunk:
+            yield chunk
         start = next_start
+    
+    # Last chunk
+    chunk = text[start:].strip()
+    if chunk:
+        yield chunk
+
+
+def chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> List[str]:
+    """
+    Split text into chunks while preserving sentence boundaries where possible.
+    
+    Args:
+        text: Text to chunk
+        chunk_size: Target chunk size in characters (default: 800)
+        overlap: Overlap between chunks in characters (default: 100)
+        
+    Returns:
+        List of text chunks
+    """
+    print(f"[CHUNK] Starting chunking: {len(text)} chars, chunk_size={chunk_size}, overlap={overlap}")
+    chunks = list(iter_chunk_text(text, chunk_size=chunk_size, overlap=overlap))
+    print(f"[CHUNK] Completed: {len(chunks)} chunks created")
+    return chunks
+
+
+def iter_chunks(texts: Iterable[str], chunk_size: int = 800, overlap: int = 100) -> Iterator[str]:
+    """
+    Chunk a stream of text pieces (e.g. cleaned pages) joined by newlines.
+    
+    Produces the same chunks as chunk_text on the joined text, but only
+    buffers the unconsumed tail, so memory stays bounded by the size of
+    one piece plus one chunk.
+    
+    Args:
+        texts: Iterable of text pieces; empty pieces are skipped
+        chunk_size: Target chunk size in characters (default: 800)
+        overlap: Overlap between chunks in characters (default: 100)
+        
+    Yields:
+        Text chunks
+    """
+    buffer = ""
+    for piece in texts:
+        if not piece:
+            continue
+        buffer = f"{buffer}\n{piece}" if buffer else piece
+        if len(buffer) <= chunk_size:
+            continue
         
-        if iteration % 10 == 0:
-            print(f"[CHUNK] Progress: {len(chunks)} chunks, position {start}/{text_length}")
+        # A window is final once text exists past its end
+        boundaries = _BoundaryIndex(buffer)
+        start = 0
+        while start + chunk_size < len(buffer):
+            best_split, next_start = boundaries.next_split(start, chunk_size, overlap)
+            chunk = buffer[start:best_split].strip()
+            if chunk:
+                yield chunk
+            start = next_start
+        buffer = buffer[start:]
+    
+    # Last chunk
+    chunk = buffer.strip()
+    if chunk:
+        yield chunk
+
+
+class _TokenWindows:
+    """
+    Token offsets of a growing text, each appended piece encoded once.
+    
+    Windows are measured by indexing into the token offsets instead of
+    re-encoding candidate chunks, and the tail kept after discard() is
+    never encoded again, so token-budget chunking stays linear.
+    """
+    
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.text = ""
+        self.token_count = 0
+        self.offsets = array('q')
+        self.boundaries = _BoundaryIndex(self.text)
+    
+    def append(self, text: str) -> None:
+        """Encode `text` alone and add its tokens after the current ones."""
+        tokens = self.tokenizer.encode_ordinary(text)
+        _, offsets = self.tokenizer.decode_with_offsets(tokens)
+        base = len(self.text)
+        self.offsets.extend(base + offset for offset in offsets)
+        self.token_count += len(tokens)
+        self.text += text
+        self.boundaries = _BoundaryIndex(self.text)
+    
+    def discard(self, start: int) -> None:
+        """Drop the tokens before token `start` and their text (append() again before next_split)."""
+        cut = self.char_offset(start)
+        self.text = self.text[cut:]
+        self.offsets = array('q', (offset - cut for offset in self.offsets[start:]))
+        self.token_count -= start
     
+    def char_offset(self, token: int) -> int:
+        """Character position where a token starts (len(text) past the end)."""
+        return self.offsets[token] if token < self.token_count else len(self.text)
+    
+    def next_split(self, start: int, max_tokens: int, overlap_tokens: int) -> Tuple[int, int]:
+        """
+        Find the token where the chunk starting at token `start` ends and
+        where the next one begins.
+        
+        Must be called with increasing `start` values, and only while more
+        than max_tokens tokens remain after `start`.
+        
+        Returns:
+            Tuple of (split token, next start token)
+        """
+        end = start + max_tokens
+        split = end
+        
+        # Prefer the last sentence ending in the window, snapped to a token start
+        sentence_end = self.boundaries.last_sentence_end(self.offsets[start], self.offsets[end])
+        if sentence_end != -1:
+            sentence_token = bisect_right(self.offsets, sentence_end) - 1
+            if sentence_token > start:
+                split = sentence_token
+        
+        # Calculate next start token - ensure we always advance
+        next_start = split - overlap_tokens
+        if next_start <= start:
+            next_start = start + max(1, max_tokens // 2)  # Force advance
+        
+        return split, next_start
+
+
+def iter_token_chunks(
+    texts: Iterable[str],
+    max_tokens: int = 256,
+    overlap_tokens: int = 32
+) -> Iterator[str]:
+    """
+    Chunk a stream of text pieces, joined by newlines, to a token budget.
+    
+    Each chunk holds at most max_tokens tokens (cl100k_base), ending at a
+    sentence boundary where one exists in the window and at a token
+    boundary otherwise. Consecutive chunks overlap by overlap_tokens.
+    
+    Args:
+        texts: Iterable of text pieces; empty pieces are skipped
+        max_tokens: Token budget per chunk (default: 256)
+        overlap_tokens: Overlap between chunks in tokens (default: 32)
+        
+    Yields:
+        Text chunks
+    """
+    windows = _TokenWindows(get_tokenizer())
+    for piece in texts:
+        if not piece:
+            continue
+        windows.append(f"\n{piece}" if windows.text else piece)
+        
+        start = 0
+        # A window is final once tokens exist past its end
+        while start + max_tokens < windows.token_count:
+            split, next_start = windows.next_split(start, max_tokens, overlap_tokens)
+            chunk = windows.text[windows.char_offset(start):windows.char_offset(split)].strip()
+            if chunk:
+                yield chunk
+            start = next_start
+        windows.discard(start)
+    
+    # Last chunk
+    chunk = windows.text.strip()
+    if chunk:
+        yield chunk
+
+
+def chunk_text_by_tokens(text: str, max_tokens: int = 256, overlap_tokens: int = 32) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens tokens.
+    
+    Args:
+        text: Text to chunk
+        max_tokens: Token budget per chunk (default: 256)
+        overlap_tokens: Overlap between chunks in tokens (default: 32)
+        
+    Returns:
+        List of text chunks
+    """
+    print(f"[CHUNK] Starting token chunking: {len(text)} chars, max_tokens={max_tokens}, overlap_tokens={overlap_tokens}")
+    chunks = list(iter_token_chunks([text], max_tokens=max_tokens, overlap_tokens=overlap_tokens))
     print(f"[CHUNK] Completed: {len(chunks)} chunks created")
     return chunks
 
 
-def extract_and_chunk_pdf(file_path: str, chunk_size: int = 800, overlap: int = 100) -> List[str]:
+def iter_pdf_chunks(
+    file_path: str,
+    chunk_size: int = 800,
+    overlap: int = 100,
+    parallel: bool = False,
+    mode: str = "chars"
+) -> Iterator[str]:
+    """
+    Lazily extract, clean, and chunk a PDF page by page.
+    
+    Args:
+        file_path: Path to the PDF file
+        chunk_size: Target chunk size in characters
+        overlap: Overlap between chunks in characters
+        parallel: Extract pages in parallel across a process pool
+        mode: "chars" (chunk_size/overlap) or "tokens"
+            (settings.CHUNK_MAX_TOKENS/CHUNK_OVERLAP_TOKENS)
+        
+    Yields:
+        Text chunks in document order
+    """
+    cleaned_pages = iter_clean_pages(file_path, parallel=parallel)
+    if mode == "tokens":
+        yield from iter_token_chunks(
+            cleaned_pages,
+            max_tokens=settings.CHUNK_MAX_TOKENS,
+            overlap_tokens=settings.CHUNK_OVERLAP_TOKENS
+        )
+    else:
+        yield from iter_chunks(cleaned_pages, chunk_size=chunk_size, overlap=overlap)
+
+
+def extract_and_chunk_pdf(
+    file_path: str,
+    chunk_size: int = 800,
+    overlap: int = 100,
+    parallel: bool = False,
+    mode: str = "chars"
+) -> List[str]:
     """
     Extract text from PDF, clean it, and chunk it.
     
@@ -155,23 +578,33 @@ def extract_and_chunk_pdf(file_path: str, chunk_size: int = 800, overlap: int =
         file_path: Path to the PDF file
         chunk_size: Target chunk size in characters
         overlap: Overlap between chunks in characters
+        parallel: Extract pages in parallel across a process pool
+        mode: "chars" (chunk_size/overlap) or "tokens"
+            (settings.CHUNK_MAX_TOKENS/CHUNK_OVERLAP_TOKENS)
         
     Returns:
         List of text chunks
     """
     print(f"[EXTRACT] Starting extraction for: {file_path}")
     
-    # Extract text
-    raw_text = extract_text_from_pdf(file_path)
-    
-    print(f"[EXTRACT] Cleaning text...")
-    # Clean text
-    cleaned_text = clean_text(raw_text)
+    # Extract and clean text (served from the text cache when the file is unchanged)
+    try:
+        cleaned_text = "\n".join(page for page in iter_clean_pages(file_path, parallel=parallel) if page)
+    except Exception as e:
+        print(f"[EXTRACT] ERROR: {str(e)}")
+        raise Exception(f"Failed to extract text from PDF: {str(e)}")
     print(f"[EXTRACT] Cleaned text: {len(cleaned_text)} characters")
     
     print(f"[EXTRACT] Chunking text...")
     # Chunk text
-    chunks = chunk_text(cleaned_text, chunk_size=chunk_size, overlap=overlap)
+    if mode == "tokens":
+        chunks = chunk_text_by_tokens(
+            cleaned_text,
+            max_tokens=settings.CHUNK_MAX_TOKENS,
+            overlap_tokens=settings.CHUNK_OVERLAP_TOKENS
+        )
+    else:
+        chunks = chunk_text(cleaned_text, chunk_size=chunk_size, overlap=overlap)
     print(f"[EXTRACT] Created {len(chunks)} chunks")
     
     return chunks
@@ -0,0 +1,392 @@
+"""
+HNSW approximate-nearest-neighbour index for the local vector store.
+Pure Python graph bookkeeping with NumPy similarity batches, behind the same
+VectorIndex interface as the brute-force backend.
+"""
+import os
+import json
+import math
+import uuid
+import heapq
+import random
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.rag.vector_store import LocalVectorIndex, NamespaceMatrix, vector_format_settings
+
+
+class HNSWGraph:
+    """
+    Hierarchical navigable small world graph (Malkov & Yashunin).
+    
+    Nodes are row numbers of a vector matrix that the caller owns and passes
+    into each call; similarity is the dot product, so rows must be
+    L2-normalized. Nodes are only ever appended, in row order.
+    """
+    
+    def __init__(self, m: int = 16, ef_construction: int = 100, seed: int = 0):
+        self.levels: List[int] = []
+        self.links: List[List[List[int]]] = []
+        self.entry_point = -1
+        self.max_level = -1
+        self._rng = random.Random(seed)
+        self.configure(m, ef_construction)
+    
+    def configure(self, m: int, ef_construction: int) -> None:
+        """Set build parameters (they only affect nodes inserted afterwards)."""
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.level_mult = 1 / math.log(max(m, 2))
+    
+    def __len__(self) -> int:
+        return len(self.levels)
+    
+    def _search_layer(
+        self,
+        vectors: np.ndarray,
+        query: np.ndarray,
+        entry_points: List[int],
+        ef: int,
+        layer: int
+    ) -> List[Tuple[float, int]]:
+        """Best-first search of one layer; returns up to ef (similarity, node) pairs."""
+        visited = set(entry_points)
+        sims = (vectors[entry_points] @ query).tolist()
+        candidates = [(-sim, node) for sim, node in zip(sims, entry_points)]
+        heapq.heapify(candidates)
+        results = heapq.nlargest(ef, zip(sims, entry_points))
+        heapq.heapify(results)
+        
+        while candidates:
+            neg_sim, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_sim < results[0][0]:
+                break
+            neighbors = [neighbor for neighbor in self.links[node][layer] if neighbor not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            # One matrix-vector product per expanded node
+            for sim, neighbor in zip((vectors[neighbors] @ query).tolist(), neighbors):
+                if len(results) < ef or sim > results[0][0]:
+                    heapq.heappush(candidates, (-sim, neighbor))
+                    heapq.heappush(results, (sim, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return results
+    
+    def _descend(self, vectors: np.ndarray, query: np.ndarray, to_layer: int) -> List[int]:
+        """Greedy search from the entry point down to `to_layer`."""
+        entry_points = [self.entry_point]
+        for layer in range(self.max_level, to_layer, -1):
+            entry_points = [max(self._search_layer(vectors, query, entry_points, 1, layer))[1]]
+        return entry_points
+    
+    def _select_neighbors(self, vectors: np.ndarray, candidates: List[Tuple[float, int]], m: int) -> List[int]:
+        """
+        Pick up to m neighbors with the diversity heuristic.
+        
+        A candidate is skipped if it is closer to an already selected
+        neighbor than to the base node; skipped candidates fill any slots
+        left over.
+        """
+        ordered = sorted(candidates, reverse=True)
+        if len(ordered) <= m:
+            return [node for _, node in ordered]
+        nodes = [node for _, node in ordered]
+        candidate_vectors = vectors[nodes]
+        # All candidate-to-candidate similarities in one product
+        pairwise = (candidate_vectors @ candidate_vectors.T).tolist()
+        selected: List[int] = []
+        pruned: List[int] = []
+        for i, (sim, node) in enumerate(ordered):
+            if len(selected) >= m:
+                break
+            row = pairwise[i]
+            if any(row[j] > sim for j in selected):
+                pruned.append(i)
+            else:
+                selected.append(i)
+        selected.extend(pruned[:m - len(selected)])
+        return [nodes[i] for i in selected]
+    
+    def insert(self, vectors: np.ndarray, node: int) -> None:
+        """
+        Insert the next row into the graph.
+        
+        Args:
+            vectors: Vector matrix (row `node` must already be written)
+            node: Row number; must equal len(self)
+        """
+        if node != len(self.levels):
+            raise ValueError(f"HNSW nodes must be inserted in order (expected {len(self.levels)}, got {node})")
+        level = int(-math.log(1.0 - self._rng.random()) * self.level_mult)
+        self.levels.append(level)
+        self.links.append([[] for _ in range(level + 1)])
+        if self.entry_point < 0:
+            self.entry_point = node
+            self.max_level = level
+            return
+        
+        query = np.asarray(vectors[node])
+        entry_points = self._descend(vectors, query, level)
+        for layer in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(vectors, query, entry_points, self.ef_construction, layer)
+            max_links = self.m0 if layer == 0 else self.m
+            neighbors = self._select_neighbors(vectors, found, self.m)
+            self.links[node][layer] = neighbors
+            for neighbor in neighbors:
+                neighbor_links = self.links[neighbor][layer]
+                neighbor_links.append(node)
+                if len(neighbor_links) > max_links:
+                    sims = (vectors[neighbor_links] @ vectors[neighbor]).tolist()
+                    self.links[neighbor][layer] = self._select_neighbors(
+                        vectors, list(zip(sims, neighbor_links)), max_links
+                    )
+            entry_points = [node for _, node in found]
+        
+        if level > self.max_level:
+            self.entry_point = node
+            self.max_level = level
+    
+    def search(
+        self,
+        vectors: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        ef: int,
+        alive: np.ndarray
+    ) -> List[Tuple[float, int]]:
+        """
+        Approximate top-k search skipping tombstoned nodes.
+        
+        Args:
+            vectors: Vector matrix
+            query: Normalized query vector
+            k: Number of results
+            ef: Search beam width (raised to k if smaller)
+            alive: Boolean mask of live rows
+        
+        Returns:
+            Up to k (similarity, node) pairs by descending similarity
+        """
+        if self.entry_point < 0 or k <= 0:
+            return []
+        entry_points = self._descend(vectors, query, 0)
+        ef = max(ef, k)
+        while True:
+            found = self._search_layer(vectors, query, entry_points, ef, 0)
+            live = sorted((item for item in found if alive[item[1]]), reverse=True)
+            # Widen the beam when tombstones crowd out live results
+            if len(live) >= k or ef >= len(self.levels):
+                return live[:k]
+            ef *= 2
+    
+    def save(self, path: str) -> None:
+        """Write the graph to an .npz file (atomically)."""
+        counts: List[int] = []
+        neighbors: List[int] = []
+        for node_links in self.links:
+            for layer_links in node_links:
+                counts.append(len(layer_links))
+                neighbors.extend(layer_links)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                levels=np.asarray(self.levels, dtype=np.int8),
+                counts=np.asarray(counts, dtype=np.int32),
+                neighbors=np.asarray(neighbors, dtype=np.int32),
+                entry_point=np.int64(self.entry_point),
+                max_level=np.int64(self.max_level)
+            )
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str, m: int, ef_construction: int) -> "HNSWGraph":
+        """Read a graph written by save()."""
+        graph = cls(m, ef_construction)
+        with np.load(path) as data:
+            graph.levels = data["levels"].tolist()
+            counts = data["counts"].tolist()
+            neighbors = data["neighbors"].tolist()
+            graph.entry_point = int(data["entry_point"])
+            graph.max_level = int(data["max_level"])
+        position = 0
+        layer_index = 0
+        for level in graph.levels:
+            node_links = []
+            for _ in range(level + 1):
+                count = counts[layer_index]
+                node_links.append(neighbors[position:position + count])
+                position += count
+                layer_index += 1
+            graph.links.append(node_links)
+        return graph
+
+
+class HNSWNamespace(NamespaceMatrix):
+    """
+    Namespace searched through an HNSW graph instead of a full scan.
+    
+    Rows are never reused, so every row stays a graph node; deletes only
+    clear the row's live flag (a tombstone) and the node keeps routing
+    searches. Parameters are stored per namespace in hnsw.json. The graph
+    is saved to hnsw.npz every so often, and rows written after the last
+    save are re-inserted on load.
+    """
+    
+    reuse_rows = False
+    
+    def __init__(
+        self,
+        directory: str,
+        dimensions: int,
+        m: int,
+        ef_construction: int,
+        ef_search: int,
+        **format_settings: Any
+    ):
+        super().__init__(directory, dimensions, **format_settings)
+        self.graph_path = os.path.join(directory, "hnsw.npz")
+        self.config_path = os.path.join(directory, "hnsw.json")
+        
+        self.config = {"m": m, "ef_construction": ef_construction, "ef_search": ef_search}
+        if os.path.exists(self.config_path):
+            with open(self.config_path) as f:
+                self.config.update(json.load(f))
+        else:
+            self._write_config()
+        
+        if os.path.exists(self.graph_path):
+            self.graph = HNSWGraph.load(self.graph_path, self.config["m"], self.config["ef_construction"])
+        else:
+            self.graph = HNSWGraph(self.config["m"], self.config["ef_construction"])
+        # Tombstoned tail rows are still graph nodes
+        self.size = max(self.size, len(self.graph))
+        self._unsaved = 0
+        if len(self.graph) < self.size:
+            print(f"[VECTOR-STORE] Re-inserting {self.size - len(self.graph)} rows into {self.graph_path}")
+            with self.lock:
+                self._index_rows([])
+    
+    def _write_config(self) -> None:
+        with open(self.config_path, "w") as f:
+            json.dump(self.config, f)
+    
+    def configure(
+        self,
+        m: Optional[int] = None,
+        ef_construction: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> Dict[str, int]:
+        """
+        Update this namespace's HNSW parameters.
+        
+        ef_search applies to the next query. m and ef_construction only
+        affect rows inserted afterwards.
+        
+        Returns:
+            The namespace's parameters after the update
+        """
+        with self.lock:
+            for key, value in (("m", m), ("ef_construction", ef_construction), ("ef_search", ef_search)):
+                if value is not None:
+                    if value < 1:
+                        raise ValueError(f"{key} must be positive")
+                    self.config[key] = value
+            self.graph.configure(self.config["m"], self.config["ef_construction"])
+            self._write_config()
+            return dict(self.config)
+    
+    def _index_rows(self, rows: List[int]) -> None:
+        start = len(self.graph)
+        for node in range(start, self.size):
+            self.graph.insert(self.matrix, node)
+        self._unsaved += self.size - start
+        # Save roughly every 10% of growth; rows after the last save are replayed on load
+        if self._unsaved >= max(1000, len(self.graph) // 10):
+            self._save()
+    
+    def _save(self) -> None:
+        self.graph.save(self.graph_path)
+        self._unsaved = 0
+    
+    def save(self) -> None:
+        """Persist the graph now."""
+        with self.lock:
+            if self._unsaved:
+                self._save()
+    
+    def search(self, query: np.ndarray, top_k: int) -> List[tuple]:
+        # The graph is mutated in place by inserts, so searches hold the lock
+        with self.lock:
+            found = self.graph.search(
+                self.matrix,
+                self.project(query),
+                self.candidates(top_k),
+                self.config["ef_search"],
+                self.alive
+            )
+            if self.full is not None:
+                results = self.rescore(query, [row for _, row in found], top_k)
+            else:
+                results = [(row, sim) for sim, row in found]
+            return [(self.row_ids[row], row, score) for row, score in results]
+
+
+class HNSWVectorIndex(LocalVectorIndex):
+    """
+    Self-hosted vector index with approximate (HNSW) cosine search.
+    
+    Same storage layout as LocalVectorIndex plus a graph per namespace, so
+    query cost grows roughly logarithmically with the number of chunks.
+    Defaults for M, ef_construction and ef_search come from settings and
+    can be changed per namespace with configure().
+    """
+    
+    def _open_namespace(self, path: str) -> HNSWNamespace:
+        return HNSWNamespace(
+            path,
+            self.dimensions,
+            m=settings.HNSW_M,
+            ef_construction=settings.HNSW_EF_CONSTRUCTION,
+            ef_search=settings.HNSW_EF_SEARCH,
+            **vector_format_settings()
+        )
+    
+    def configure(self, namespace: str, **params: Any) -> Dict[str, int]:
+        """
+        Update HNSW parameters (m, ef_construction, ef_search) for one namespace.
+        
+        Args:
+            namespace: Namespace (workspace id)
+            **params: Parameters to change
+        
+        Returns:
+            The namespace's parameters after the update
+        """
+        return self.get_namespace(namespace).configure(**params)
+    
+    def save(self) -> None:
+        """Persist the graphs of all open namespaces."""
+        for storage in list(self._namespaces.values()):
+            storage.save()
+
+
+# HNSW vector index (initialized lazily)
+_hnsw_index: Optional[HNSWVectorIndex] = None
+
+
+def get_hnsw_vector_index() -> HNSWVectorIndex:
+    """
+    Get or initialize the HNSW vector index.
+    
+    Returns:
+        HNSWVectorIndex rooted at VECTOR_STORE_DIR
+    """
+    global _hnsw_index
+    if _hnsw_index is None:
+        _hnsw_index = HNSWVectorIndex(settings.VECTOR_STORE_DIR, settings.EMBEDDING_DIMENSIONS)
+        print(f"[VECTOR-STORE] HNSW index at {settings.VECTOR_STORE_DIR}")
+    return _hnsw_index
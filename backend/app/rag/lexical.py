@@ -0,0 +1,216 @@
+"""
+Lexical (BM25) chunk index for hybrid retrieval.
+Keeps an SQLite FTS5 inverted index next to each workspace's chunk store,
+updated by the same writes at ingest time, plus reciprocal-rank fusion of
+lexical and vector hits.
+"""
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+from app.core.config import settings
+from app.rag.chunk_store import ChunkStore, get_chunk_store
+
+
+# Terms keep internal separators so "AB-1234" and "4.2.1" stay whole
+_TERM_RE = re.compile(r"\w+(?:[-./:]\w+)*")
+_WORD_RE = re.compile(r"\w+")
+_QUOTED_RE = re.compile(r'"([^"]+)"')
+_IDENTIFIER_SEPARATOR_RE = re.compile(r"\w[-./:]\w")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or "
+    "our should the this to was we what when where which who why will with you your".split()
+)
+
+# Inverted index over the chunk store's table, kept in sync by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+    text, content='chunks', content_rowid='seq', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+    INSERT INTO chunks_fts(rowid, text) VALUES (new.seq, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+    INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.seq, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_au AFTER UPDATE ON chunks BEGIN
+    INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.seq, old.text);
+    INSERT INTO chunks_fts(rowid, text) VALUES (new.seq, new.text);
+END;
+"""
+
+
+def build_match_expression(query: str) -> Optional[str]:
+    """
+    Turn a user query into an FTS5 MATCH expression.
+    
+    Quoted parts of the query stay phrases, and every other term becomes a
+    phrase of its words, so "AB-1234" matches the adjacent tokens
+    "ab 1234". Phrases are OR-ed and ranked by BM25; stopwords outside
+    quotes are dropped.
+    
+    Args:
+        query: User query text
+        
+    Returns:
+        MATCH expression, or None if the query has no searchable terms
+    """
+    query = query.lower()
+    terms = [words for words in (_WORD_RE.findall(quoted) for quoted in _QUOTED_RE.findall(query)) if words]
+    terms.extend(
+        _WORD_RE.findall(term)
+        for term in _TERM_RE.findall(_QUOTED_RE.sub(" ", query))
+        if term not in STOPWORDS
+    )
+    phrases = []
+    for words in terms:
+        phrase = '"' + " ".join(words) + '"'
+        if phrase not in phrases:
+            phrases.append(phrase)
+    return " OR ".join(phrases) or None
+
+
+def is_keyword_query(query: str) -> bool:
+    """
+    Decide whether a query is an obvious keyword lookup.
+    
+    Short queries (at most LEXICAL_FAST_PATH_MAX_TERMS terms) that quote a
+    phrase or contain an identifier-like term (digits, internal separators
+    such as "AB-1234" / "4.2.1", or an all-caps acronym) qualify.
+    
+    Args:
+        query: User query text
+        
+    Returns:
+        True if the lexical index alone should answer it
+    """
+    terms = _TERM_RE.findall(query)
+    if not terms or len(terms) > settings.LEXICAL_FAST_PATH_MAX_TERMS:
+        return False
+    if query.count('"') >= 2:
+        return True
+    return any(
+        any(char.isdigit() for char in term)
+        or _IDENTIFIER_SEPARATOR_RE.search(term)
+        or (len(term) >= 2 and term.isupper())
+        for term in terms
+    )
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Merge ranked match lists by reciprocal-rank fusion.
+    
+    Each match scores sum(1 / (k + rank)) over the lists it appears in;
+    matches are keyed by vector id. Metadata is taken from the first list
+    that contains the match. A "vector_score" (cosine similarity) from any
+    list is kept, since the fused score says nothing about it.
+    
+    Args:
+        result_lists: Ranked match lists ({"id", "score", "metadata"[, "vector_score"]})
+        k: Rank damping constant
+        
+    Returns:
+        Fused matches by descending fused score (in "score")
+    """
+    matches: Dict[str, Dict[str, Any]] = {}
+    scores: Dict[str, float] = {}
+    vector_scores: Dict[str, float] = {}
+    for results in result_lists:
+        for rank, match in enumerate(results, 1):
+            scores[match["id"]] = scores.get(match["id"], 0.0) + 1.0 / (k + rank)
+            matches.setdefault(match["id"], match)
+            if "vector_score" in match:
+                vector_scores.setdefault(match["id"], match["vector_score"])
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    fused = []
+    for match_id in ordered:
+        match = {**matches[match_id], "score": scores[match_id]}
+        if match_id in vector_scores:
+            match["vector_score"] = vector_scores[match_id]
+        fused.append(match)
+    return fused
+
+
+class LexicalIndex:
+    """
+    Per-workspace BM25 index over chunk text (SQLite FTS5).
+    
+    The index is an external-content FTS5 table inside each workspace's
+    chunk store database, kept in sync by triggers, so every chunk store
+    write (insert, replace, delete) updates only that chunk's postings.
+    """
+    
+    def __init__(self, store: ChunkStore):
+        self.store = store
+        store.add_schema_hook(self._install)
+    
+    @staticmethod
+    def _install(db: sqlite3.Connection) -> None:
+        """Create the FTS table and triggers in a chunk store database."""
+        exists = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'").fetchone()
+        db.executescript(FTS_SCHEMA)
+        if not exists:
+            # Index chunks stored before the lexical index was enabled
+            db.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+        db.commit()
+    
+    def search(self, workspace_id: UUID, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        BM25 search over a workspace's chunks.
+        
+        Args:
+            workspace_id: UUID of the workspace
+            query: User query text
+            top_k: Number of matches to return
+        
+        Returns:
+            Matches shaped like query_similar_chunks results; "score" is the
+            BM25 score (higher is better)
+        """
+        expression = build_match_expression(query)
+        if expression is None:
+            return []
+        with self.store.connection(workspace_id, create=False) as db:
+            if db is None:
+                return []
+            rows = db.execute(
+                "SELECT c.id, c.document_id, c.chunk_index, c.text, bm25(chunks_fts) AS rank "
+                "FROM chunks_fts JOIN chunks c ON c.seq = chunks_fts.rowid "
+                "WHERE chunks_fts MATCH ? ORDER BY rank LIMIT ?",
+                (expression, top_k)
+            ).fetchall()
+        return [
+            {
+                "id": vector_id,
+                "score": -rank,
+                "metadata": {
+                    "workspace_id": str(workspace_id),
+                    "document_id": document_id,
+                    "chunk_index": chunk_index,
+                    "text": text
+                }
+            }
+            for vector_id, document_id, chunk_index, text, rank in rows
+        ]
+
+
+# Lexical index (initialized lazily)
+_lexical_index: Optional[LexicalIndex] = None
+
+
+def get_lexical_index() -> Optional[LexicalIndex]:
+    """
+    Get or initialize the lexical index.
+    
+    Returns:
+        LexicalIndex, or None if LEXICAL_INDEX_ENABLED is off
+    """
+    global _lexical_index
+    if not settings.LEXICAL_INDEX_ENABLED:
+        return None
+    if _lexical_index is None:
+        _lexical_index = LexicalIndex(get_chunk_store())
+        print(f"[LEXICAL] Index enabled")
+    return _lexical_index
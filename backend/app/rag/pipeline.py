@@ -2,49 +2,345 @@
 RAG processing pipeline for documents.
 """
 import os
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Deque, Optional
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
 from app.db.models import Document, DocumentStatus
-from app.rag.extract import extract_and_chunk_pdf
+from app.rag.extract import iter_pdf_chunks
 from app.rag.embed import get_embeddings_batch
-from app.rag.storage import get_pinecone_index, upsert_chunks
+from app.rag.chunk_store import get_chunk_store, make_chunk_id
+from app.rag.storage import get_vector_index, upsert_chunks, delete_chunk_ids, move_chunks
+from app.rag.answer_cache import invalidate_answers
+
+
+# Marks the end of a stage's output
+_END_OF_STREAM = None
+
+
+class PipelineStopped(Exception):
+    """Raised inside the extraction thread when a downstream stage has failed."""
+
+
+def _put_from_thread(
+    queue: asyncio.Queue,
+    item: Any,
+    loop: asyncio.AbstractEventLoop,
+    stop: threading.Event
+) -> None:
+    """
+    Put an item on an asyncio queue from a worker thread.
+    
+    Blocks while the queue is full (backpressure), but gives up once
+    `stop` is set so the thread never waits on a dead consumer.
+    """
+    future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+    while True:
+        try:
+            future.result(timeout=0.1)
+            return
+        except FutureTimeoutError:
+            if stop.is_set():
+                future.cancel()
+                raise PipelineStopped()
+
+
+async def _next_result(in_flight: Deque[asyncio.Future]) -> Any:
+    """Await the oldest in-flight task, leaving it queued if the wait is cancelled."""
+    result = await asyncio.shield(in_flight[0])
+    in_flight.popleft()
+    return result
+
+
+async def _map_in_order(
+    source: asyncio.Queue,
+    work: Callable[[Any], Awaitable[Any]],
+    emit: Callable[[Any], Awaitable[None]],
+    limit: int
+) -> None:
+    """
+    Run `work` on each item of `source`, with up to `limit` items in flight.
+    
+    Results are passed to `emit` in input order, so the next stage (and
+    progress reporting) still sees a contiguous prefix of the document.
+    On failure or cancellation, work already started is awaited before
+    returning, so no request outlives the stage.
+    """
+    limit = max(1, limit)
+    in_flight: Deque[asyncio.Future] = deque()
+    try:
+        while True:
+            item = await source.get()
+            if item is _END_OF_STREAM:
+                break
+            in_flight.append(asyncio.ensure_future(work(item)))
+            if len(in_flight) >= limit:
+                await emit(await _next_result(in_flight))
+        while in_flight:
+            await emit(await _next_result(in_flight))
+    finally:
+        await asyncio.gather(*in_flight, return_exceptions=True)
+
+
+async def run_ingestion_pipeline(
+    file_path: str,
+    workspace_id: UUID,
+    document_id: UUID,
+    parallel_extract: bool = False,
+    batch_size: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    on_progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    previous_chunks_count: int = 0
+) -> int:
+    """
+    Stream a PDF through extraction, embedding and upsert with overlapping stages.
+    
+    Stages (each runs concurrently, connected by bounded queues):
+    1. Extraction thread: pages -> cleaned text -> chunks -> chunk batches
+    2. Embedding task: chunk batches -> embedding batches
+       (EMBED_PARALLELISM batches in flight)
+    3. Upsert task: embedding batches -> Pinecone
+       (PINECONE_UPSERT_PARALLELISM batches in flight)
+    
+    Only `queue_size` batches are buffered between stages, so memory stays
+    flat regardless of page count. If any stage fails, the others are
+    stopped and vectors upserted by this run are deleted.
+    
+    Re-indexing is incremental: chunk ids are derived from a hash of the
+    chunk text, so chunks already in the chunk store are neither embedded
+    nor upserted again. Their new positions, and the deletion of chunks
+    that no longer appear, are only applied once the new version is fully
+    indexed, so the previous version keeps answering queries until then
+    and is left intact if the run fails.
+    
+    Args:
+        file_path: Absolute path to the PDF file
+        workspace_id: UUID of the workspace (Pinecone namespace)
+        document_id: UUID of the document
+        parallel_extract: Extract PDF pages across a process pool
+        batch_size: Chunks per batch (default: settings.INGEST_BATCH_SIZE)
+        queue_size: Batches buffered per queue (default: settings.INGEST_QUEUE_SIZE)
+        on_progress: Awaited with the running indexed count after each batch
+        previous_chunks_count: Chunk count of a previous run whose vectors
+            have positional ids and no chunk store rows (removed on success)
+        
+    Returns:
+        Number of chunks in the document
+        
+    Raises:
+        ValueError: If no text could be extracted from the PDF
+        Exception: If any pipeline stage fails
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    queue_size = queue_size or settings.INGEST_QUEUE_SIZE
+    
+    loop = asyncio.get_running_loop()
+    chunk_batches: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    embedded_batches: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    index = get_vector_index()
+    chunk_store = get_chunk_store()
+    # Chunks indexed by a previous run: vector id -> (chunk_index, hash)
+    existing = await loop.run_in_executor(None, chunk_store.get_document_chunks, workspace_id, document_id)
+    seen_ids = set()
+    # Unchanged chunks whose position changed: (vector id, new chunk_index)
+    moved_positions = []
+    indexed = 0
+    embedded = 0
+    # Ids sent to Pinecone by this run; a failed upsert call may have
+    # landed some of its concurrent batches, so cleanup covers all of them
+    attempted_ids = []
+    
+    def extract_stage() -> None:
+        start_index = 0
+        batch = []
+        batch_ids = []
+        occurrences = {}
+        chunks = iter_pdf_chunks(
+            file_path,
+            chunk_size=800,
+            overlap=100,
+            parallel=parallel_extract,
+            mode=settings.CHUNKING_MODE
+        )
+        for chunk in chunks:
+            if stop.is_set():
+                raise PipelineStopped()
+            batch.append(chunk)
+            batch_ids.append(make_chunk_id(document_id, chunk, occurrences))
+            if len(batch) >= batch_size:
+                _put_from_thread(chunk_batches, (start_index, batch, batch_ids), loop, stop)
+                start_index += len(batch)
+                batch = []
+                batch_ids = []
+        if batch:
+            _put_from_thread(chunk_batches, (start_index, batch, batch_ids), loop, stop)
+        _put_from_thread(chunk_batches, _END_OF_STREAM, loop, stop)
+    
+    async def embed_batch(item) -> tuple:
+        nonlocal embedded
+        start_index, batch, batch_ids = item
+        seen_ids.update(batch_ids)
+        fresh = []
+        moved = []
+        for i, (chunk, chunk_id) in enumerate(zip(batch, batch_ids), start_index):
+            if chunk_id not in existing:
+                fresh.append((i, chunk_id, chunk))
+            elif existing[chunk_id][0] != i:
+                moved.append((chunk_id, i))
+        embeddings = []
+        if fresh:
+            # Batches are already concurrent, so each one sends its requests serially
+            embeddings = await loop.run_in_executor(
+                None,
+                lambda: get_embeddings_batch(
+                    [chunk for _, _, chunk in fresh],
+                    "text-embedding-3-small",
+                    parallelism=1
+                )
+            )
+            if len(embeddings) != len(fresh):
+                raise ValueError("Number of embeddings doesn't match number of chunks")
+            embedded += len(fresh)
+            print(f"[PIPELINE] Embedded {len(fresh)} new of chunks {start_index}-{start_index + len(batch) - 1}")
+        return (start_index + len(batch), fresh, embeddings, moved)
+    
+    async def embed_stage() -> None:
+        # Up to EMBED_PARALLELISM batches are embedded at once
+        await _map_in_order(chunk_batches, embed_batch, embedded_batches.put, settings.EMBED_PARALLELISM)
+        await embedded_batches.put(_END_OF_STREAM)
+    
+    async def upsert_batch(item) -> int:
+        end_index, fresh, embeddings, moved = item
+        moved_positions.extend(moved)
+        if fresh:
+            attempted_ids.extend(chunk_id for _, chunk_id, _ in fresh)
+            await loop.run_in_executor(
+                None,
+                lambda: upsert_chunks(
+                    workspace_id=workspace_id,
+                    document_id=document_id,
+                    chunks=[chunk for _, _, chunk in fresh],
+                    embeddings=embeddings,
+                    index=index,
+                    chunk_ids=[chunk_id for _, chunk_id, _ in fresh],
+                    chunk_indexes=[i for i, _, _ in fresh]
+                )
+            )
+        return end_index
+    
+    async def report_indexed(end_index: int) -> None:
+        nonlocal indexed
+        # Batches are reported in order, so indexed chunks are always a prefix
+        indexed = end_index
+        print(f"[PIPELINE] Indexed {indexed} chunks so far")
+        if on_progress is not None:
+            await on_progress(indexed)
+    
+    async def upsert_stage() -> None:
+        # Up to PINECONE_UPSERT_PARALLELISM batches are upserted at once
+        await _map_in_order(embedded_batches, upsert_batch, report_indexed, settings.PINECONE_UPSERT_PARALLELISM)
+    
+    extractor = loop.run_in_executor(None, extract_stage)
+    embedder = asyncio.ensure_future(embed_stage())
+    upserter = asyncio.ensure_future(upsert_stage())
+    stages = [extractor, embedder, upserter]
+    
+    try:
+        await asyncio.gather(*stages)
+    except BaseException:
+        stop.set()
+        embedder.cancel()
+        upserter.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
+        if attempted_ids:
+            print(f"[PIPELINE] Removing up to {len(attempted_ids)} partially upserted chunks")
+            try:
+                await loop.run_in_executor(
+                    None,
+                    lambda: delete_chunk_ids(workspace_id, attempted_ids, index=index)
+                )
+            except BaseException as e:
+                # Log rather than mask the error that stopped the pipeline
+                print(f"[PIPELINE] Cleanup of partially upserted chunks failed: {type(e).__name__}: {str(e)}")
+        raise
+    
+    if indexed == 0:
+        raise ValueError("No text extracted from PDF")
+    
+    if moved_positions:
+        # Vector metadata and the chunk store both carry chunk_index
+        await loop.run_in_executor(
+            None,
+            lambda: move_chunks(workspace_id, moved_positions, index=index)
+        )
+    
+    # Drop chunks of the previous version that did not survive
+    vanished = [chunk_id for chunk_id in existing if chunk_id not in seen_ids]
+    if not existing:
+        vanished = [f"{document_id}_{i}" for i in range(previous_chunks_count)]
+    if vanished:
+        await loop.run_in_executor(
+            None,
+            lambda: delete_chunk_ids(workspace_id, vanished, index=index)
+        )
+    
+    print(
+        f"[PIPELINE] Re-index summary: {embedded} new, {indexed - embedded} unchanged, "
+        f"{len(vanished)} removed"
+    )
+    return indexed
 
 
 async def process_document(
     document_id: UUID,
-    db: Session
+    db: AsyncSession,
+    parallel_extract: Optional[bool] = None
 ) -> None:
     """
     Process a document: extract text, chunk, generate embeddings, and store in Pinecone.
     
     This function:
     1. Updates document status to PROCESSING
-    2. Extracts and chunks text from PDF
-    3. Generates embeddings for chunks
-    4. Stores chunks in Pinecone with metadata
-    5. Updates document status to READY or FAILED
+    2. Streams the PDF through extraction, embedding and upsert
+       (see run_ingestion_pipeline)
+    3. Updates document status to READY or FAILED
     
     Args:
         document_id: UUID of the document to process
         db: Database session
+        parallel_extract: Extract PDF pages across a process pool
+            (default: settings.PDF_PARALLEL_EXTRACTION)
     """
     print(f"\n{'='*50}")
     print(f"[PIPELINE] Starting processing for document: {document_id}")
     print(f"{'='*50}\n")
     
     # Get document
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.scalar(select(Document).where(Document.id == document_id))
     if not document:
         print(f"[PIPELINE] ERROR: Document {document_id} not found")
         raise ValueError(f"Document {document_id} not found")
     
     print(f"[PIPELINE] Document found: {document.filename}")
     
+    if parallel_extract is None:
+        parallel_extract = settings.PDF_PARALLEL_EXTRACTION
+    
+    # Vectors of a previous run are diffed against, not discarded
+    previous_chunks_count = document.chunks_count or 0
+    
     try:
         # Update status to PROCESSING
         document.status = DocumentStatus.PROCESSING
         document.chunks_count = 0
-        db.commit()
+        await db.commit()
         print(f"[PIPELINE] Status updated to PROCESSING")
         
         # Get file path
@@ -57,42 +353,31 @@ async def process_document(
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
         
-        print(f"[PIPELINE] File exists. Starting text extraction...")
-        
-        # Step 1: Extract and chunk text
-        chunks = extract_and_chunk_pdf(file_path, chunk_size=800, overlap=100)
-        
-        if not chunks:
-            raise ValueError("No text extracted from PDF")
-        
-        print(f"[PIPELINE] Extracted {len(chunks)} chunks")
-        
-        # Step 2: Generate embeddings
-        print(f"[PIPELINE] Generating embeddings via OpenAI...")
-        embeddings = get_embeddings_batch(chunks, model="text-embedding-3-small")
-        
-        if len(embeddings) != len(chunks):
-            raise ValueError("Number of embeddings doesn't match number of chunks")
+        print(f"[PIPELINE] File exists. Starting streaming ingestion...")
         
-        print(f"[PIPELINE] Generated {len(embeddings)} embeddings (dimension: {len(embeddings[0])})")
+        async def report_progress(count: int) -> None:
+            # Expose the running count while the document is still PROCESSING
+            document.chunks_count = count
+            await db.commit()
         
-        # Step 3: Store in Pinecone
-        print(f"[PIPELINE] Connecting to Pinecone and upserting vectors...")
-        index = get_pinecone_index()
-        chunks_upserted = upsert_chunks(
+        chunks_upserted = await run_ingestion_pipeline(
+            file_path=file_path,
             workspace_id=document.workspace_id,
             document_id=document.id,
-            chunks=chunks,
-            embeddings=embeddings,
-            index=index
+            parallel_extract=parallel_extract,
+            on_progress=report_progress,
+            previous_chunks_count=previous_chunks_count
         )
         
-        print(f"[PIPELINE] Successfully upserted {chunks_upserted} chunks to Pinecone")
+        print(f"[PIPELINE] Successfully indexed {chunks_upserted} chunks in Pinecone")
         
-        # Step 4: Update document status
+        # Update document status
         document.status = DocumentStatus.READY
         document.chunks_count = chunks_upserted
-        db.commit()
+        await db.commit()
+        
+        # Cached answers may not reflect the new content
+        invalidate_answers(document.workspace_id)
         
         print(f"\n{'='*50}")
         print(f"[PIPELINE] SUCCESS! Document processing complete")
@@ -106,11 +391,24 @@ async def process_document(
         print(f"[PIPELINE] Error details: {str(e)}")
         print(f"{'='*50}\n")
         
-        # Update status to FAILED
+        # Update status to FAILED; the previous version is still indexed
         try:
             document.status = DocumentStatus.FAILED
-            db.commit()
+            document.chunks_count = previous_chunks_count
+            await db.commit()
         except Exception as db_err:
             print(f"[PIPELINE] Failed to update status to FAILED: {str(db_err)}")
         
         raise Exception(f"Document processing failed: {str(e)}")
+
+
+async def process_document_in_background(document_id: UUID) -> None:
+    """
+    Run process_document with its own session (for BackgroundTasks, which
+    run after the request's session is closed).
+    
+    Args:
+        document_id: UUID of the document to process
+    """
+    async with AsyncSessionLocal() as db:
+        await process_document(document_id, db)
@@ -0,0 +1,162 @@
+"""
+Embedding provider interface and local CPU backends.
+The OpenAI provider lives in app.rag.embed next to its client; the backends
+here run fully offline.
+"""
+import re
+import zlib
+import math
+import asyncio
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+
+class EmbeddingProvider(ABC):
+    """
+    Base class for embedding backends.
+    
+    Providers turn a list of texts into vectors of the requested dimension,
+    in input order. Caching and request batching live in app.rag.embed.
+    """
+    
+    name = "base"
+    
+    @abstractmethod
+    def embed(
+        self,
+        texts: List[str],
+        model: str,
+        dimensions: int,
+        parallelism: Optional[int] = None
+    ) -> List[List[float]]:
+        """
+        Embed texts.
+        
+        Args:
+            texts: Texts to embed
+            model: Model name (ignored by local providers)
+            dimensions: Output dimensions
+            parallelism: Requests in flight at once (remote providers only)
+        
+        Returns:
+            List of embedding vectors in input order
+        """
+    
+    async def embed_async(self, texts: List[str], model: str, dimensions: int) -> List[List[float]]:
+        """Embed texts without blocking the event loop (thread pool by default)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.embed, texts, model, dimensions)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic feature-hashing embedder.
+    
+    Word unigrams and character trigrams are hashed (CRC32, stable across
+    processes) into signed buckets and the vector is L2-normalized. It has
+    no model to load and no network dependency, which makes it suitable for
+    air-gapped staging and load tests; retrieval quality is lexical only.
+    """
+    
+    name = "hashing"
+    
+    _WORD_RE = re.compile(r"\w+")
+    
+    def _embed_one(self, text: str, dimensions: int) -> List[float]:
+        vector = [0.0] * dimensions
+        
+        def add(feature: str, weight: float) -> None:
+            h = zlib.crc32(feature.encode("utf-8", errors="surrogatepass"))
+            vector[h % dimensions] += weight if h & 0x80000000 else -weight
+        
+        for word in self._WORD_RE.findall(text.lower()):
+            add(word, 1.0)
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                add(padded[i:i + 3], 0.5)
+        
+        norm = math.sqrt(sum(value * value for value in vector))
+        if norm > 0:
+            vector = [value / norm for value in vector]
+        return vector
+    
+    def embed(
+        self,
+        texts: List[str],
+        model: str,
+        dimensions: int,
+        parallelism: Optional[int] = None
+    ) -> List[List[float]]:
+        return [self._embed_one(text, dimensions) for text in texts]
+    
+    async def embed_async(self, texts: List[str], model: str, dimensions: int) -> List[List[float]]:
+        # Cheap enough for query-sized inputs to run inline
+        return self.embed(texts, model, dimensions)
+
+
+class OnnxEmbeddingProvider(EmbeddingProvider):
+    """
+    Sentence-embedding model run with ONNX Runtime on CPU.
+    
+    Loads an exported transformer (model.onnx) and its HuggingFace
+    tokenizer.json from disk, mean-pools the last hidden state and
+    L2-normalizes. Models wider than the configured dimensions are
+    truncated (Matryoshka-style) and renormalized; narrower models are
+    rejected.
+    
+    Requires the optional packages numpy, onnxruntime and tokenizers.
+    """
+    
+    name = "onnx"
+    
+    def __init__(self, model_path: str, tokenizer_path: str, max_length: int = 512, batch_size: int = 32):
+        if not model_path or not tokenizer_path:
+            raise Exception("EMBED_ONNX_MODEL_PATH and EMBED_ONNX_TOKENIZER_PATH must be configured")
+        try:
+            import numpy as np
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise Exception("The onnx embedding provider requires numpy, onnxruntime and tokenizers")
+        
+        self._np = np
+        self.batch_size = batch_size
+        self.session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        print(f"[EMBED] ONNX model loaded from {model_path}")
+    
+    def embed(
+        self,
+        texts: List[str],
+        model: str,
+        dimensions: int,
+        parallelism: Optional[int] = None
+    ) -> List[List[float]]:
+        np = self._np
+        embeddings: List[List[float]] = []
+        for i in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch(texts[i:i + self.batch_size])
+            input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+            attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+            
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self.session.run(None, feeds)[0]
+            
+            # Mean-pool over real (non-padding) tokens
+            mask = attention_mask[..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1, None)
+            
+            if pooled.shape[1] < dimensions:
+                raise Exception(
+                    f"ONNX model produces {pooled.shape[1]} dimensions, {dimensions} required"
+                )
+            pooled = pooled[:, :dimensions]
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            pooled = pooled / np.clip(norms, 1e-12, None)
+            embeddings.extend(pooled.astype(np.float32).tolist())
+        return embeddings
@@ -0,0 +1,129 @@
+"""
+Compact on-disk vector formats for the local vector store.
+Rows are stored as float32, float16 or int8 with a per-row scale, and read
+back as float32, so search code does not depend on the storage format.
+"""
+import os
+from typing import List, Optional, Union
+import numpy as np
+
+
+# Storage formats and their file suffixes
+VECTOR_FORMATS = {
+    "float32": (np.float32, "f32"),
+    "float16": (np.float16, "f16"),
+    "int8": (np.int8, "i8"),
+}
+
+# Rows converted to float32 at a time during a full scan (small blocks stay in cache)
+SCAN_BLOCK_ROWS = 256
+
+
+def truncate_and_normalize(values: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Keep the first `dimensions` components and L2-normalize (Matryoshka truncation).
+    
+    Args:
+        values: Vector or matrix of row vectors
+        dimensions: Dimensions to keep
+        
+    Returns:
+        Truncated, normalized float32 copy
+    """
+    values = np.asarray(values, dtype=np.float32)[..., :dimensions]
+    norms = np.linalg.norm(values, axis=-1, keepdims=True)
+    return values / np.clip(norms, 1e-12, None)
+
+
+class CompactMatrix:
+    """
+    Growable memory-mapped matrix of row vectors in a compact format.
+    
+    int8 rows are stored as round(x / scale) with scale = max|x| / 127 kept
+    per row in a float32 side file, so each row keeps its own dynamic range.
+    Indexing returns dequantized float32 rows; dot() scans the compact data
+    block by block without materializing a float32 copy of the matrix.
+    """
+    
+    def __init__(self, path: str, dimensions: int, vector_format: str = "float32"):
+        if vector_format not in VECTOR_FORMATS:
+            raise ValueError(f"Unknown vector format: {vector_format}")
+        self.path = path
+        self.dimensions = dimensions
+        self.vector_format = vector_format
+        self.dtype = np.dtype(VECTOR_FORMATS[vector_format][0])
+        self.scales_path = f"{path}.scales" if vector_format == "int8" else None
+        self.data: Optional[np.memmap] = None
+        self.scales: Optional[np.memmap] = None
+        self.capacity = 0
+        
+        if os.path.exists(path) and os.path.getsize(path):
+            row_bytes = self.dtype.itemsize * dimensions
+            file_size = os.path.getsize(path)
+            if file_size % row_bytes:
+                raise Exception(f"{path} does not hold {dimensions}-dimension {vector_format} vectors")
+            self.resize(file_size // row_bytes)
+    
+    @staticmethod
+    def _map_file(path: str, dtype: np.dtype, shape: tuple) -> np.memmap:
+        with open(path, "ab"):
+            pass
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if os.path.getsize(path) < nbytes:
+            os.truncate(path, nbytes)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+    
+    def resize(self, capacity: int) -> None:
+        """(Re)map the files with room for `capacity` rows."""
+        self.flush()
+        self.data = self._map_file(self.path, self.dtype, (capacity, self.dimensions))
+        if self.scales_path:
+            self.scales = self._map_file(self.scales_path, np.dtype(np.float32), (capacity,))
+        self.capacity = capacity
+    
+    def __setitem__(self, rows: List[int], values: np.ndarray) -> None:
+        if self.vector_format == "int8":
+            scales = np.abs(values).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self.data[rows] = np.rint(values / scales[:, None]).astype(np.int8)
+            self.scales[rows] = scales
+        else:
+            self.data[rows] = values.astype(self.dtype)
+    
+    def __getitem__(self, rows: Union[int, List[int], slice]) -> np.ndarray:
+        values = np.asarray(self.data[rows], dtype=np.float32)
+        if self.scales is not None:
+            values = values * np.asarray(self.scales[rows], dtype=np.float32)[..., None]
+        return values
+    
+    def dot(self, query: np.ndarray, size: int) -> np.ndarray:
+        """
+        Dot product of the first `size` rows with a query vector.
+        
+        Args:
+            query: float32 query vector
+            size: Number of leading rows to score
+        
+        Returns:
+            float32 array of `size` scores
+        """
+        if self.vector_format == "float32":
+            return np.asarray(self.data[:size] @ query)
+        scores = np.empty(size, dtype=np.float32)
+        for start in range(0, size, SCAN_BLOCK_ROWS):
+            stop = min(size, start + SCAN_BLOCK_ROWS)
+            scores[start:stop] = self.data[start:stop].astype(np.float32) @ query
+            if self.scales is not None:
+                scores[start:stop] *= self.scales[start:stop]
+        return scores
+    
+    def flush(self) -> None:
+        if self.data is not None:
+            self.data.flush()
+        if self.scales is not None:
+            self.scales.flush()
+    
+    @property
+    def row_bytes(self) -> int:
+        """Bytes per stored row, including its scale."""
+        return self.dtype.itemsize * self.dimensions + (4 if self.scales_path else 0)
@@ -0,0 +1,243 @@
+"""
+Orphan vector reconciler.
+Compares the documents table with each vector namespace and chunk store and
+removes vectors and chunks that no document owns any more (deleted
+documents, failed runs whose cleanup did not complete, and optionally
+deleted workspaces). Only positive evidence counts: a missing database row,
+or a chunk store known to be complete for the document.
+"""
+import asyncio
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import Document, DocumentStatus, Workspace
+from app.rag.chunk_store import get_chunk_store
+from app.rag.answer_cache import invalidate_answers
+from app.rag.storage import (
+    get_vector_index,
+    list_vector_ids,
+    list_vector_namespaces,
+    delete_chunk_ids,
+    delete_workspace_vectors
+)
+
+
+def _is_workspace_id(namespace: str) -> bool:
+    try:
+        UUID(namespace)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_stale_chunk(vector_id: str, document: Document, stored: Dict[str, str], stored_count: int) -> bool:
+    """
+    Whether a vector id of an existing document is provably unreferenced.
+    
+    The chunk store is only trusted when it is complete for the document:
+    a READY document whose stored row count equals its chunks_count. After
+    the store's disk is lost (or before the store existed), nothing is
+    stale.
+    """
+    if document.status != DocumentStatus.READY or stored_count != document.chunks_count:
+        return False
+    if vector_id in stored:
+        return False
+    # Positional ids of documents indexed before the chunk store existed
+    suffix = vector_id.rsplit("_", 1)[-1]
+    return not (suffix.isdigit() and int(suffix) < document.chunks_count)
+
+
+def reconcile_orphans(
+    db: Session,
+    index=None,
+    dry_run: bool = False,
+    delete_workspaces: bool = False
+) -> Dict[str, Any]:
+    """
+    Find and purge orphaned vectors and chunks.
+    
+    Inside workspaces of this database, a vector is an orphan if its
+    document no longer exists, or if the chunk store is complete for its
+    document (see _is_stale_chunk) and does not contain it; chunk rows are
+    orphans if their document no longer exists.
+    
+    A namespace (or chunk store) of a workspace missing from this database
+    is only reported unless `delete_workspaces` is set: the index may be
+    shared with other deployments (e.g. a dev database pointed at the
+    production index), and their workspaces look exactly like deleted ones.
+    
+    Vector ids are listed before the chunk store and the documents table are
+    read, so chunks written by a concurrent ingestion are never mistaken
+    for orphans (a chunk store row and its document always exist before the
+    vector does).
+    
+    Args:
+        db: Database session
+        index: Vector index (default: get_vector_index())
+        dry_run: Only report what would be removed
+        delete_workspaces: Delete whole namespaces of unknown workspaces
+        
+    Returns:
+        Report with the removed "workspaces", the "unknown_workspaces"
+        left in place, orphan vector ids per workspace ("vectors"),
+        orphaned chunk rows per workspace ("chunks") and
+        "vectors_removed" / "chunks_removed" totals
+    """
+    if index is None:
+        index = get_vector_index()
+    chunk_store = get_chunk_store()
+    report: Dict[str, Any] = {
+        "dry_run": dry_run,
+        "workspaces": [],
+        "unknown_workspaces": [],
+        "vectors": {},
+        "chunks": {},
+        "vectors_removed": 0,
+        "chunks_removed": 0,
+    }
+    
+    namespaces = list_vector_namespaces(index)
+    stored_workspaces = chunk_store.list_workspaces()
+    candidates = sorted(
+        name for name in set(namespaces) | set(stored_workspaces)
+        if _is_workspace_id(name)
+    )
+    if not candidates:
+        return report
+    
+    # Listed before reading the database (see above)
+    listed: Dict[str, Optional[List[str]]] = {}
+    for namespace in candidates:
+        try:
+            listed[namespace] = list_vector_ids(UUID(namespace), index=index) if namespace in namespaces else []
+        except Exception as e:
+            print(f"[RECONCILE] Cannot list ids in namespace '{namespace}' ({str(e)}), checking workspace only")
+            listed[namespace] = None
+    stored_ids = {namespace: chunk_store.list_ids(UUID(namespace)) for namespace in candidates}
+    
+    workspace_ids = {
+        str(row[0]) for row in
+        db.query(Workspace.id).filter(Workspace.id.in_([UUID(name) for name in candidates])).all()
+    }
+    
+    for namespace in candidates:
+        workspace_id = UUID(namespace)
+        
+        if namespace not in workspace_ids:
+            vector_count = namespaces.get(namespace, 0)
+            if not delete_workspaces:
+                print(
+                    f"[RECONCILE] Workspace {namespace} is not in this database: {vector_count} vectors "
+                    f"left in place (ORPHAN_RECONCILE_DELETE_WORKSPACES is off)"
+                )
+                report["unknown_workspaces"].append(namespace)
+                continue
+            print(f"[RECONCILE] Workspace {namespace} no longer exists: {vector_count} vectors")
+            report["workspaces"].append(namespace)
+            report["vectors_removed"] += vector_count
+            report["chunks_removed"] += len(stored_ids[namespace])
+            if not dry_run:
+                delete_workspace_vectors(workspace_id, index=index)
+            continue
+        
+        documents = {
+            str(document.id): document
+            for document in db.query(Document).filter(Document.workspace_id == workspace_id).all()
+        }
+        stored = stored_ids[namespace]
+        stored_counts = Counter(stored.values())
+        
+        orphans = []
+        for vector_id in listed[namespace] or []:
+            document_id = vector_id.split("_", 1)[0]
+            document = documents.get(document_id)
+            if document is None:
+                orphans.append(vector_id)
+            elif _is_stale_chunk(vector_id, document, stored, stored_counts[document_id]):
+                orphans.append(vector_id)
+        orphan_set = set(orphans)
+        orphan_chunks = [
+            vector_id for vector_id, document_id in stored.items()
+            if document_id not in documents and vector_id not in orphan_set
+        ]
+        
+        if orphans:
+            print(f"[RECONCILE] Workspace {namespace}: {len(orphans)} orphaned vectors")
+            report["vectors"][namespace] = orphans
+            report["vectors_removed"] += len(orphans)
+        if orphan_chunks:
+            print(f"[RECONCILE] Workspace {namespace}: {len(orphan_chunks)} orphaned chunks")
+            report["chunks"][namespace] = orphan_chunks
+        report["chunks_removed"] += len(orphan_chunks) + len(orphan_set & set(stored))
+        
+        if not dry_run and (orphans or orphan_chunks):
+            # Vector ids and chunk ids share one id space; deletes cover both
+            delete_chunk_ids(workspace_id, orphans + orphan_chunks, index=index)
+            invalidate_answers(workspace_id)
+    
+    print(
+        f"[RECONCILE] {'Would remove' if dry_run else 'Removed'} {len(report['workspaces'])} workspaces, "
+        f"{report['vectors_removed']} vectors, {report['chunks_removed']} chunks"
+    )
+    return report
+
+
+def _reconcile_once(dry_run: bool) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return reconcile_orphans(
+            db,
+            dry_run=dry_run,
+            delete_workspaces=settings.ORPHAN_RECONCILE_DELETE_WORKSPACES
+        )
+    finally:
+        db.close()
+
+
+# Most recent reconciler report and the background task
+last_report: Optional[Dict[str, Any]] = None
+_reconciler_task: Optional[asyncio.Task] = None
+
+
+async def _reconcile_loop(interval: float, dry_run: bool) -> None:
+    global last_report
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            last_report = await loop.run_in_executor(None, _reconcile_once, dry_run)
+        except Exception as e:
+            print(f"[RECONCILE] Run failed: {str(e)}")
+
+
+def start_orphan_reconciler() -> None:
+    """
+    Start the background reconciler (every ORPHAN_RECONCILE_INTERVAL_SECONDS;
+    0 disables it).
+    """
+    global _reconciler_task
+    interval = settings.ORPHAN_RECONCILE_INTERVAL_SECONDS
+    if interval <= 0 or _reconciler_task is not None:
+        return
+    _reconciler_task = asyncio.get_running_loop().create_task(
+        _reconcile_loop(interval, settings.ORPHAN_RECONCILE_DRY_RUN)
+    )
+    mode = "dry run" if settings.ORPHAN_RECONCILE_DRY_RUN else "deleting"
+    print(f"[RECONCILE] Orphan reconciler running every {interval}s ({mode})")
+
+
+async def stop_orphan_reconciler() -> None:
+    """Cancel the background reconciler."""
+    global _reconciler_task
+    if _reconciler_task is None:
+        return
+    _reconciler_task.cancel()
+    try:
+        await _reconciler_task
+    except asyncio.CancelledError:
+        pass
+    _reconciler_task = None
@@ -1,13 +1,24 @@
 """
-Pinecone vector database storage operations.
-Compatible with pinecone v8+ and serverless indexes.
+Vector database storage operations.
+Uses Pinecone (v8+, serverless indexes) by default, or the self-hosted
+indexes from app.rag.vector_store ("local") or app.rag.hnsw ("hnsw").
 """
-from typing import List, Dict, Any, Optional
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from uuid import UUID
 from pinecone import Pinecone
 from app.core.config import settings
+from app.rag.vector_store import VectorIndex, get_local_vector_index
+from app.rag.hnsw import get_hnsw_vector_index
+from app.rag.chunk_store import get_chunk_store
+from app.rag.answer_cache import invalidate_answers
 
 
+# Pinecone's limit on ids per delete request
+PINECONE_DELETE_BATCH = 1000
+
 # Pinecone client cache
 _pc_client: Optional[Pinecone] = None
 _index_cache = None
@@ -53,30 +64,140 @@ def get_pinecone_index():
         raise Exception(f"Failed to connect to Pinecone index: {str(e)}")
 
 
+def get_vector_index():
+    """
+    Get the configured vector index.
+    
+    Returns:
+        Pinecone index or self-hosted VectorIndex, depending on VECTOR_STORE
+    """
+    if settings.VECTOR_STORE == "pinecone":
+        return get_pinecone_index()
+    if settings.VECTOR_STORE == "local":
+        return get_local_vector_index()
+    if settings.VECTOR_STORE == "hnsw":
+        return get_hnsw_vector_index()
+    raise Exception(f"Unknown VECTOR_STORE: {settings.VECTOR_STORE}")
+
+
+def save_vector_index() -> None:
+    """Persist in-memory index state (HNSW graphs) on shutdown."""
+    if settings.VECTOR_STORE == "hnsw":
+        get_hnsw_vector_index().save()
+        print(f"[VECTOR-STORE] HNSW graphs saved")
+
+
+def estimate_vector_bytes(vector: Dict[str, Any]) -> int:
+    """
+    Estimate the request payload size of one vector.
+    
+    Values are counted at ~12 bytes each (JSON-encoded float32) plus the
+    serialized metadata and id.
+    """
+    metadata_bytes = len(json.dumps(vector.get("metadata", {}), ensure_ascii=False).encode("utf-8"))
+    return len(vector["id"]) + 12 * len(vector["values"]) + metadata_bytes + 64
+
+
+def split_vector_batches(
+    vectors: List[Dict[str, Any]],
+    max_bytes: int,
+    max_vectors: int
+) -> List[List[Dict[str, Any]]]:
+    """
+    Split vectors into consecutive upsert batches bounded by payload bytes and count.
+    
+    Args:
+        vectors: Vectors to upsert
+        max_bytes: Maximum estimated payload bytes per batch
+        max_vectors: Maximum vectors per batch
+        
+    Returns:
+        List of vector batches in input order
+    """
+    batches = []
+    batch: List[Dict[str, Any]] = []
+    batch_bytes = 0
+    for vector in vectors:
+        size = estimate_vector_bytes(vector)
+        if batch and (len(batch) >= max_vectors or batch_bytes + size > max_bytes):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(vector)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _upsert_batch(index, batch: List[Dict[str, Any]], namespace: str, retries: int) -> int:
+    """Upsert one batch, retrying with exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            index.upsert(vectors=batch, namespace=namespace)
+            return len(batch)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = 0.5 * (2 ** attempt)
+            print(f"[PINECONE] Upsert batch failed ({str(e)}), retrying in {delay}s...")
+            time.sleep(delay)
+    return 0
+
+
 def upsert_chunks(
     workspace_id: UUID,
     document_id: UUID,
     chunks: List[str],
     embeddings: List[List[float]],
-    index
+    index,
+    start_index: int = 0,
+    progress_callback: Optional[Callable[[int], None]] = None,
+    chunk_ids: Optional[List[str]] = None,
+    chunk_indexes: Optional[List[int]] = None
 ) -> int:
     """
     Upsert document chunks to Pinecone with metadata.
+    
+    Chunk text is written to the chunk store first. Vector metadata carries
+    workspace_id, document_id and chunk_index, plus the text itself while
+    CHUNK_TEXT_IN_METADATA is on, so queries still get text if the chunk
+    store's disk is lost (e.g. an ephemeral container filesystem).
+    
+    Vectors are split into batches bounded by PINECONE_UPSERT_MAX_BYTES and
+    PINECONE_UPSERT_MAX_VECTORS, sent PINECONE_UPSERT_PARALLELISM at a time,
+    and each batch is retried up to PINECONE_UPSERT_RETRIES times.
+    
+    `start_index` is the document-wide index of the first chunk, so a
+    document can be upserted in consecutive batches. `progress_callback`
+    receives the running count of upserted vectors after each batch (it is
+    called in the caller's thread, as batches complete).
+    
+    `chunk_ids` / `chunk_indexes` give each chunk's vector id and position
+    explicitly (incremental re-indexing upserts a non-contiguous subset);
+    by default ids are positional, "{document_id}_{i}" from start_index.
     """
     if len(chunks) != len(embeddings):
         raise ValueError("Number of chunks must match number of embeddings")
+    if chunk_indexes is None:
+        chunk_indexes = list(range(start_index, start_index + len(chunks)))
+    if chunk_ids is None:
+        chunk_ids = [f"{document_id}_{i}" for i in chunk_indexes]
     
     try:
+        # Text goes to the chunk store before any vector can reference it
+        get_chunk_store().put_chunks(workspace_id, document_id, chunks, chunk_ids, chunk_indexes)
+        
         # Prepare vectors for upsert
         vectors = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            vector_id = f"{document_id}_{i}"
+        for vector_id, i, chunk, embedding in zip(chunk_ids, chunk_indexes, chunks, embeddings):
             metadata = {
                 "workspace_id": str(workspace_id),
                 "document_id": str(document_id),
-                "chunk_index": i,
-                "text": chunk
+                "chunk_index": i
             }
+            if settings.CHUNK_TEXT_IN_METADATA:
+                metadata["text"] = chunk
             vectors.append({
                 "id": vector_id,
                 "values": embedding,
@@ -85,11 +206,31 @@ def upsert_chunks(
         
         # Upsert to Pinecone with namespace = workspace_id
         namespace = str(workspace_id)
-        print(f"[PINECONE] Upserting {len(vectors)} vectors to namespace '{namespace}'...")
-        index.upsert(vectors=vectors, namespace=namespace)
+        if isinstance(index, VectorIndex):
+            # Local indexes have no request size limit
+            batches = [vectors]
+        else:
+            batches = split_vector_batches(
+                vectors,
+                max_bytes=settings.PINECONE_UPSERT_MAX_BYTES,
+                max_vectors=settings.PINECONE_UPSERT_MAX_VECTORS
+            )
+        print(f"[PINECONE] Upserting {len(vectors)} vectors to namespace '{namespace}' in {len(batches)} batches...")
+        
+        upserted = 0
+        parallelism = max(1, min(settings.PINECONE_UPSERT_PARALLELISM, len(batches)))
+        with ThreadPoolExecutor(max_workers=parallelism) as pool:
+            futures = [
+                pool.submit(_upsert_batch, index, batch, namespace, settings.PINECONE_UPSERT_RETRIES)
+                for batch in batches
+            ]
+            for future in as_completed(futures):
+                upserted += future.result()
+                if progress_callback is not None:
+                    progress_callback(upserted)
         print(f"[PINECONE] Upsert complete!")
         
-        return len(vectors)
+        return upserted
     except Exception as e:
         print(f"[PINECONE] Upsert error: {str(e)}")
         raise Exception(f"Failed to upsert chunks to Pinecone: {str(e)}")
@@ -99,13 +240,19 @@ def query_similar_chunks(
     workspace_id: UUID,
     query_embedding: List[float],
     top_k: int = 5,
-    index=None
+    index=None,
+    include_values: bool = False
 ) -> List[Dict[str, Any]]:
     """
     Query Pinecone for similar chunks.
+    
+    Matches are overlaid with their chunk store rows in one bulk query, so
+    chunk_index (and text) always come from the same source as lexical
+    hits; metadata alone is used for chunks the store no longer has.
+    With `include_values`, each match also carries its vector in "values".
     """
     if index is None:
-        index = get_pinecone_index()
+        index = get_vector_index()
     
     try:
         namespace = str(workspace_id)
@@ -113,6 +260,7 @@ def query_similar_chunks(
             vector=query_embedding,
             top_k=top_k,
             include_metadata=True,
+            include_values=include_values,
             namespace=namespace
         )
         
@@ -124,6 +272,8 @@ def query_similar_chunks(
                     "score": match.score,
                     "metadata": match.metadata if hasattr(match, 'metadata') else {}
                 })
+                if include_values:
+                    matches[-1]["values"] = list(match.values or [])
         elif isinstance(results, dict) and 'matches' in results:
             for match in results['matches']:
                 matches.append({
@@ -131,27 +281,240 @@ def query_similar_chunks(
                     "score": match.get('score', 0),
                     "metadata": match.get('metadata', {})
                 })
+                if include_values:
+                    matches[-1]["values"] = match.get('values') or []
+        
+        # Attach chunk texts and positions for the top-k in one read
+        if matches:
+            stored = get_chunk_store().get_chunks(workspace_id, [match["id"] for match in matches])
+            for match in matches:
+                if match["id"] in stored:
+                    match["metadata"] = {**(match["metadata"] or {}), **stored[match["id"]]}
         
         return matches
     except Exception as e:
         raise Exception(f"Failed to query Pinecone: {str(e)}")
 
 
+def fetch_vectors(workspace_id: UUID, vector_ids: List[str], index=None) -> Dict[str, List[float]]:
+    """
+    Read stored vectors by id.
+    
+    Returns:
+        Mapping of found ids to vector values
+    """
+    if not vector_ids:
+        return {}
+    if index is None:
+        index = get_vector_index()
+    
+    try:
+        results = index.fetch(ids=vector_ids, namespace=str(workspace_id))
+        vectors = results["vectors"] if isinstance(results, dict) else results.vectors
+        return {
+            vector_id: list(vector["values"] if isinstance(vector, dict) else vector.values)
+            for vector_id, vector in vectors.items()
+        }
+    except Exception as e:
+        raise Exception(f"Failed to fetch vectors from Pinecone: {str(e)}")
+
+
+def move_chunks(
+    workspace_id: UUID,
+    positions: List[Tuple[str, int]],
+    index=None
+) -> None:
+    """
+    Give unchanged chunks new positions in Pinecone and the chunk store.
+    
+    Vector metadata is updated first (one request per id, sent
+    PINECONE_UPSERT_PARALLELISM at a time): if that fails part-way the chunk
+    store still holds the old positions, so the next re-index of the
+    document sees the chunks as moved and updates both again.
+    
+    Args:
+        workspace_id: UUID of the workspace
+        positions: (vector id, new chunk_index) pairs
+        index: Vector index (defaults to get_vector_index())
+    """
+    if not positions:
+        return
+    if index is None:
+        index = get_vector_index()
+    namespace = str(workspace_id)
+    
+    def update(position: Tuple[str, int]) -> None:
+        vector_id, chunk_index = position
+        index.update(id=vector_id, set_metadata={"chunk_index": chunk_index}, namespace=namespace)
+    
+    try:
+        parallelism = max(1, min(settings.PINECONE_UPSERT_PARALLELISM, len(positions)))
+        with ThreadPoolExecutor(max_workers=parallelism) as pool:
+            list(pool.map(update, positions))
+        get_chunk_store().set_chunk_indexes(workspace_id, positions)
+    except Exception as e:
+        raise Exception(f"Failed to move chunks: {str(e)}")
+
+
+def _delete_ids(index, vector_ids: List[str], namespace: str) -> None:
+    """Delete ids in batches of at most PINECONE_DELETE_BATCH."""
+    for i in range(0, len(vector_ids), PINECONE_DELETE_BATCH):
+        index.delete(ids=vector_ids[i:i + PINECONE_DELETE_BATCH], namespace=namespace)
+
+
+def delete_chunk_ids(
+    workspace_id: UUID,
+    vector_ids: List[str],
+    index=None
+) -> None:
+    """
+    Delete individual chunks from Pinecone and the chunk store.
+    
+    Errors are only logged: this runs during cleanup of a failed ingestion,
+    and anything left behind is removed by the orphan reconciler.
+    """
+    if not vector_ids:
+        return
+    if index is None:
+        index = get_vector_index()
+    
+    try:
+        _delete_ids(index, vector_ids, str(workspace_id))
+    except Exception as e:
+        print(f"Warning: Failed to delete chunks from Pinecone: {str(e)}")
+    
+    try:
+        # Also drops the chunks from the lexical index (FTS triggers)
+        get_chunk_store().delete_chunks(workspace_id, vector_ids)
+    except Exception as e:
+        print(f"Warning: Failed to delete chunks from chunk store: {str(e)}")
+
+
+def list_vector_ids(workspace_id: UUID, prefix: str = "", index=None) -> List[str]:
+    """
+    List the vector ids in a workspace's namespace that start with a prefix.
+    
+    Uses Pinecone's paginated list operation (serverless indexes only; pod
+    indexes raise).
+    """
+    if index is None:
+        index = get_vector_index()
+    vector_ids = []
+    for page in index.list(prefix=prefix, namespace=str(workspace_id)):
+        vector_ids.extend(page)
+    return vector_ids
+
+
+def list_vector_namespaces(index=None) -> Dict[str, int]:
+    """
+    List the namespaces in the index.
+    
+    Returns:
+        Mapping of namespace to vector count
+    """
+    if index is None:
+        index = get_vector_index()
+    stats = index.describe_index_stats()
+    namespaces = stats["namespaces"] if isinstance(stats, dict) else stats.namespaces
+    return {
+        name: info["vector_count"] if isinstance(info, dict) else info.vector_count
+        for name, info in namespaces.items()
+    }
+
+
+def delete_vectors_by_prefix(workspace_id: UUID, prefix: str, index=None) -> int:
+    """
+    Delete every vector whose id starts with a prefix ("{document_id}_"
+    selects one document), from Pinecone and the chunk store.
+    
+    Returns:
+        Number of vectors deleted
+    """
+    if index is None:
+        index = get_vector_index()
+    
+    try:
+        vector_ids = list_vector_ids(workspace_id, prefix=prefix, index=index)
+        print(f"[PINECONE] Deleting {len(vector_ids)} vectors with prefix '{prefix}' from namespace '{workspace_id}'")
+        _delete_ids(index, vector_ids, str(workspace_id))
+        get_chunk_store().delete_chunks(workspace_id, vector_ids)
+        invalidate_answers(workspace_id)
+        return len(vector_ids)
+    except Exception as e:
+        raise Exception(f"Failed to delete vectors by prefix: {str(e)}")
+
+
+def delete_vectors_by_filter(workspace_id: UUID, metadata_filter: Dict[str, Any], index=None) -> None:
+    """
+    Delete every vector whose metadata matches a filter, e.g.
+    {"document_id": {"$in": [...]}}.
+    
+    Only Pinecone pod indexes and the local backends support deleting by
+    filter; chunk store rows are not touched (delete them by document).
+    """
+    if index is None:
+        index = get_vector_index()
+    
+    try:
+        print(f"[PINECONE] Deleting vectors matching {metadata_filter} from namespace '{workspace_id}'")
+        index.delete(filter=metadata_filter, namespace=str(workspace_id))
+        invalidate_answers(workspace_id)
+    except Exception as e:
+        raise Exception(f"Failed to delete vectors by filter: {str(e)}")
+
+
+def delete_workspace_vectors(workspace_id: UUID, index=None) -> None:
+    """
+    Delete a workspace's whole namespace and its chunk store.
+    """
+    if index is None:
+        index = get_vector_index()
+    
+    try:
+        print(f"[PINECONE] Deleting namespace '{workspace_id}'")
+        index.delete(delete_all=True, namespace=str(workspace_id))
+        get_chunk_store().delete_workspace(workspace_id)
+        invalidate_answers(workspace_id)
+    except Exception as e:
+        raise Exception(f"Failed to delete workspace vectors: {str(e)}")
+
+
 def delete_document_chunks(
     workspace_id: UUID,
     document_id: UUID,
-    chunks_count: int,
+    chunks_count: int = 0,
     index=None
-) -> None:
+) -> int:
     """
     Delete all chunks for a document from Pinecone.
+    
+    Ids are listed by the "{document_id}_" prefix. Indexes that cannot list
+    ids fall back to the ids in the chunk store plus the positional ids
+    "{document_id}_0".."{document_id}_{chunks_count - 1}" of documents
+    indexed before the chunk store existed.
+    
+    Returns:
+        Number of vector ids deleted
     """
     if index is None:
-        index = get_pinecone_index()
+        index = get_vector_index()
     
+    prefix = f"{document_id}_"
     try:
-        namespace = str(workspace_id)
-        vector_ids = [f"{document_id}_{i}" for i in range(chunks_count)]
-        index.delete(ids=vector_ids, namespace=namespace)
+        try:
+            vector_ids = list_vector_ids(workspace_id, prefix=prefix, index=index)
+        except Exception as e:
+            print(f"[PINECONE] Cannot list ids ({str(e)}), deleting known ids instead")
+            vector_ids = list(get_chunk_store().get_document_chunks(workspace_id, document_id))
+            known = set(vector_ids)
+            vector_ids.extend(
+                vector_id for vector_id in (f"{prefix}{i}" for i in range(chunks_count))
+                if vector_id not in known
+            )
+        _delete_ids(index, vector_ids, str(workspace_id))
+        # Also drops the chunks from the lexical index (FTS triggers)
+        get_chunk_store().delete_document(workspace_id, document_id)
+        invalidate_answers(workspace_id)
+        return len(vector_ids)
     except Exception as e:
-        print(f"Warning: Failed to delete chunks from Pinecone: {str(e)}")
+        raise Exception(f"Failed to delete document chunks: {str(e)}")
@@ -0,0 +1,94 @@
+"""
+Content-addressed cache of cleaned PDF text.
+Stores the cleaned text of each PDF as a gzip sidecar keyed by the file's
+SHA-256, so re-processing a document skips PDF parsing entirely.
+"""
+import os
+import gzip
+import hashlib
+import uuid
+from typing import IO, Iterator, Optional
+from app.core.config import settings
+
+
+# Bump when clean_text changes so stale sidecars are ignored
+TEXT_CACHE_VERSION = 1
+
+
+def file_sha256(file_path: str) -> str:
+    """
+    Compute the SHA-256 hex digest of a file.
+    
+    Args:
+        file_path: Path to the file
+        
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_cache_path(sha256: str) -> str:
+    """Get the sidecar path for a file hash."""
+    return os.path.join(settings.TEXT_CACHE_DIR, f"{sha256}.v{TEXT_CACHE_VERSION}.txt.gz")
+
+
+def iter_cached_text(sha256: str) -> Optional[Iterator[str]]:
+    """
+    Open the cached cleaned text for a file hash.
+    
+    Args:
+        sha256: Hex digest of the PDF file
+        
+    Returns:
+        Iterator over the cached text lines (without newlines), or None on a miss
+    """
+    cache_path = get_cache_path(sha256)
+    if not os.path.exists(cache_path):
+        return None
+    
+    def read_lines() -> Iterator[str]:
+        # Binary mode splits on "\n" only, so "\r" inside text survives
+        with gzip.open(cache_path, "rb") as f:
+            for line in f:
+                yield line.rstrip(b"\n").decode("utf-8", errors="surrogatepass")
+    
+    return read_lines()
+
+
+class TextCacheWriter:
+    """
+    Write cleaned text to a sidecar as it is produced.
+    
+    The sidecar is written to a temporary file and only renamed into place
+    if the block exits cleanly, so a failed or abandoned extraction never
+    leaves a partial cache entry behind.
+    """
+    
+    def __init__(self, sha256: str):
+        self.cache_path = get_cache_path(sha256)
+        self.tmp_path = f"{self.cache_path}.{uuid.uuid4().hex}.tmp"
+        self._file: Optional[IO[bytes]] = None
+    
+    def __enter__(self) -> "TextCacheWriter":
+        os.makedirs(settings.TEXT_CACHE_DIR, exist_ok=True)
+        self._file = gzip.open(self.tmp_path, "wb")
+        return self
+    
+    def write(self, text: str) -> None:
+        """Append one block of cleaned text (one or more lines)."""
+        if self._file is not None:
+            self._file.write(text.encode("utf-8", errors="surrogatepass") + b"\n")
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._file is not None:
+            self._file.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.cache_path)
+            print(f"[TEXT-CACHE] Stored {self.cache_path}")
+        elif os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
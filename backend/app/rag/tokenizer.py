@@ -0,0 +1,102 @@
+"""
+Local tokenizer for token-budget chunking.
+Loads the cl100k_base BPE ranks (the encoding of text-embedding-3-small)
+from a local file, so no network access is needed.
+"""
+import base64
+from app.core.config import settings
+
+
+# cl100k_base pre-tokenization pattern and special tokens (from tiktoken)
+CL100K_PAT_STR = r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+CL100K_SPECIAL_TOKENS = {
+    "<|endoftext|>": 100257,
+    "<|fim_prefix|>": 100258,
+    "<|fim_middle|>": 100259,
+    "<|fim_suffix|>": 100260,
+    "<|endofprompt|>": 100276,
+}
+
+
+# Tokenizer (initialized lazily)
+_tokenizer = None
+
+
+def load_bpe_ranks(file_path: str) -> dict:
+    """
+    Read a .tiktoken BPE file (one "<base64 token> <rank>" pair per line).
+    
+    Args:
+        file_path: Path to the local .tiktoken file
+        
+    Returns:
+        Mapping of token bytes to rank
+    """
+    with open(file_path, "rb") as f:
+        contents = f.read()
+    return {
+        base64.b64decode(token): int(rank)
+        for token, rank in (line.split() for line in contents.splitlines() if line)
+    }
+
+
+def get_tokenizer():
+    """
+    Get or initialize the local cl100k_base tokenizer.
+    
+    Returns:
+        tiktoken Encoding
+        
+    Raises:
+        Exception: If TOKENIZER_FILE is not configured or tiktoken is missing
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        if not settings.TOKENIZER_FILE:
+            raise Exception("TOKENIZER_FILE not configured in environment variables")
+        try:
+            import tiktoken
+        except ImportError:
+            raise Exception("tiktoken is required for token-based chunking (pip install tiktoken)")
+        
+        _tokenizer = tiktoken.Encoding(
+            name="cl100k_base",
+            pat_str=CL100K_PAT_STR,
+            mergeable_ranks=load_bpe_ranks(settings.TOKENIZER_FILE),
+            special_tokens=CL100K_SPECIAL_TOKENS
+        )
+        print(f"[TOKENIZER] Loaded cl100k_base from {settings.TOKENIZER_FILE}")
+    return _tokenizer
+
+
+def count_tokens(text: str, tokenizer=None) -> int:
+    """
+    Count tokens in a text.
+    
+    Args:
+        text: Text to count
+        tokenizer: Encoding to use (default: get_tokenizer())
+        
+    Returns:
+        Number of tokens
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    return len(tokenizer.encode_ordinary(text))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of a text for request sizing.
+    
+    Uses the local tokenizer when TOKENIZER_FILE is configured, otherwise a
+    conservative 3 characters per token.
+    
+    Args:
+        text: Text to estimate
+        
+    Returns:
+        Estimated number of tokens
+    """
+    if settings.TOKENIZER_FILE:
+        return count_tokens(text)
+    return len(text) // 3 + 1
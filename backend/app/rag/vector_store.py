@@ -0,0 +1,627 @@
+"""
+Vector index interface and a local NumPy backend.
+The local backend keeps one memory-mapped float32 matrix per namespace
+(workspace) on disk, so retrieval needs no external service.
+"""
+import os
+import json
+import shutil
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.rag.quantization import VECTOR_FORMATS, CompactMatrix, truncate_and_normalize
+
+
+class VectorIndex(ABC):
+    """
+    Interface of a vector index.
+    
+    Mirrors the subset of the Pinecone Index API the app uses (upsert,
+    query, metadata update, delete, listing ids by prefix and index stats,
+    within a namespace), so a Pinecone index and the local backends are
+    interchangeable in app.rag.storage.
+    """
+    
+    @abstractmethod
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = "") -> Dict[str, int]:
+        """
+        Insert or replace vectors.
+        
+        Args:
+            vectors: Dicts with "id", "values" and optional "metadata"
+            namespace: Namespace (workspace id)
+        
+        Returns:
+            {"upserted_count": n}
+        """
+    
+    @abstractmethod
+    def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        namespace: str = "",
+        include_metadata: bool = True,
+        include_values: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Find the vectors most similar to a query vector.
+        
+        Args:
+            vector: Query vector
+            top_k: Number of matches to return
+            namespace: Namespace (workspace id)
+            include_metadata: Return stored metadata with each match
+            include_values: Return stored vector values with each match
+        
+        Returns:
+            {"matches": [{"id", "score", "metadata"[, "values"]}]} by descending cosine similarity
+        """
+    
+    @abstractmethod
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        namespace: str = "",
+        delete_all: bool = False,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Delete vectors by id, by metadata filter, or a whole namespace.
+        
+        Unknown ids are ignored.
+        
+        Args:
+            ids: Vector ids
+            namespace: Namespace (workspace id)
+            delete_all: Delete every vector in the namespace
+            filter: Metadata filter ({"field": value}, {"field": {"$eq": value}}
+                or {"field": {"$in": [values]}}; fields are AND-ed)
+        """
+    
+    @abstractmethod
+    def update(self, id: str, set_metadata: Dict[str, Any], namespace: str = "") -> None:
+        """
+        Merge fields into a stored vector's metadata (unknown ids are ignored).
+        
+        Args:
+            id: Vector id
+            set_metadata: Fields to set; other fields are kept
+            namespace: Namespace (workspace id)
+        """
+    
+    @abstractmethod
+    def fetch(self, ids: List[str], namespace: str = "") -> Dict[str, Any]:
+        """
+        Read stored vectors by id (unknown ids are left out).
+        
+        Args:
+            ids: Vector ids
+            namespace: Namespace (workspace id)
+        
+        Returns:
+            {"vectors": {id: {"id", "values", "metadata"}}}
+        """
+    
+    @abstractmethod
+    def list(self, prefix: str = "", namespace: str = "", limit: int = 100) -> Iterator[List[str]]:
+        """
+        List vector ids starting with a prefix, a page at a time.
+        
+        Args:
+            prefix: Id prefix ("" lists every id)
+            namespace: Namespace (workspace id)
+            limit: Ids per page
+        
+        Yields:
+            Pages of vector ids
+        """
+    
+    @abstractmethod
+    def describe_index_stats(self) -> Dict[str, Any]:
+        """
+        Summarize the index.
+        
+        Returns:
+            {"dimension", "total_vector_count", "namespaces": {name: {"vector_count"}}}
+        """
+
+
+def metadata_filter_sql(metadata_filter: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """
+    Translate a Pinecone-style metadata filter into an SQL condition.
+    
+    Supports equality ({"field": value} or {"field": {"$eq": value}}) and
+    membership ({"field": {"$in": [values]}}); fields are AND-ed.
+    
+    Args:
+        metadata_filter: Metadata filter
+        
+    Returns:
+        (condition on the JSON `metadata` column, parameters)
+    """
+    conditions = []
+    params: List[Any] = []
+    for field, condition in metadata_filter.items():
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            path = "$." + field
+            if operator == "$eq":
+                conditions.append("json_extract(metadata, ?) = ?")
+                params.extend([path, value])
+            elif operator == "$in":
+                values = list(value)
+                if not values:
+                    conditions.append("0")
+                    continue
+                conditions.append(f"json_extract(metadata, ?) IN ({','.join('?' * len(values))})")
+                params.extend([path, *values])
+            else:
+                raise ValueError(f"Unsupported filter operator: {operator}")
+    return " AND ".join(conditions) or "1", params
+
+
+def normalize_rows(values: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a float32 matrix (zero rows stay zero)."""
+    norms = np.linalg.norm(values, axis=1, keepdims=True)
+    return values / np.clip(norms, 1e-12, None)
+
+
+class NamespaceMatrix:
+    """
+    One namespace of the local index.
+    
+    Vectors are L2-normalized and stored as rows of a memory-mapped matrix
+    (vectors.f32, or a compact format, see below); ids and metadata live in
+    a SQLite table next to it. Deleted rows are masked out of searches and
+    reused by later inserts, so the matrix never needs compacting.
+    
+    The storage format is fixed when the namespace is created and recorded
+    in format.json: float32, float16 or int8 rows, optionally truncated to
+    fewer (Matryoshka) dimensions. With `rescore`, lossy namespaces also
+    keep the full float32 vectors on disk (full.f32); searches then take
+    `rescore_factor` times as many candidates from the compact rows and
+    re-rank them against the full vectors, touching only those rows.
+    """
+    
+    # Subclasses that index rows by position (graphs) must not reuse them
+    reuse_rows = True
+    
+    def __init__(
+        self,
+        directory: str,
+        dimensions: int,
+        vector_format: str = "float32",
+        stored_dimensions: int = 0,
+        rescore: bool = False,
+        rescore_factor: int = 4
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self.input_dimensions = dimensions
+        self.rescore_factor = rescore_factor
+        self.lock = threading.Lock()
+        
+        self.format_path = os.path.join(directory, "format.json")
+        if os.path.exists(self.format_path):
+            with open(self.format_path) as f:
+                self.format = json.load(f)
+        else:
+            self.format = {
+                "format": vector_format,
+                "dimensions": min(stored_dimensions or dimensions, dimensions),
+                "rescore": rescore,
+            }
+            if os.path.exists(os.path.join(directory, "vectors.f32")):
+                # Namespaces created before format.json are full float32
+                self.format = {"format": "float32", "dimensions": dimensions, "rescore": False}
+            with open(self.format_path, "w") as f:
+                json.dump(self.format, f)
+        self.dimensions = self.format["dimensions"]
+        
+        suffix = VECTOR_FORMATS[self.format["format"]][1]
+        self.matrix = CompactMatrix(os.path.join(directory, f"vectors.{suffix}"), self.dimensions, self.format["format"])
+        self.full: Optional[CompactMatrix] = None
+        lossy = self.format["format"] != "float32" or self.dimensions < dimensions
+        if self.format["rescore"] and lossy:
+            self.full = CompactMatrix(os.path.join(directory, "full.f32"), dimensions)
+        self.capacity = self.matrix.capacity
+        if self.full is not None and self.capacity and self.full.capacity != self.capacity:
+            self._map(self.capacity)
+        
+        self.db = sqlite3.connect(os.path.join(directory, "rows.sqlite3"), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            "id TEXT PRIMARY KEY, row INTEGER NOT NULL UNIQUE, metadata TEXT NOT NULL)"
+        )
+        self.db.commit()
+        
+        self.ids: Dict[str, int] = dict(self.db.execute("SELECT id, row FROM rows"))
+        self.size = max(self.ids.values()) + 1 if self.ids else 0
+        if self.size > self.capacity:
+            raise Exception(f"{self.matrix.path} is shorter than its row table")
+        self.alive = np.zeros(self.capacity, dtype=bool)
+        self.row_ids: List[Optional[str]] = [None] * self.capacity
+        for vector_id, row in self.ids.items():
+            self.alive[row] = True
+            self.row_ids[row] = vector_id
+        self.free = [row for row in range(self.size) if not self.alive[row]] if self.reuse_rows else []
+    
+    def _map(self, capacity: int) -> None:
+        """(Re)map the matrix files with room for `capacity` rows."""
+        self.matrix.resize(capacity)
+        if self.full is not None:
+            self.full.resize(capacity)
+        self.capacity = capacity
+    
+    def _grow(self, needed: int) -> None:
+        """Grow the matrix (doubling) to hold at least `needed` rows."""
+        capacity = max(needed, self.capacity * 2, 1024)
+        self._map(capacity)
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+        self.row_ids.extend([None] * (capacity - len(self.row_ids)))
+    
+    def project(self, query: np.ndarray) -> np.ndarray:
+        """Bring a normalized full-size query to the stored dimensions."""
+        if self.dimensions == self.input_dimensions:
+            return query
+        return truncate_and_normalize(query, self.dimensions)
+    
+    def memory_bytes(self) -> int:
+        """Size of the searched (compact) matrix rows in use."""
+        return self.size * self.matrix.row_bytes
+    
+    def upsert(self, vectors: List[Dict[str, Any]]) -> int:
+        # Last write wins for ids repeated within one call
+        vectors = list({vector["id"]: vector for vector in vectors}.values())
+        values = np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+        if values.ndim != 2 or values.shape[1] != self.input_dimensions:
+            raise ValueError(f"Vectors must have {self.input_dimensions} dimensions")
+        values = normalize_rows(values)
+        compact = values if self.dimensions == self.input_dimensions else truncate_and_normalize(values, self.dimensions)
+        
+        with self.lock:
+            rows = []
+            for vector in vectors:
+                row = self.ids.get(vector["id"])
+                if row is not None and not self.reuse_rows:
+                    # Replace by tombstoning the old row and appending a new one
+                    self.alive[row] = False
+                    self.row_ids[row] = None
+                    row = None
+                if row is None:
+                    if self.free:
+                        row = self.free.pop()
+                    else:
+                        row = self.size
+                        self.size += 1
+                    self.ids[vector["id"]] = row
+                rows.append(row)
+            if self.size > self.capacity:
+                self._grow(self.size)
+            
+            self.matrix[rows] = compact
+            self.matrix.flush()
+            if self.full is not None:
+                self.full[rows] = values
+                self.full.flush()
+            self.alive[rows] = True
+            for vector, row in zip(vectors, rows):
+                self.row_ids[row] = vector["id"]
+            self._index_rows(rows)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO rows (id, row, metadata) VALUES (?, ?, ?)",
+                [
+                    (vector["id"], row, json.dumps(vector.get("metadata") or {}))
+                    for vector, row in zip(vectors, rows)
+                ]
+            )
+            self.db.commit()
+        return len(vectors)
+    
+    def _index_rows(self, rows: List[int]) -> None:
+        """Hook for subclasses to index freshly written rows (called under the lock)."""
+    
+    def candidates(self, top_k: int) -> int:
+        """Number of compact-search candidates to take for a final top_k."""
+        return top_k * self.rescore_factor if self.full is not None else top_k
+    
+    def rescore(self, query: np.ndarray, rows: List[int], top_k: int) -> List[tuple]:
+        """
+        Re-rank candidate rows against the full-precision vectors.
+        
+        Args:
+            query: Normalized full-size query
+            rows: Candidate rows
+            top_k: Number of results to keep
+        
+        Returns:
+            List of (row, score) by descending score
+        """
+        scores = (self.full[rows] @ query).tolist()
+        return sorted(zip(rows, scores), key=lambda item: item[1], reverse=True)[:top_k]
+    
+    def search(self, query: np.ndarray, top_k: int) -> List[tuple]:
+        """
+        Brute-force cosine top-k over live rows.
+        
+        Args:
+            query: Normalized full-size query
+            top_k: Number of results
+        
+        Returns:
+            List of (id, row, score) by descending score
+        """
+        with self.lock:
+            # Snapshot under the lock; the scan itself runs unlocked
+            size = self.size
+            alive = self.alive[:size].copy()
+            row_ids = self.row_ids
+        if size == 0 or top_k <= 0:
+            return []
+        
+        scores = self.matrix.dot(self.project(query), size)
+        scores[~alive] = -np.inf
+        k = min(self.candidates(top_k), int(alive.sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if self.full is not None:
+            results = self.rescore(query, top.tolist(), top_k)
+        else:
+            results = [(int(row), float(scores[row])) for row in top]
+        return [(row_ids[row], row, score) for row, score in results]
+    
+    def fetch(self, rows: List[int], include_metadata: bool, include_values: bool) -> List[Dict[str, Any]]:
+        """Build Pinecone-style match dicts for search results."""
+        metadata = {}
+        if include_metadata and rows:
+            placeholders = ",".join("?" * len(rows))
+            with self.lock:
+                metadata = dict(self.db.execute(
+                    f"SELECT row, metadata FROM rows WHERE row IN ({placeholders})",
+                    rows
+                ))
+        matches = []
+        for row in rows:
+            match: Dict[str, Any] = {"metadata": json.loads(metadata[row]) if row in metadata else {}}
+            if include_values:
+                source = self.full if self.full is not None else self.matrix
+                match["values"] = source[row].tolist()
+            matches.append(match)
+        return matches
+    
+    def list_ids(self, prefix: str = "") -> List[str]:
+        """Ids starting with `prefix`, in sorted order."""
+        with self.lock:
+            return sorted(vector_id for vector_id in self.ids if vector_id.startswith(prefix))
+    
+    def find(self, metadata_filter: Dict[str, Any]) -> List[str]:
+        """Ids whose metadata matches a filter (see metadata_filter_sql)."""
+        condition, params = metadata_filter_sql(metadata_filter)
+        with self.lock:
+            return [row[0] for row in self.db.execute(f"SELECT id FROM rows WHERE {condition}", params)]
+    
+    def update_metadata(self, vector_id: str, fields: Dict[str, Any]) -> bool:
+        """Merge fields into one id's metadata; False if the id is unknown."""
+        with self.lock:
+            row = self.db.execute("SELECT metadata FROM rows WHERE id = ?", (vector_id,)).fetchone()
+            if row is None:
+                return False
+            metadata = json.loads(row[0])
+            metadata.update(fields)
+            self.db.execute("UPDATE rows SET metadata = ? WHERE id = ?", (json.dumps(metadata), vector_id))
+            self.db.commit()
+        return True
+    
+    def close(self) -> None:
+        """Flush the matrix files and close the row table."""
+        with self.lock:
+            self.matrix.flush()
+            if self.full is not None:
+                self.full.flush()
+            self.db.close()
+    
+    def delete(self, ids: List[str]) -> int:
+        with self.lock:
+            rows = [self.ids.pop(vector_id) for vector_id in ids if vector_id in self.ids]
+            if not rows:
+                return 0
+            self.alive[rows] = False
+            for row in rows:
+                self.row_ids[row] = None
+            if self.reuse_rows:
+                self.free.extend(rows)
+            for i in range(0, len(rows), 500):
+                batch = rows[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                self.db.execute(f"DELETE FROM rows WHERE row IN ({placeholders})", batch)
+            self.db.commit()
+        return len(rows)
+
+
+def vector_format_settings() -> Dict[str, Any]:
+    """Storage format for new namespaces, from settings."""
+    return {
+        "vector_format": settings.VECTOR_STORE_FORMAT,
+        "stored_dimensions": settings.VECTOR_STORE_DIMENSIONS,
+        "rescore": settings.VECTOR_STORE_RESCORE,
+        "rescore_factor": settings.VECTOR_STORE_RESCORE_FACTOR,
+    }
+
+
+class LocalVectorIndex(VectorIndex):
+    """
+    Self-hosted vector index with exact (brute-force) cosine search.
+    
+    Each namespace is a NamespaceMatrix under `directory/<namespace>/`,
+    opened on first use. A query is one matrix-vector product plus an
+    argpartition, which keeps small and medium workspaces well under a
+    millisecond without any network round trip.
+    """
+    
+    def __init__(self, directory: str, dimensions: int):
+        self.directory = directory
+        self.dimensions = dimensions
+        self._namespaces: Dict[str, NamespaceMatrix] = {}
+        self._lock = threading.Lock()
+    
+    def _open_namespace(self, path: str) -> NamespaceMatrix:
+        return NamespaceMatrix(path, self.dimensions, **vector_format_settings())
+    
+    def get_namespace(self, namespace: str, create: bool = True) -> Optional[NamespaceMatrix]:
+        """
+        Get (opening or creating) the storage for a namespace.
+        
+        Args:
+            namespace: Namespace (workspace id)
+            create: Create the namespace if it does not exist yet
+        
+        Returns:
+            Namespace storage, or None if it does not exist and create is False
+        """
+        if os.sep in namespace or namespace in (".", ".."):
+            raise ValueError(f"Invalid namespace: {namespace!r}")
+        with self._lock:
+            storage = self._namespaces.get(namespace)
+            if storage is None:
+                path = os.path.join(self.directory, namespace or "_default")
+                if not create and not os.path.isdir(path):
+                    return None
+                storage = self._open_namespace(path)
+                self._namespaces[namespace] = storage
+            return storage
+    
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = "") -> Dict[str, int]:
+        if not vectors:
+            return {"upserted_count": 0}
+        return {"upserted_count": self.get_namespace(namespace).upsert(vectors)}
+    
+    def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        namespace: str = "",
+        include_metadata: bool = True,
+        include_values: bool = False
+    ) -> Dict[str, Any]:
+        storage = self.get_namespace(namespace, create=False)
+        if storage is None:
+            return {"matches": []}
+        
+        query = np.asarray(vector, dtype=np.float32)
+        if query.shape != (self.dimensions,):
+            raise ValueError(f"Query vector must have {self.dimensions} dimensions")
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        
+        results = storage.search(query, top_k)
+        matches = storage.fetch([row for _, row, _ in results], include_metadata, include_values)
+        for match, (vector_id, _, score) in zip(matches, results):
+            match["id"] = vector_id
+            match["score"] = score
+        return {"matches": matches}
+    
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        namespace: str = "",
+        delete_all: bool = False,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> None:
+        if delete_all:
+            self.drop_namespace(namespace)
+            return
+        storage = self.get_namespace(namespace, create=False)
+        if storage is None:
+            return
+        if filter is not None:
+            ids = list(ids or []) + storage.find(filter)
+        if ids:
+            storage.delete(ids)
+    
+    def drop_namespace(self, namespace: str) -> bool:
+        """
+        Remove a namespace and its files.
+        
+        Returns:
+            True if the namespace existed
+        """
+        storage = self.get_namespace(namespace, create=False)
+        if storage is None:
+            return False
+        with self._lock:
+            self._namespaces.pop(namespace, None)
+        storage.close()
+        shutil.rmtree(os.path.join(self.directory, namespace or "_default"), ignore_errors=True)
+        return True
+    
+    def list_namespaces(self) -> List[str]:
+        """Names of the namespaces stored on disk."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            "" if name == "_default" else name
+            for name in os.listdir(self.directory)
+            if os.path.isdir(os.path.join(self.directory, name))
+        )
+    
+    def update(self, id: str, set_metadata: Dict[str, Any], namespace: str = "") -> None:
+        storage = self.get_namespace(namespace, create=False)
+        if storage is not None:
+            storage.update_metadata(id, set_metadata)
+    
+    def fetch(self, ids: List[str], namespace: str = "") -> Dict[str, Any]:
+        storage = self.get_namespace(namespace, create=False)
+        if storage is None:
+            return {"vectors": {}}
+        with storage.lock:
+            found = [(vector_id, storage.ids[vector_id]) for vector_id in ids if vector_id in storage.ids]
+        matches = storage.fetch([row for _, row in found], include_metadata=True, include_values=True)
+        vectors = {}
+        for (vector_id, _), match in zip(found, matches):
+            match["id"] = vector_id
+            vectors[vector_id] = match
+        return {"vectors": vectors}
+    
+    def list(self, prefix: str = "", namespace: str = "", limit: int = 100) -> Iterator[List[str]]:
+        storage = self.get_namespace(namespace, create=False)
+        if storage is None:
+            return
+        ids = storage.list_ids(prefix)
+        for i in range(0, len(ids), limit):
+            yield ids[i:i + limit]
+    
+    def describe_index_stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for namespace in self.list_namespaces():
+            storage = self.get_namespace(namespace, create=False)
+            if storage is not None:
+                namespaces[namespace] = {"vector_count": len(storage.ids)}
+        return {
+            "dimension": self.dimensions,
+            "total_vector_count": sum(stats["vector_count"] for stats in namespaces.values()),
+            "namespaces": namespaces,
+        }
+
+
+# Local vector index (initialized lazily)
+_local_index: Optional[LocalVectorIndex] = None
+
+
+def get_local_vector_index() -> LocalVectorIndex:
+    """
+    Get or initialize the local vector index.
+    
+    Returns:
+        LocalVectorIndex rooted at VECTOR_STORE_DIR
+    """
+    global _local_index
+    if _local_index is None:
+        _local_index = LocalVectorIndex(settings.VECTOR_STORE_DIR, settings.EMBEDDING_DIMENSIONS)
+        print(f"[VECTOR-STORE] Local index at {settings.VECTOR_STORE_DIR}")
+    return _local_index
@@ -184,6 +184,47 @@
         messageDiv.appendChild(contentDiv);
         messagesContainer.appendChild(messageDiv);
         scrollToBottom();
+        return contentDiv;
+    }
+
+    // Replace the text of a bot message (used while a reply streams in)
+    function setMessageText(contentDiv, text) {
+        contentDiv.innerHTML = `<p>${escapeHtml(text).replace(/\n/g, '<br>')}</p>`;
+        scrollToBottom();
+    }
+
+    // Parse Server-Sent Events from a fetch response, calling onEvent(name, data)
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                const dataLines = [];
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        eventName = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        dataLines.push(line.slice(5).trim());
+                    }
+                });
+                if (dataLines.length) {
+                    onEvent(eventName, JSON.parse(dataLines.join('\n')));
+                }
+            }
+        }
     }
 
     // Add loading indicator
@@ -252,10 +293,11 @@
         inputField.disabled = true;
 
         try {
-            const response = await fetch(`${apiUrl}/chat/query`, {
+            const response = await fetch(`${apiUrl}/chat/query/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream',
                 },
                 body: JSON.stringify({
                     workspace_id: workspaceId,
@@ -263,23 +305,52 @@
                 })
             });
 
-            removeLoadingIndicator();
-
             if (!response.ok) {
+                removeLoadingIndicator();
                 const errorData = await response.json().catch(() => ({ detail: 'Unknown error' }));
                 throw new Error(errorData.detail || `HTTP ${response.status}`);
             }
 
-            const data = await response.json();
-            
+            // Show the reply as it is generated
+            let botMessage = null;
+            let reply = '';
+            let chunksCount = 0;
+            let streamError = null;
+
+            await readEventStream(response, (eventName, data) => {
+                if (eventName === 'sources') {
+                    chunksCount = data.chunks_count;
+                } else if (eventName === 'token') {
+                    reply += data.delta;
+                    if (!botMessage) {
+                        removeLoadingIndicator();
+                        botMessage = addMessage('');
+                    }
+                    setMessageText(botMessage, reply);
+                } else if (eventName === 'done') {
+                    reply = data.reply;
+                } else if (eventName === 'error') {
+                    streamError = data.detail;
+                }
+            });
+
+            removeLoadingIndicator();
+            if (streamError) {
+                throw new Error(streamError);
+            }
+
             // Handle no context case
-            if (data.chunks_count === 0 || 
-                data.reply.includes("don't have any relevant information") ||
-                data.reply.includes("Information not available")) {
-                addMessage("I don't have information about that in the documents. Please make sure documents are uploaded and processed in this workspace.");
+            if (chunksCount === 0 ||
+                reply.includes("don't have any relevant information") ||
+                reply.includes("Information not available")) {
+                const noInfo = "I don't have information about that in the documents. Please make sure documents are uploaded and processed in this workspace.";
+                if (botMessage) {
+                    setMessageText(botMessage, noInfo);
+                } else {
+                    addMessage(noInfo);
+                }
             } else {
-                addMessage(data.reply);
-                messageHistory.push({ role: 'assistant', content: data.reply });
+                messageHistory.push({ role: 'assistant', content: reply });
             }
 
         } catch (error) {
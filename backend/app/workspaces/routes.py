@@ -2,9 +2,10 @@
 Workspace routes for workspace management.
 """
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.models import User, Workspace
 from app.db.schemas import WorkspaceResponse
 from app.dependencies.auth import get_current_user
@@ -15,7 +16,7 @@ router = APIRouter(prefix="/workspaces", tags=["workspaces"])
 @router.get("/", response_model=List[WorkspaceResponse])
 async def get_user_workspaces(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get all workspaces for the current authenticated user.
@@ -27,6 +28,6 @@ async def get_user_workspaces(
     Returns:
         List of user's workspaces
     """
-    workspaces = db.query(Workspace).filter(Workspace.user_id == current_user.id).all()
+    workspaces = (await db.scalars(select(Workspace).where(Workspace.user_id == current_user.id))).all()
     return workspaces
 
@@ -0,0 +1,134 @@
+"""
+Tests for the semantic answer cache and its use in the RAG query path.
+"""
+import asyncio
+from uuid import uuid4
+import numpy as np
+import pytest
+from app.chat import rag_query
+from app.core.config import settings
+from app.rag import answer_cache, pipeline
+from app.rag.answer_cache import AnswerCache
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    """Answer cache enabled; counts the questions that reach generation."""
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", True)
+    monkeypatch.setattr(answer_cache, "_answer_cache", None)
+    generated = []
+    
+    async def retrieve(workspace_id, user_message, top_k, query_embedding=None):
+        return []
+    
+    async def generate(user_message, context, model="gpt-4o-mini"):
+        generated.append(user_message)
+        return f"Answer {len(generated)}"
+    
+    monkeypatch.setattr(rag_query, "retrieve_relevant_chunks", retrieve)
+    monkeypatch.setattr(rag_query, "generate_chat_completion", generate)
+    return generated
+
+
+def ask(workspace_id, question: str) -> str:
+    return asyncio.run(rag_query.query_rag(workspace_id, question))["reply"]
+
+
+def unit(vector) -> list:
+    vector = np.asarray(vector, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def test_answers_are_scoped_per_workspace(answers):
+    first, second = uuid4(), uuid4()
+    
+    assert ask(first, "What is the refund policy?") == "Answer 1"
+    assert ask(second, "What is the refund policy?") == "Answer 2"
+    assert ask(first, "what is the  refund policy") == "Answer 1"
+    assert ask(second, "What is the refund policy?") == "Answer 2"
+    assert len(answers) == 2
+
+
+def test_semantic_hits_are_scoped_per_workspace():
+    cache = AnswerCache(max_entries=10, ttl_seconds=0, threshold=0.9)
+    first, second = uuid4(), uuid4()
+    cache.put(first, "refund policy", unit([1, 0, 0]), {"reply": "Answer"}, cache.generation(first))
+    
+    assert cache.get_similar(first, unit([1, 0, 0])) is not None
+    assert cache.get_similar(second, unit([1, 0, 0])) is None
+
+
+def test_semantic_hits_respect_similarity_threshold():
+    cache = AnswerCache(max_entries=10, ttl_seconds=0, threshold=0.9)
+    workspace_id = uuid4()
+    cache.put(workspace_id, "refund policy", unit([1, 0, 0]), {"reply": "Answer"}, cache.generation(workspace_id))
+    
+    # Cosine similarities 0.95 and 0.85 with the cached question
+    close = [0.95, np.sqrt(1 - 0.95 ** 2), 0]
+    far = [0.85, np.sqrt(1 - 0.85 ** 2), 0]
+    result, similarity = cache.get_similar(workspace_id, close)
+    assert result == {"reply": "Answer"}
+    assert similarity == pytest.approx(0.95, abs=1e-4)
+    assert cache.get_similar(workspace_id, far) is None
+
+
+def test_answer_computed_before_invalidation_is_not_stored():
+    cache = AnswerCache(max_entries=10, ttl_seconds=0, threshold=0.9)
+    workspace_id = uuid4()
+    generation = cache.generation(workspace_id)
+    # A document finishes indexing while the answer is being generated
+    cache.invalidate(workspace_id)
+    
+    assert not cache.put(workspace_id, "refund policy", None, {"reply": "Stale"}, generation)
+    assert cache.get_exact(workspace_id, "refund policy") is None
+
+
+def test_upload_and_replace_invalidate_answers(answers, monkeypatch, tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from app.db.database import Base
+    from app.db.models import Document, User, Workspace
+    
+    pdf = tmp_path / "document.pdf"
+    pdf.write_bytes(b"%PDF")
+    contents = {"chunks": ["Refunds are issued within 14 days."]}
+    monkeypatch.setattr(pipeline, "iter_pdf_chunks", lambda file_path, **kwargs: iter(contents["chunks"]))
+    
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as connection:
+            tables = [User.__table__, Workspace.__table__, Document.__table__]
+            await connection.run_sync(lambda sync: Base.metadata.create_all(sync, tables=tables))
+        # Same session options as app.db.database.AsyncSessionLocal
+        sessions = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        workspace_id, document_id = uuid4(), uuid4()
+        async with sessions() as db:
+            db.add(Document(
+                id=document_id,
+                workspace_id=workspace_id,
+                filename="document.pdf",
+                file_url=str(pdf),
+                content_type="application/pdf",
+                size_in_bytes=4
+            ))
+            await db.commit()
+        
+        try:
+            replies = [await rag_query.query_rag(workspace_id, "How long do refunds take?")]
+            # Upload: the first indexing of the document
+            async with sessions() as db:
+                await pipeline.process_document(document_id, db)
+            replies.append(await rag_query.query_rag(workspace_id, "How long do refunds take?"))
+            replies.append(await rag_query.query_rag(workspace_id, "How long do refunds take?"))
+            # Replace: the same document re-indexed with new content
+            contents["chunks"] = ["Refunds are issued within 30 days."]
+            async with sessions() as db:
+                await pipeline.process_document(document_id, db)
+            replies.append(await rag_query.query_rag(workspace_id, "How long do refunds take?"))
+        finally:
+            await engine.dispose()
+        return [reply["reply"] for reply in replies], workspace_id
+    
+    replies, workspace_id = asyncio.run(scenario())
+    assert replies == ["Answer 1", "Answer 2", "Answer 2", "Answer 3"]
+    assert answer_cache.get_answer_cache().generation(workspace_id) == 2
@@ -0,0 +1,135 @@
+"""
+Tests for single-flight coalescing of identical in-flight queries.
+"""
+import asyncio
+from app.chat.coalesce import SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+        
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"reply": "shared"}
+        
+        results = await asyncio.gather(*(flights.run("question", compute) for _ in range(10)))
+        return calls, results, flights.stats()
+    
+    calls, results, stats = asyncio.run(scenario())
+    assert calls == 1
+    assert results == [{"reply": "shared"}] * 10
+    assert stats == {"in_flight": 0, "started": 1, "joined": 9}
+
+
+def test_failure_reaches_every_caller():
+    async def scenario():
+        flights = SingleFlight()
+        
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("provider down")
+        
+        return await asyncio.gather(*(flights.run("question", compute) for _ in range(3)), return_exceptions=True)
+    
+    results = asyncio.run(scenario())
+    assert [str(result) for result in results] == ["provider down"] * 3
+
+
+def test_late_joiner_receives_every_event():
+    async def scenario():
+        flights = SingleFlight()
+        produced = 0
+        second_event_sent = asyncio.Event()
+        
+        async def produce():
+            nonlocal produced
+            produced += 1
+            for i in range(5):
+                yield i
+                if i == 1:
+                    second_event_sent.set()
+                await asyncio.sleep(0.01)
+        
+        async def consume():
+            return [event async for event in flights.stream("question", produce)]
+        
+        first = asyncio.ensure_future(consume())
+        await second_event_sent.wait()
+        late = asyncio.ensure_future(consume())
+        return produced, await first, await late
+    
+    produced, first, late = asyncio.run(scenario())
+    assert produced == 1
+    assert first == [0, 1, 2, 3, 4]
+    assert late == [0, 1, 2, 3, 4]
+
+
+def test_work_continues_while_a_waiter_remains():
+    async def scenario():
+        flights = SingleFlight()
+        
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "done"
+        
+        impatient = asyncio.ensure_future(flights.run("question", compute))
+        patient = asyncio.ensure_future(flights.run("question", compute))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        return await patient
+    
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_run_is_cancelled_when_last_waiter_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+        
+        async def compute():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        
+        waiters = [asyncio.ensure_future(flights.run("question", compute)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        return flights.stats()
+    
+    assert asyncio.run(scenario())["in_flight"] == 0
+
+
+def test_stream_is_closed_when_last_waiter_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        closed = asyncio.Event()
+        
+        async def produce():
+            try:
+                for i in range(1000):
+                    yield i
+                    await asyncio.sleep(0.01)
+            finally:
+                closed.set()
+        
+        readers = []
+        for _ in range(2):
+            stream = flights.stream("question", produce)
+            assert await stream.__anext__() == 0
+            readers.append(stream)
+        for stream in readers:
+            await stream.aclose()
+        await asyncio.wait_for(closed.wait(), timeout=1)
+        return flights.stats()
+    
+    stats = asyncio.run(scenario())
+    assert stats == {"in_flight": 0, "started": 1, "joined": 1}
@@ -0,0 +1,36 @@
+"""
+Tests for context packing on vector and fused (hybrid) retrieval scores.
+"""
+from app.chat.context import pack_context
+from app.rag.lexical import reciprocal_rank_fusion
+
+
+def match(position: int, score: float, **extra) -> dict:
+    metadata = {"document_id": "document", "chunk_index": position * 3, "text": f"Passage {position}."}
+    return {"id": f"document_{position}", "score": score, "metadata": metadata, **extra}
+
+
+def packed_ids(chunks, min_relative_score=0.5) -> list:
+    _, used = pack_context(chunks, token_budget=1500, min_relative_score=min_relative_score)
+    return sorted(chunk["id"] for chunk in used)
+
+
+def test_cutoff_applies_to_cosine_scores():
+    chunks = [match(i, score, vector_score=score) for i, score in enumerate([0.8, 0.6, 0.3])]
+    assert packed_ids(chunks) == ["document_0", "document_1"]
+
+
+def test_fused_scores_do_not_collapse_context():
+    vector_hits = [match(i, score, vector_score=score) for i, score in enumerate([0.82, 0.75, 0.7, 0.3])]
+    lexical_hits = [match(0, 9.0), match(5, 7.0), match(6, 5.0)]
+    fused = reciprocal_rank_fusion([vector_hits, lexical_hits], k=60)
+    
+    # The best fused score (in both lists) is about twice the others
+    assert fused[0]["score"] > 1.9 * fused[1]["score"]
+    # Only the weak vector match goes; lexical-only hits have no cosine score to judge
+    assert packed_ids(fused) == ["document_0", "document_1", "document_2", "document_5", "document_6"]
+
+
+def test_lexical_only_matches_are_never_cut():
+    chunks = [match(0, 12.0), match(1, 3.0), match(2, 1.0)]
+    assert packed_ids(chunks) == ["document_0", "document_1", "document_2"]
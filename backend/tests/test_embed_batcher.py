@@ -0,0 +1,58 @@
+"""
+Tests for micro-batching of concurrent query embeddings.
+"""
+import asyncio
+from app.rag.embed_batcher import EmbeddingBatcher
+
+
+def embed_calls(embed_batch, texts, window_seconds=0.01):
+    """Embed texts concurrently through one batcher; returns (results, batcher)."""
+    async def scenario():
+        batcher = EmbeddingBatcher(embed_batch, window_seconds=window_seconds, max_items=16)
+        calls = [batcher.embed(text, "model", 2) for text in texts]
+        results = await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), timeout=2)
+        return results, batcher
+    
+    return asyncio.run(scenario())
+
+
+def test_concurrent_calls_share_one_request():
+    requests = []
+    
+    async def embed_batch(texts, model, dimensions):
+        requests.append(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+    
+    results, batcher = embed_calls(embed_batch, ["a", "bb", "a"])
+    assert requests == [["a", "bb"]]
+    assert results == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert batcher.stats()["batches"] == 1
+
+
+def test_short_response_fails_every_call():
+    async def embed_batch(texts, model, dimensions):
+        return [[1.0, 1.0]]
+    
+    results, batcher = embed_calls(embed_batch, ["a", "b", "c"])
+    assert all(isinstance(result, ValueError) for result in results)
+    assert batcher.stats()["failed_batches"] == 1
+
+
+def test_cancelled_request_fails_every_call():
+    async def scenario():
+        started = asyncio.Event()
+        
+        async def embed_batch(texts, model, dimensions):
+            started.set()
+            await asyncio.Event().wait()
+        
+        batcher = EmbeddingBatcher(embed_batch, window_seconds=0.01, max_items=16)
+        calls = asyncio.gather(*(batcher.embed(text, "model", 2) for text in "ab"), return_exceptions=True)
+        await started.wait()
+        for task in list(batcher._tasks):
+            task.cancel()
+        return await asyncio.wait_for(calls, timeout=2), batcher
+    
+    results, batcher = asyncio.run(scenario())
+    assert [str(result) for result in results] == ["Embedding request was cancelled"] * 2
+    assert batcher.stats()["failed_batches"] == 1
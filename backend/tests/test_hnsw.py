@@ -0,0 +1,99 @@
+"""
+Tests for the HNSW vector index, checked against the exact local index.
+"""
+import numpy as np
+import pytest
+from app.rag.hnsw import HNSWVectorIndex
+from app.rag.vector_store import LocalVectorIndex
+
+DIMENSIONS = 32
+NAMESPACE = "workspace"
+
+
+@pytest.fixture
+def vectors() -> np.ndarray:
+    rng = np.random.default_rng(7)
+    return rng.standard_normal((1000, DIMENSIONS)).astype(np.float32)
+
+
+@pytest.fixture
+def queries(vectors: np.ndarray) -> np.ndarray:
+    # Noisy copies of stored vectors, so each query has a clear neighbourhood
+    rng = np.random.default_rng(11)
+    picked = vectors[rng.integers(0, len(vectors), 50)]
+    return (picked + 0.5 * rng.standard_normal(picked.shape)).astype(np.float32)
+
+
+def upsert_all(index, vectors: np.ndarray) -> None:
+    index.upsert(
+        [
+            {"id": f"doc_{i}", "values": vector.tolist(), "metadata": {"chunk_index": i}}
+            for i, vector in enumerate(vectors)
+        ],
+        namespace=NAMESPACE
+    )
+
+
+def top_ids(index, query: np.ndarray, top_k: int = 10) -> list:
+    result = index.query(query.tolist(), top_k, namespace=NAMESPACE)
+    return [match["id"] for match in result["matches"]]
+
+
+def test_recall_against_exact_search(tmp_path, vectors, queries):
+    exact = LocalVectorIndex(str(tmp_path / "exact"), DIMENSIONS)
+    approximate = HNSWVectorIndex(str(tmp_path / "hnsw"), DIMENSIONS)
+    upsert_all(exact, vectors)
+    upsert_all(approximate, vectors)
+    
+    recall = np.mean([
+        len(set(top_ids(approximate, query)) & set(top_ids(exact, query))) / 10
+        for query in queries
+    ])
+    assert recall >= 0.9
+
+
+def test_deleted_ids_are_never_returned(tmp_path, vectors):
+    index = HNSWVectorIndex(str(tmp_path / "hnsw"), DIMENSIONS)
+    upsert_all(index, vectors)
+    deleted = {f"doc_{i}" for i in range(0, len(vectors), 2)}
+    index.delete(ids=sorted(deleted), namespace=NAMESPACE)
+    
+    # Querying with the deleted vectors themselves lands next to their tombstones
+    for i in range(0, 200, 2):
+        found = top_ids(index, vectors[i])
+        assert len(found) == 10
+        assert not deleted & set(found)
+
+
+def test_save_and_reload_round_trip(tmp_path, vectors, queries):
+    directory = str(tmp_path / "hnsw")
+    index = HNSWVectorIndex(directory, DIMENSIONS)
+    upsert_all(index, vectors)
+    index.delete(ids=["doc_0", "doc_1"], namespace=NAMESPACE)
+    index.configure(NAMESPACE, ef_search=100)
+    index.save()
+    before = [top_ids(index, query) for query in queries]
+    
+    reloaded = HNSWVectorIndex(directory, DIMENSIONS)
+    after = [top_ids(reloaded, query) for query in queries]
+    namespace = reloaded.get_namespace(NAMESPACE)
+    
+    assert after == before
+    assert len(namespace.graph) == len(vectors)
+    assert namespace.config["ef_search"] == 100
+    assert not {"doc_0", "doc_1"} & {vector_id for ids in after for vector_id in ids}
+
+
+def test_rows_written_after_last_save_are_reinserted(tmp_path, vectors):
+    directory = str(tmp_path / "hnsw")
+    index = HNSWVectorIndex(directory, DIMENSIONS)
+    upsert_all(index, vectors[:500])
+    index.save()
+    index.upsert(
+        [{"id": "late", "values": vectors[600].tolist(), "metadata": {"chunk_index": 600}}],
+        namespace=NAMESPACE
+    )
+    
+    reloaded = HNSWVectorIndex(directory, DIMENSIONS)
+    assert top_ids(reloaded, vectors[600], top_k=1) == ["late"]
+    assert len(reloaded.get_namespace(NAMESPACE).graph) == 501
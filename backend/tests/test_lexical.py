@@ -0,0 +1,81 @@
+"""
+Tests for the lexical (BM25) index and reciprocal-rank fusion.
+"""
+from uuid import uuid4
+import pytest
+from app.rag.chunk_store import ChunkStore
+from app.rag.lexical import LexicalIndex, build_match_expression, reciprocal_rank_fusion
+
+
+@pytest.fixture
+def lexical(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks"))
+    return store, LexicalIndex(store)
+
+
+def found_ids(index: LexicalIndex, workspace_id, query: str) -> list:
+    return [match["id"] for match in index.search(workspace_id, query, top_k=10)]
+
+
+def test_identifiers_become_phrases():
+    assert build_match_expression("error AB-1234 in 4.2.1") == '"error" OR "ab 1234" OR "4 2 1"'
+    assert build_match_expression('the "refund policy" for AB-1234') == '"refund policy" OR "ab 1234"'
+
+
+def test_stopword_only_query_has_no_expression():
+    assert build_match_expression("what is the") is None
+    assert build_match_expression("?!") is None
+
+
+def test_identifier_matches_adjacent_tokens_only(lexical):
+    store, index = lexical
+    workspace_id, document_id = uuid4(), uuid4()
+    store.put_chunks(
+        workspace_id,
+        document_id,
+        ["Ticket AB-1234 was closed.", "Ticket AB was split into 1234 parts."],
+        ["exact", "scattered"],
+        [0, 1]
+    )
+    
+    assert found_ids(index, workspace_id, "AB-1234") == ["exact"]
+
+
+def test_fusion_keeps_vector_score():
+    lexical_hits = [
+        {"id": "both", "score": 9.0, "metadata": {}},
+        {"id": "lexical", "score": 4.0, "metadata": {}},
+    ]
+    vector_hits = [
+        {"id": "vector", "score": 0.9, "vector_score": 0.9, "metadata": {}},
+        {"id": "both", "score": 0.8, "vector_score": 0.8, "metadata": {}},
+    ]
+    
+    fused = {match["id"]: match for match in reciprocal_rank_fusion([lexical_hits, vector_hits], k=60)}
+    assert fused["both"]["vector_score"] == 0.8
+    assert fused["vector"]["vector_score"] == 0.9
+    assert "vector_score" not in fused["lexical"]
+    assert fused["both"]["score"] == pytest.approx(1 / 61 + 1 / 62)
+
+
+def test_triggers_follow_replace_and_delete(lexical):
+    store, index = lexical
+    workspace_id, document_id = uuid4(), uuid4()
+    store.put_chunks(workspace_id, document_id, ["Refunds take 14 days.", "Shipping is free."], ["a", "b"], [0, 1])
+    assert found_ids(index, workspace_id, "refunds") == ["a"]
+    
+    # Replacing a chunk's text swaps its postings
+    store.put_chunks(workspace_id, document_id, ["Exchanges take 30 days."], ["a"], [0])
+    assert found_ids(index, workspace_id, "refunds") == []
+    assert found_ids(index, workspace_id, "exchanges") == ["a"]
+    
+    # Moving a chunk keeps it searchable at its new position
+    store.set_chunk_indexes(workspace_id, [("a", 5)])
+    assert [match["metadata"]["chunk_index"] for match in index.search(workspace_id, "exchanges")] == [5]
+    
+    store.delete_chunks(workspace_id, ["a"])
+    assert found_ids(index, workspace_id, "exchanges") == []
+    assert found_ids(index, workspace_id, "shipping") == ["b"]
+    
+    store.delete_document(workspace_id, document_id)
+    assert found_ids(index, workspace_id, "shipping") == []
@@ -0,0 +1,103 @@
+"""
+Tests for the lookup cache of authorization dependencies.
+"""
+import asyncio
+from uuid import uuid4
+import pytest
+from app.core.config import settings
+from app.dependencies import cache
+from app.dependencies.cache import LookupCache, load_user
+
+
+class Clock:
+    """Stand-in for the time module with a settable monotonic clock."""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+def test_cached_object_is_hit(clock):
+    lookups = LookupCache("test", ttl_seconds=60, max_entries=10)
+    key = uuid4()
+    assert lookups.get(key) is None
+    
+    assert lookups.put(key, "row", lookups.generation())
+    assert lookups.get(key) == "row"
+    assert lookups.stats()["hits"] == 1
+    assert lookups.stats()["misses"] == 1
+
+
+def test_invalidated_object_misses(clock):
+    lookups = LookupCache("test", ttl_seconds=60, max_entries=10)
+    key = uuid4()
+    lookups.put(key, "row", lookups.generation())
+    
+    assert lookups.invalidate(key)
+    assert lookups.get(key) is None
+
+
+def test_object_loaded_before_invalidation_is_not_stored(clock):
+    lookups = LookupCache("test", ttl_seconds=60, max_entries=10)
+    key = uuid4()
+    generation = lookups.generation()
+    # An update commits and invalidates while the old row is being loaded
+    lookups.invalidate(key)
+    
+    assert not lookups.put(key, "old row", generation)
+    assert lookups.get(key) is None
+
+
+def test_object_expires_after_ttl(clock):
+    lookups = LookupCache("test", ttl_seconds=60, max_entries=10)
+    key = uuid4()
+    lookups.put(key, "row", lookups.generation())
+    
+    clock.now += 59
+    assert lookups.get(key) == "row"
+    clock.now += 2
+    assert lookups.get(key) is None
+    assert lookups.stats()["entries"] == 0
+
+
+def test_detached_user_is_readable_after_session_closes(monkeypatch):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from app.db.models import User
+    
+    monkeypatch.setattr(settings, "AUTH_CACHE_ENABLED", True)
+    monkeypatch.setattr(cache, "_user_cache", None)
+    
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as connection:
+            await connection.run_sync(User.__table__.create)
+        sessions = async_sessionmaker(engine, expire_on_commit=True)
+        user_id = uuid4()
+        async with sessions() as db:
+            db.add(User(id=user_id, email="reader@example.com", password_hash="hash"))
+            await db.commit()
+        
+        async with sessions() as db:
+            loaded = await load_user(db, user_id)
+            # A commit in the loading session must not expire the shared copy
+            await db.commit()
+        async with sessions() as db:
+            again = await load_user(db, user_id)
+        await engine.dispose()
+        return loaded, again
+    
+    loaded, again = asyncio.run(scenario())
+    assert again is loaded
+    assert loaded.email == "reader@example.com"
+    assert loaded.created_at is not None
+    assert cache.get_user_cache().stats()["hits"] == 1
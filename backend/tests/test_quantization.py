@@ -0,0 +1,51 @@
+"""
+Tests for compact vector formats, checked against exact float32 search.
+"""
+import numpy as np
+import pytest
+from app.rag.vector_store import NamespaceMatrix
+
+DIMENSIONS = 128
+COUNT = 2000
+
+
+@pytest.fixture(scope="module")
+def data():
+    # Random unit vectors whose variance decays along the dimensions, like
+    # Matryoshka-trained embeddings (truncating isotropic vectors keeps no signal)
+    rng = np.random.default_rng(3)
+    decay = np.exp(-np.arange(DIMENSIONS) / 48)
+    vectors = rng.standard_normal((COUNT, DIMENSIONS)) * decay
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.integers(0, COUNT, 100)] + 0.3 * rng.standard_normal((100, DIMENSIONS)) * decay
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    exact = [set(np.argsort(-(vectors @ query))[:10]) for query in queries]
+    return vectors.astype(np.float32), queries.astype(np.float32), exact
+
+
+@pytest.mark.parametrize(
+    "vector_format, stored_dimensions, rescore, row_bytes, min_recall",
+    [
+        ("float16", 0, False, DIMENSIONS * 2, 0.99),
+        ("float16", 0, True, DIMENSIONS * 2, 0.99),
+        ("int8", 0, False, DIMENSIONS + 4, 0.95),
+        ("int8", 0, True, DIMENSIONS + 4, 0.99),
+        ("float32", 64, False, 64 * 4, 0.85),
+        ("float32", 64, True, 64 * 4, 0.98),
+        ("int8", 64, False, 64 + 4, 0.85),
+        ("int8", 64, True, 64 + 4, 0.98),
+    ]
+)
+def test_recall_at_10_against_float32(tmp_path, data, vector_format, stored_dimensions, rescore, row_bytes, min_recall):
+    vectors, queries, exact = data
+    matrix = NamespaceMatrix(str(tmp_path), DIMENSIONS, vector_format, stored_dimensions, rescore)
+    matrix.upsert([{"id": f"doc_{i}", "values": vector.tolist()} for i, vector in enumerate(vectors)])
+    
+    recall = np.mean([
+        len({row for _, row, _ in matrix.search(query, 10)} & expected) / 10
+        for query, expected in zip(queries, exact)
+    ])
+    assert recall >= min_recall
+    # The scanned (compact) rows only; rescoring reads full vectors from disk
+    assert matrix.memory_bytes() == COUNT * row_bytes
+    matrix.close()
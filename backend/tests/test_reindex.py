@@ -0,0 +1,143 @@
+"""
+Tests for incremental re-indexing in the ingestion pipeline.
+"""
+import asyncio
+from uuid import uuid4
+import pytest
+from app.chat.context import pack_context
+from app.rag import pipeline
+from app.rag.chunk_store import get_chunk_store
+from app.rag.embed import get_embedding
+from app.rag.storage import get_vector_index, list_vector_ids, query_similar_chunks
+
+VERSION_1 = [f"Section {i}: notes on topic {i} and its details." for i in range(20)]
+
+
+class FakeIngestion:
+    """Feeds the pipeline fixed chunk lists and counts the texts it embeds."""
+    
+    def __init__(self, monkeypatch):
+        self.chunks = []
+        self.embedded = []
+        self.fail = False
+        embed = pipeline.get_embeddings_batch
+        
+        def counting_embed(texts, *args, **kwargs):
+            if self.fail:
+                raise RuntimeError("embedding provider unavailable")
+            self.embedded.extend(texts)
+            return embed(texts, *args, **kwargs)
+        
+        monkeypatch.setattr(pipeline, "iter_pdf_chunks", lambda file_path, **kwargs: iter(self.chunks))
+        monkeypatch.setattr(pipeline, "get_embeddings_batch", counting_embed)
+        self.workspace_id = uuid4()
+        self.document_id = uuid4()
+    
+    def index(self, chunks):
+        self.chunks = list(chunks)
+        self.embedded = []
+        return asyncio.run(pipeline.run_ingestion_pipeline(
+            "document.pdf",
+            self.workspace_id,
+            self.document_id,
+            batch_size=4
+        ))
+    
+    def stored(self):
+        """Stored chunks as vector id -> chunk_index."""
+        rows = get_chunk_store().get_document_chunks(self.workspace_id, self.document_id)
+        return {chunk_id: chunk_index for chunk_id, (chunk_index, _) in rows.items()}
+    
+    def vector_ids(self):
+        return set(list_vector_ids(self.workspace_id, prefix=str(self.document_id)))
+    
+    def queried(self, query):
+        """Query results as chunk text -> chunk_index from the match metadata."""
+        matches = query_similar_chunks(self.workspace_id, get_embedding(query), top_k=100)
+        return {match["metadata"]["text"]: match["metadata"]["chunk_index"] for match in matches}
+
+
+@pytest.fixture
+def ingestion(monkeypatch):
+    return FakeIngestion(monkeypatch)
+
+
+def test_unchanged_document_embeds_nothing(ingestion):
+    ingestion.index(VERSION_1)
+    assert len(ingestion.embedded) == len(VERSION_1)
+    before = ingestion.vector_ids()
+    
+    assert ingestion.index(VERSION_1) == len(VERSION_1)
+    assert ingestion.embedded == []
+    assert ingestion.vector_ids() == before
+
+
+def test_one_chunk_edit_embeds_one_chunk(ingestion):
+    ingestion.index(VERSION_1)
+    edited = list(VERSION_1)
+    edited[7] = "Section 7: rewritten notes."
+    
+    assert ingestion.index(edited) == len(edited)
+    assert ingestion.embedded == ["Section 7: rewritten notes."]
+    stored = ingestion.stored()
+    assert sorted(stored.values()) == list(range(len(edited)))
+    assert ingestion.vector_ids() == set(stored)
+
+
+def test_vanished_chunks_are_deleted(ingestion):
+    ingestion.index(VERSION_1)
+    old_ids = ingestion.vector_ids()
+    # Drop five chunks from the middle; the tail moves up
+    shortened = VERSION_1[:5] + VERSION_1[10:]
+    
+    ingestion.index(shortened)
+    assert ingestion.embedded == []
+    stored = ingestion.stored()
+    assert len(stored) == len(shortened)
+    assert sorted(stored.values()) == list(range(len(shortened)))
+    assert ingestion.vector_ids() == set(stored)
+    assert len(old_ids - set(stored)) == 5
+
+
+def test_moved_chunks_are_queried_at_new_positions(ingestion):
+    ingestion.index(VERSION_1)
+    # A new leading chunk moves every existing chunk down by one
+    prefixed = ["Preface: why these notes exist."] + VERSION_1
+    
+    ingestion.index(prefixed)
+    assert ingestion.embedded == [prefixed[0]]
+    assert sorted(ingestion.stored().values()) == list(range(len(prefixed)))
+    assert ingestion.queried("notes on topic 3") == {text: i for i, text in enumerate(prefixed)}
+
+
+def test_reindexed_chunks_pack_in_document_order(ingestion):
+    ingestion.index(VERSION_1)
+    prefixed = ["Preface: why these notes exist."] + VERSION_1
+    ingestion.index(prefixed)
+    
+    matches = query_similar_chunks(ingestion.workspace_id, get_embedding("notes on topic 3"), top_k=100)
+    context, used = pack_context(matches, token_budget=10000)
+    assert len(used) == len(prefixed)
+    assert context == (
+        f"[Document {str(ingestion.document_id)[:8]}... - Chunks 0-{len(VERSION_1)}]\n" + " ".join(prefixed)
+    )
+
+
+def test_query_positions_come_from_chunk_store(ingestion):
+    ingestion.index(VERSION_1)
+    stale_id = next(chunk_id for chunk_id, i in ingestion.stored().items() if i == 4)
+    get_vector_index().update(id=stale_id, set_metadata={"chunk_index": 0}, namespace=str(ingestion.workspace_id))
+    
+    assert ingestion.queried("notes on topic 4") == {text: i for i, text in enumerate(VERSION_1)}
+
+
+def test_failed_run_keeps_previous_version(ingestion):
+    ingestion.index(VERSION_1)
+    before = ingestion.stored()
+    # Every chunk moves up by one, and the new last chunk cannot be embedded
+    ingestion.fail = True
+    
+    with pytest.raises(Exception):
+        ingestion.index(VERSION_1[1:] + ["Appendix: a new closing section."])
+    assert ingestion.stored() == before
+    assert ingestion.vector_ids() == set(before)